@@ -1,8 +1,14 @@
 from django.contrib import admin
-from .models import VideoAnalysis
+from .models import VideoAnalysis, FrameResultChunk
 
 @admin.register(VideoAnalysis)
 class VideoAnalysisAdmin(admin.ModelAdmin):
-    list_display = ['id', 'status', 'progress', 'created_at', 'updated_at']
+    list_display = ['id', 'original_name', 'status', 'progress', 'created_at', 'last_accessed']
     list_filter = ['status']
-    readonly_fields = ['progress', 'results', 'created_at', 'updated_at'] 
\ No newline at end of file
+    search_fields = ['original_name', 'video_hash']
+    readonly_fields = ['progress', 'results', 'created_at', 'updated_at']
+
+@admin.register(FrameResultChunk)
+class FrameResultChunkAdmin(admin.ModelAdmin):
+    list_display = ['id', 'analysis', 'start_frame', 'end_frame']
+    list_filter = ['analysis']
@@ -0,0 +1,259 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+TERMINAL_STATUSES = ('completed', 'failed')
+
+
+def channel_name(analysis_id):
+    return f'cattax:analysis:{analysis_id}'
+
+
+class MemorySubscription:
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue()
+
+    def open(self):
+        self.broker._subscribe(self)
+
+    async def aopen(self):
+        self.open()
+
+    def get(self, timeout=None):
+        """等待下一条消息，超时返回 None"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def aget(self, timeout=None):
+        return await asyncio.to_thread(self.get, timeout)
+
+    def close(self):
+        self.broker._unsubscribe(self)
+
+    async def aclose(self):
+        self.close()
+
+
+class MemoryBroker:
+    """进程内的发布/订阅，用于测试和 eager 模式（发布者与订阅者在同一进程）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.queue.put(message)
+        return len(subscriptions)
+
+    def subscribe(self, channel):
+        return MemorySubscription(self, channel)
+
+    def _subscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.setdefault(subscription.channel, []).append(subscription)
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+
+
+class RedisSubscription:
+    """Redis 频道订阅：open()/get() 为同步连接，aopen()/aget() 为异步连接"""
+
+    def __init__(self, url, channel):
+        self.url = url
+        self.channel = channel
+        self._client = self._pubsub = None
+        self._aclient = self._apubsub = None
+
+    def open(self):
+        import redis
+
+        self._client = redis.Redis.from_url(self.url)
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(self.channel)
+
+    async def aopen(self):
+        import redis.asyncio
+
+        self._aclient = redis.asyncio.Redis.from_url(self.url)
+        self._apubsub = self._aclient.pubsub(ignore_subscribe_messages=True)
+        await self._apubsub.subscribe(self.channel)
+
+    def get(self, timeout=None):
+        message = self._pubsub.get_message(timeout=timeout)
+        return message['data'].decode() if message else None
+
+    async def aget(self, timeout=None):
+        message = await self._apubsub.get_message(timeout=timeout)
+        return message['data'].decode() if message else None
+
+    def close(self):
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._client.close()
+
+    async def aclose(self):
+        self.close()
+        if self._apubsub is not None:
+            await self._apubsub.aclose()
+            await self._aclient.aclose()
+
+
+class RedisBroker:
+    def __init__(self, url):
+        import redis
+
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        return self._client.publish(channel, message)
+
+    def subscribe(self, channel):
+        return RedisSubscription(self.url, channel)
+
+
+_broker = None
+_broker_url = None
+_memory_broker = MemoryBroker()
+
+
+def get_broker():
+    """按 CATTAX_EVENTS_URL 返回事件代理：memory:// 为进程内代理，留空则不推送事件"""
+    global _broker, _broker_url
+    url = getattr(settings, 'CATTAX_EVENTS_URL', '')
+    if not url:
+        return None
+    if url.startswith('memory://'):
+        return _memory_broker
+    if _broker is None or _broker_url != url:
+        _broker = RedisBroker(url)
+        _broker_url = url
+    return _broker
+
+
+def publish(analysis_id, event, **data):
+    """发布一条事件，推送失败不影响视频处理"""
+    broker = get_broker()
+    if broker is None:
+        return
+    try:
+        broker.publish(channel_name(analysis_id), json.dumps({'event': event, **data}))
+    except Exception as e:
+        print(f"Failed to publish {event} event for analysis {analysis_id}: {str(e)}")
+
+
+def publish_status(analysis_id, status, **data):
+    publish(analysis_id, 'status', status=status, **data)
+
+
+class ProgressPublisher:
+    """把逐帧结果节流后推送给订阅者
+
+    每隔 interval 秒把这段时间内的新帧合并成一条 frames 事件（附带进度），
+    避免每帧一条消息；flush() 推送剩余的帧。
+    """
+
+    def __init__(self, analysis_id, total_frames, interval=None):
+        if interval is None:
+            interval = getattr(settings, 'CATTAX_EVENTS_INTERVAL', 0.5)
+        self.analysis_id = analysis_id
+        self.total_frames = total_frames
+        self.interval = interval
+        self.enabled = get_broker() is not None
+        self._frames = []
+        self._since_frame = 0
+        self._last_publish = time.monotonic()
+
+    def frame(self, frame_index, frame_results):
+        if not self.enabled:
+            return
+        if not self._frames:
+            self._since_frame = frame_index
+        self._frames.append(frame_results)
+        if time.monotonic() - self._last_publish >= self.interval:
+            self.flush()
+
+    def progress(self):
+        if not self.total_frames:
+            return 0.0
+        return min((self._since_frame + len(self._frames)) / self.total_frames * 100, 100.0)
+
+    def flush(self):
+        if self._frames:
+            publish(self.analysis_id, 'frames', progress=self.progress(),
+                    since_frame=self._since_frame, frames=self._frames)
+            self._since_frame += len(self._frames)
+            self._frames = []
+        self._last_publish = time.monotonic()
+
+
+def sse_message(data):
+    """编码为一条 Server-Sent Events 消息，事件类型放在 event 字段"""
+    payload = data if isinstance(data, str) else json.dumps(data)
+    event = json.loads(payload).get('event', 'message')
+    return f'event: {event}\ndata: {payload}\n\n'
+
+
+def is_terminal(message):
+    data = json.loads(message)
+    return data.get('event') == 'status' and data.get('status') in TERMINAL_STATUSES
+
+
+def event_stream(subscription, load_snapshot, heartbeat=15):
+    """SSE 事件流（同步版本，WSGI 下使用）
+
+    先订阅频道再读取状态快照（避免两者之间的事件丢失），然后转发频道中的事件，
+    空闲时发送注释行保活，收到 completed / failed 状态后结束。
+    """
+    subscription.open()
+    try:
+        snapshot = load_snapshot()
+        yield sse_message(snapshot)
+        if snapshot.get('status') in TERMINAL_STATUSES:
+            return
+        while True:
+            message = subscription.get(timeout=heartbeat)
+            if message is None:
+                yield ': keepalive\n\n'
+                continue
+            yield sse_message(message)
+            if is_terminal(message):
+                return
+    finally:
+        subscription.close()
+
+
+async def async_event_stream(subscription, load_snapshot, heartbeat=15):
+    """SSE 事件流（异步版本，ASGI 下使用），行为同 event_stream"""
+    await subscription.aopen()
+    try:
+        snapshot = await sync_to_async(load_snapshot)()
+        yield sse_message(snapshot)
+        if snapshot.get('status') in TERMINAL_STATUSES:
+            return
+        while True:
+            message = await subscription.aget(timeout=heartbeat)
+            if message is None:
+                yield ': keepalive\n\n'
+                continue
+            yield sse_message(message)
+            if is_terminal(message):
+                return
+    finally:
+        await subscription.aclose()
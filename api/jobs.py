@@ -0,0 +1,26 @@
+from celery import current_app, group
+
+# web 进程按任务名派发 Celery 任务，不导入 api.tasks：任务模块依赖的模型（torch / ultralytics）、
+# OpenCV 和 SciPy 只在 worker 中加载。任务名与 api/tasks.py 中 shared_task 的 name 一致。
+PROCESS_VIDEO = 'api.tasks.process_video_task'
+REANALYZE = 'api.tasks.reanalyze_task'
+PROCESS_STREAM = 'api.tasks.process_stream_task'
+
+
+def _register_eager():
+    """eager 模式（task_always_eager，本地调试）下任务在本进程执行，这时才导入任务模块完成注册"""
+    if current_app.conf.task_always_eager:
+        from . import tasks
+
+
+def send(name, args=(), kwargs=None, **options):
+    """按任务名派发一个任务，返回 AsyncResult"""
+    _register_eager()
+    return current_app.signature(name, args=args, kwargs=kwargs, **options).apply_async()
+
+
+def reanalyze_many(analysis_ids, thresholds=None):
+    """每个分析一个重新分析任务，由各 worker 并行执行"""
+    _register_eager()
+    return group(current_app.signature(REANALYZE, args=(analysis_id, thresholds))
+                 for analysis_id in analysis_ids).apply_async()
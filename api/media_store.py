@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import VideoAnalysis
+
+# 分析逻辑有不兼容改动时递增，使旧的缓存结果失效
+CACHE_VERSION = 3
+
+
+def save_upload(uploaded_file):
+    """按内容哈希保存上传文件，边写边算 sha256
+
+    文件先写到 uploads/ 下的临时文件，完成后改名为 uploads/<hash[:2]>/<hash><扩展名>；
+    相同内容已存在时丢弃临时文件。返回 (相对 MEDIA_ROOT 的路径, sha256, 字节数)。
+    """
+    upload_dir = os.path.join(settings.MEDIA_ROOT, 'uploads')
+    os.makedirs(upload_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as destination:
+            for chunk in uploaded_file.chunks():
+                digest.update(chunk)
+                destination.write(chunk)
+                size += len(chunk)
+        video_hash = digest.hexdigest()
+        relative_path = store_by_hash(tmp_path, video_hash, os.path.splitext(uploaded_file.name)[1])
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return relative_path, video_hash, size
+
+
+def store_by_hash(path, video_hash, ext):
+    """把文件移动到 uploads/<hash[:2]>/<hash><扩展名>，相同内容已存在时删除 path，返回相对路径"""
+    relative_path = f'uploads/{video_hash[:2]}/{video_hash}{ext.lower()}'
+    final_path = os.path.join(settings.MEDIA_ROOT, relative_path)
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    if os.path.exists(final_path):
+        os.remove(path)
+    else:
+        os.replace(path, final_path)
+    return relative_path
+
+
+def hash_file(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def partial_upload_path(analysis_id, filename):
+    """分块上传过程中文件的相对路径"""
+    return f'uploads/partial/{analysis_id}{os.path.splitext(filename)[1].lower()}'
+
+
+def analysis_params(behavior=None):
+    """影响分析结果的模型和分析参数；behavior 为覆盖默认值的行为阈值（见 thresholds.behavior_thresholds）"""
+    from cattax import backends, thresholds
+
+    weights, backend, int8 = backends.model_spec()
+    params = {
+        'version': CACHE_VERSION,
+        'model': weights,
+        'backend': backend,
+        'int8': int8,
+        'max_frame_skip': getattr(settings, 'CATTAX_MAX_FRAME_SKIP', 1),
+        'sampling_motion_threshold': getattr(settings, 'CATTAX_SAMPLING_MOTION_THRESHOLD', 4.0),
+        'behavior': thresholds.behavior_thresholds(behavior),
+        'camera_motion': getattr(settings, 'CATTAX_CAMERA_MOTION', True),
+        'interactions': {
+            'distance': getattr(settings, 'CATTAX_INTERACTION_DISTANCE', 100),
+            'min_frames': getattr(settings, 'CATTAX_INTERACTION_MIN_FRAMES', 12),
+        } if getattr(settings, 'CATTAX_INTERACTIONS', True) else None,
+    }
+    # ROI 推理会略微改变检测结果；未开启时不加这一项，原有的缓存键保持不变
+    if getattr(settings, 'CATTAX_ROI_INFERENCE', False):
+        params['roi'] = {
+            'rescan_frames': getattr(settings, 'CATTAX_ROI_RESCAN_FRAMES', 30),
+            'padding': getattr(settings, 'CATTAX_ROI_PADDING', 0.5),
+            'min_size': getattr(settings, 'CATTAX_ROI_MIN_SIZE', 96),
+        }
+    return params
+
+
+def cache_key(video_hash, params=None):
+    """分析缓存键：(视频哈希, 模型, 分析参数) 的 sha256"""
+    if params is None:
+        params = analysis_params()
+    payload = json.dumps({'video': video_hash, 'params': params}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def find_cached(key, exclude_id=None):
+    """返回可复用的分析：已完成且输出视频仍在的，或同一键正在排队 / 处理中的；没有则返回 None
+
+    analysis 渲染模式下不需要输出视频，已完成的分析都可以复用。
+    """
+    needs_video = getattr(settings, 'CATTAX_RENDER_MODE', 'headless') != 'analysis'
+    candidates = VideoAnalysis.objects.filter(cache_key=key).filter(
+        Q(status='completed') | Q(status='processing') | Q(status='queued')
+    ).exclude(id=exclude_id).order_by('-created_at')
+    for analysis in candidates:
+        if analysis.status in ('queued', 'processing'):
+            return analysis
+        if not needs_video or (analysis.processed_video and os.path.exists(analysis.processed_video.path)):
+            return analysis
+    return None
+
+
+def touch(analysis):
+    """记录最近访问时间，供 LRU 淘汰使用"""
+    now = timezone.now()
+    VideoAnalysis.objects.filter(id=analysis.id).update(last_accessed=now)
+    analysis.last_accessed = now
+
+
+def _file_size(field):
+    if not field:
+        return 0
+    try:
+        return os.path.getsize(field.path)
+    except OSError:
+        return 0
+
+
+def media_usage(analysis):
+    """返回 (输出视频字节数, 上传文件字节数)；上传文件按内容共享，由调用方去重计数"""
+    return _file_size(analysis.processed_video), _file_size(analysis.video_file)
+
+
+def evict(max_bytes=None, max_entries=None):
+    """按最近访问时间淘汰已结束的分析，直到媒体总大小和条目数都不超过上限
+
+    被淘汰的分析会删除输出视频、检测旁路文件、逐帧结果和记录本身；上传文件在没有其他分析引用时删除。
+    正在处理的分析不会被淘汰。返回被淘汰的分析 ID 列表。
+    """
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'CATTAX_CACHE_MAX_BYTES', 0)
+    if max_entries is None:
+        max_entries = getattr(settings, 'CATTAX_CACHE_MAX_ENTRIES', 0)
+    if not max_bytes and not max_entries:
+        return []
+    from cattax import detection_cache
+
+    finished = list(VideoAnalysis.objects.filter(status__in=('completed', 'failed')))
+    # 从未被访问过的按创建时间排序
+    finished.sort(key=lambda analysis: analysis.last_accessed or analysis.created_at)
+
+    upload_refs = {}
+    processed_bytes = {}
+    upload_bytes = {}
+    for analysis in VideoAnalysis.objects.all():
+        upload_refs[analysis.video_file.name] = upload_refs.get(analysis.video_file.name, 0) + 1
+    for analysis in finished:
+        processed_bytes[analysis.id], upload_bytes[analysis.video_file.name] = media_usage(analysis)
+    total_bytes = sum(processed_bytes.values()) + sum(upload_bytes.values())
+    entries = len(finished)
+
+    evicted = []
+    for analysis in finished:
+        over_bytes = max_bytes and total_bytes > max_bytes
+        over_entries = max_entries and entries > max_entries
+        if not over_bytes and not over_entries:
+            break
+        if analysis.processed_video and os.path.exists(analysis.processed_video.path):
+            os.remove(analysis.processed_video.path)
+        shutil.rmtree(detection_cache.detections_dir(analysis.id), ignore_errors=True)
+        total_bytes -= processed_bytes[analysis.id]
+        upload_name = analysis.video_file.name
+        upload_refs[upload_name] -= 1
+        if upload_refs[upload_name] == 0:
+            if analysis.video_file and os.path.exists(analysis.video_file.path):
+                os.remove(analysis.video_file.path)
+                # 哈希分片目录空了就一并删除
+                shard_dir = os.path.dirname(analysis.video_file.path)
+                if not os.listdir(shard_dir):
+                    os.rmdir(shard_dir)
+            total_bytes -= upload_bytes.get(upload_name, 0)
+        evicted.append(analysis.id)
+        analysis.delete()
+        entries -= 1
+
+    if evicted:
+        print(f"Evicted {len(evicted)} cached analyses, media now {total_bytes / 1024 / 1024:.1f} MB")
+    return evicted
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='videoanalysis',
+            name='id',
+            field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+        migrations.CreateModel(
+            name='FrameResultChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_frame', models.PositiveIntegerField()),
+                ('end_frame', models.PositiveIntegerField()),
+                ('frames', models.JSONField(default=list)),
+                ('analysis', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='frame_chunks', to='api.videoanalysis')),
+            ],
+            options={
+                'ordering': ['analysis', 'start_frame'],
+                'unique_together': {('analysis', 'start_frame')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_frame_result_chunk'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='frameresultchunk',
+            index=models.Index(fields=['analysis', 'end_frame'], name='api_framere_analysi_a4ea98_idx'),
+        ),
+    ]
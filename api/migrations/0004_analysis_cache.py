@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_frame_chunk_end_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoanalysis',
+            name='cache_key',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='videoanalysis',
+            name='last_accessed',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videoanalysis',
+            name='original_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='videoanalysis',
+            name='video_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_analysis_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoanalysis',
+            name='upload_chunks',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='videoanalysis',
+            name='upload_committed',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='videoanalysis',
+            name='upload_received',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='videoanalysis',
+            name='upload_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
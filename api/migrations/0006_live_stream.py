@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_chunked_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoanalysis',
+            name='stop_requested',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='videoanalysis',
+            name='stream_url',
+            field=models.CharField(blank=True, max_length=500),
+        ),
+        migrations.CreateModel(
+            name='BehaviorSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cat_id', models.IntegerField()),
+                ('behavior', models.CharField(max_length=20)),
+                ('start_frame', models.PositiveIntegerField()),
+                ('end_frame', models.PositiveIntegerField()),
+                ('frames', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('analysis', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='api.videoanalysis')),
+            ],
+            options={
+                'ordering': ['analysis', 'start_frame', 'cat_id'],
+                'indexes': [models.Index(fields=['analysis', 'start_frame'], name='api_behavio_analysi_5439c2_idx')],
+            },
+        ),
+    ]
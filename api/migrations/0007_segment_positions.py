@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_live_stream'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='behaviorsegment',
+            name='position_stats',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name='behaviorsegment',
+            name='position_step',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='behaviorsegment',
+            name='positions',
+            field=models.JSONField(default=dict),
+        ),
+    ]
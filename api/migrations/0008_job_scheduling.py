@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_segment_positions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoanalysis',
+            name='client_id',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='videoanalysis',
+            name='estimated_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videoanalysis',
+            name='job_class',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='videoanalysis',
+            name='job_options',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name='videoanalysis',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='videoanalysis',
+            name='status',
+            field=models.CharField(choices=[('uploading', 'Uploading'), ('queued', 'Queued'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='uploading', max_length=20),
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.db import models
 class VideoAnalysis(models.Model):
     STATUS_CHOICES = [
         ('uploading', 'Uploading'),
+        ('queued', 'Queued'),
         ('processing', 'Processing'),
         ('completed', 'Completed'),
         ('failed', 'Failed')
@@ -13,8 +14,73 @@ class VideoAnalysis(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
     progress = models.FloatField(default=0)  # 0-100
     results = models.JSONField(default=dict)  # 存储分析结果
+    original_name = models.CharField(max_length=255, blank=True)  # 上传时的文件名
+    video_hash = models.CharField(max_length=64, blank=True, db_index=True)  # 视频内容 sha256
+    cache_key = models.CharField(max_length=64, blank=True, db_index=True)  # (视频, 模型, 分析参数) 的缓存键
+    last_accessed = models.DateTimeField(null=True, blank=True)  # 最近一次命中缓存的时间，用于 LRU 淘汰
+    # 分块上传状态：直接上传的视频创建时即已提交
+    upload_size = models.BigIntegerField(null=True, blank=True)  # 客户端声明的文件总大小
+    upload_received = models.BigIntegerField(default=0)  # 已写入的字节数，即下一块的 offset
+    upload_chunks = models.PositiveIntegerField(default=0)  # 已接收的块数，即下一块的 index
+    upload_committed = models.BooleanField(default=True)
+    # 实时视频流分析
+    stream_url = models.CharField(max_length=500, blank=True)  # RTSP 地址 / 摄像头编号 / 回放文件
+    stop_requested = models.BooleanField(default=False)
+    # 任务调度：按成本分到 short / long 队列，按客户端公平派发
+    client_id = models.CharField(max_length=64, blank=True, db_index=True)  # 上传者标识（X-Client-Id / 用户名 / IP）
+    job_class = models.CharField(max_length=10, blank=True)  # short / long，实时流为空
+    estimated_seconds = models.FloatField(null=True, blank=True)  # 上传时按帧数和分辨率估算的处理时长
+    queued_at = models.DateTimeField(null=True, blank=True)  # 最近一次进入调度队列的时间（被抢占后会重新排队）
+    job_options = models.JSONField(default=dict)  # 派发时传给 process_video_task 的参数
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ['-created_at'] 
\ No newline at end of file
+        ordering = ['-created_at']
+
+    def frames_available(self):
+        """已持久化的逐帧结果数量（分块是连续追加的，取最后一块的结束帧）"""
+        last = self.frame_chunks.order_by('-end_frame').values_list('end_frame', flat=True).first()
+        return last or 0
+
+    def iter_frames(self, since_frame=0):
+        """按帧顺序遍历已持久化的逐帧结果，返回 (frame_index, frame_results)"""
+        chunks = self.frame_chunks.filter(end_frame__gt=since_frame).order_by('start_frame')
+        for chunk in chunks.iterator():
+            for offset, frame_results in enumerate(chunk.frames):
+                frame_index = chunk.start_frame + offset
+                if frame_index >= since_frame:
+                    yield frame_index, frame_results
+
+
+class FrameResultChunk(models.Model):
+    """逐帧检测结果的追加写分块，每块覆盖 [start_frame, end_frame) 区间"""
+    analysis = models.ForeignKey(VideoAnalysis, on_delete=models.CASCADE, related_name='frame_chunks')
+    start_frame = models.PositiveIntegerField()
+    end_frame = models.PositiveIntegerField()
+    frames = models.JSONField(default=list)  # 每个元素是一帧的检测结果列表
+
+    class Meta:
+        ordering = ['analysis', 'start_frame']
+        unique_together = [('analysis', 'start_frame')]
+        indexes = [models.Index(fields=['analysis', 'end_frame'])]
+
+
+class BehaviorSegment(models.Model):
+    """一只猫连续保持同一行为的区间 [start_frame, end_frame)，实时流的时间为墙钟时间，视频文件为空"""
+    analysis = models.ForeignKey(VideoAnalysis, on_delete=models.CASCADE, related_name='segments')
+    cat_id = models.IntegerField()
+    behavior = models.CharField(max_length=20)
+    start_frame = models.PositiveIntegerField()
+    end_frame = models.PositiveIntegerField()
+    frames = models.PositiveIntegerField(default=0)  # 区间内实际检测到该猫的帧数
+    started_at = models.DateTimeField(null=True, blank=True)
+    ended_at = models.DateTimeField(null=True, blank=True)
+    position_stats = models.JSONField(default=dict)  # 区间内位置的均值 / 最小 / 最大 {'mean': [x, y], 'min': ..., 'max': ...}
+    position_step = models.PositiveIntegerField(default=1)  # positions 的采样间隔（帧）
+    positions = models.JSONField(default=dict)  # 降采样后 delta 编码的轨迹，见 cattax.timeline.encode_track
+
+    class Meta:
+        ordering = ['analysis', 'start_frame', 'cat_id']
+        indexes = [models.Index(fields=['analysis', 'start_frame'])]
+
@@ -0,0 +1,264 @@
+import copy
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from cattax import interactions
+from cattax.profiling import NULL_PROFILER
+from cattax.timeline import BehaviorSegmenter
+from .models import VideoAnalysis, FrameResultChunk, BehaviorSegment
+
+
+class ResultsWriter:
+    """逐帧结果的追加写存储
+
+    每帧结果先缓存在内存中，累计到 flush_frames 帧或距上次写入超过 flush_seconds 秒时
+    以一个 FrameResultChunk 的形式追加写入，同时顺带更新进度（只更新一个浮点字段；
+    track_progress=False 时由调用方自行维护进度）。
+    同时把逐帧行为合并成 BehaviorSegment 行为区间（run-length 时间线），
+    store_frames=False 时只保存时间线、不写逐帧分块。
+    VideoAnalysis.results 只在 finish() 时写入一次汇总，避免每帧重写整个 JSON。
+    CATTAX_INTERACTIONS 开启时逐帧检测猫之间的接近和互动（cattax.interactions），每帧的事件附加到
+    涉及的猫的检测结果（detection['interactions']），并按猫对汇总到 results['interactions']。
+    profiler（cattax.profiling.StageProfiler）记录写库耗时，按每次写入的帧数平摊。
+    """
+
+    def __init__(self, analysis_id, total_frames, flush_frames=None, flush_seconds=None, start_frame=0,
+                 track_progress=True, fps=None, store_frames=None, profiler=None):
+        if flush_frames is None:
+            flush_frames = getattr(settings, 'CATTAX_RESULTS_FLUSH_FRAMES', 100)
+        if flush_seconds is None:
+            flush_seconds = getattr(settings, 'CATTAX_RESULTS_FLUSH_SECONDS', 2.0)
+        if store_frames is None:
+            store_frames = getattr(settings, 'CATTAX_STORE_FRAME_RESULTS', True)
+        self.analysis_id = analysis_id
+        self.total_frames = total_frames
+        self.flush_frames = max(1, int(flush_frames))
+        self.flush_seconds = flush_seconds
+        self.track_progress = track_progress
+        self.store_frames = store_frames
+        self.fps = fps
+        self.profiler = profiler or NULL_PROFILER
+        self.frame_count = start_frame
+        self.behavior_counts = Counter()
+        self._buffer = []
+        self._buffer_start = start_frame
+        self._flushed_frames = start_frame
+        self._last_flush = time.monotonic()
+        # 猫短暂漏检不超过 max_gap 帧时不拆分区间
+        max_gap = round((fps or 25.0) * getattr(settings, 'CATTAX_TIMELINE_MAX_GAP_SECONDS', 0.5))
+        self.segments = SegmentWriter(analysis_id)
+        self.segmenter = BehaviorSegmenter(self.segments.append, max_gap=max_gap,
+                                           position_step=getattr(settings, 'CATTAX_TIMELINE_POSITION_STEP', 10))
+        self.interactions = interactions.InteractionDetector() if getattr(settings, 'CATTAX_INTERACTIONS', True) else None
+
+    def append(self, frame_results):
+        """追加一帧结果，必要时写入数据库"""
+        if self.interactions is not None:
+            # 事件附加到涉及的猫的检测结果上，随分块写入，也随 frames 事件推送
+            interactions.attach(frame_results, self.interactions.update(frame_results))
+        if self.store_frames:
+            self._buffer.append(frame_results)
+        self.segmenter.update(self.frame_count, frame_results)
+        self.frame_count += 1
+        for detection in frame_results:
+            self.behavior_counts[(detection['cat_id'], detection['behavior'])] += 1
+
+        if (len(self._buffer) >= self.flush_frames
+                or len(self.segments.pending) >= self.flush_frames
+                or time.monotonic() - self._last_flush >= self.flush_seconds):
+            self.flush()
+
+    def get_state(self):
+        """先 flush，再返回继续写入所需的状态（已写帧数、行为计数、未关闭的行为区间、最后写入的区间 ID）"""
+        self.flush()
+        return {
+            'frame_count': self.frame_count,
+            'behavior_counts': list(self.behavior_counts.items()),
+            'open_segments': copy.deepcopy(self.segmenter.open_segments),
+            'segment_count': self.segments.segment_count,
+            'last_segment_id': BehaviorSegment.objects.filter(analysis_id=self.analysis_id).aggregate(
+                last=Max('id'))['last'],
+            'interactions': self.interactions.get_state() if self.interactions is not None else None,
+        }
+
+    def set_state(self, state):
+        """恢复到 get_state() 时的状态，并删除之后写入的分块和区间（任务在两次检查点之间中断时留下的）"""
+        self.frame_count = self._buffer_start = self._flushed_frames = state['frame_count']
+        self.behavior_counts = Counter(dict(state['behavior_counts']))
+        self.segmenter.open_segments = state['open_segments']
+        self.segments.segment_count = state['segment_count']
+        if self.interactions is not None and state.get('interactions') is not None:
+            self.interactions.set_state(state['interactions'])
+        FrameResultChunk.objects.filter(analysis_id=self.analysis_id, start_frame__gte=self.frame_count).delete()
+        segments = BehaviorSegment.objects.filter(analysis_id=self.analysis_id)
+        if state['last_segment_id'] is not None:
+            segments = segments.filter(id__gt=state['last_segment_id'])
+        segments.delete()
+
+    def clear(self):
+        """删除这个分析已写入的全部分块和区间（重新分析前调用）"""
+        FrameResultChunk.objects.filter(analysis_id=self.analysis_id).delete()
+        BehaviorSegment.objects.filter(analysis_id=self.analysis_id).delete()
+
+    def progress(self):
+        if not self.total_frames:
+            return 0.0
+        return min(self.frame_count / self.total_frames * 100, 100.0)
+
+    def flush(self):
+        """把缓存的帧写成一个分块，并更新进度"""
+        start = time.perf_counter()
+        frames = self.frame_count - self._flushed_frames
+        if self._buffer:
+            FrameResultChunk.objects.create(
+                analysis_id=self.analysis_id,
+                start_frame=self._buffer_start,
+                end_frame=self._buffer_start + len(self._buffer),
+                frames=self._buffer
+            )
+            self._buffer_start += len(self._buffer)
+            self._buffer = []
+        self.segments.write()
+        if self.track_progress:
+            # updated_at 同时作为任务的心跳，见 scheduler.recover_jobs()
+            VideoAnalysis.objects.filter(id=self.analysis_id).update(progress=self.progress(),
+                                                                     updated_at=timezone.now())
+        self._last_flush = time.monotonic()
+        self._flushed_frames = self.frame_count
+        if frames:
+            self.profiler.observe('db', time.perf_counter() - start, frames)
+
+    def summary(self):
+        per_cat = {}
+        for (cat_id, behavior), count in sorted(self.behavior_counts.items(), key=lambda item: str(item[0])):
+            per_cat.setdefault(str(cat_id), {})[behavior] = count
+        return {
+            'total_frames': self.frame_count,
+            'behavior_frames': per_cat,
+        }
+
+    def close(self):
+        """关闭所有行为区间并写入剩余分块和区间"""
+        self.segmenter.close_all()
+        self.flush()
+
+    def finish(self, **extra):
+        """写入剩余分块和区间，并一次性写入最终汇总"""
+        self.close()
+        results = {
+            'summary': self.summary(),
+            'frames_stored': self.frame_count if self.store_frames else 0,
+            'fps': self.fps,
+            'timeline': {'segments': self.segments.segment_count, 'position_step': self.segmenter.position_step},
+        }
+        if self.interactions is not None:
+            results['interactions'] = self.interactions.summary()
+        results.update(extra)
+        VideoAnalysis.objects.filter(id=self.analysis_id).update(progress=100.0, results=results)
+        return results
+
+
+def _to_datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc) if timestamp is not None else None
+
+
+class SegmentWriter:
+    """行为区间的批量写入
+
+    关闭的区间先缓存，实时流每隔 flush_seconds 秒调用 flush() 写入，同时把按猫、行为累计的
+    帧数和时长写入 VideoAnalysis.results['summary']；视频文件由 ResultsWriter 调用 write()
+    只写区间。内存只与两次写入之间的区间数有关。
+    实时流不保存逐帧结果，传入 interactions（InteractionDetector）时由 add_interactions() 逐帧检测，
+    接近和互动开始的事件与区间一起在 flush() 时写入 results['events']，按猫对的汇总写入 results['interactions']。
+    """
+
+    def __init__(self, analysis_id, flush_seconds=None, interactions=None):
+        if flush_seconds is None:
+            flush_seconds = getattr(settings, 'CATTAX_STREAM_FLUSH_SECONDS', 10.0)
+        self.analysis_id = analysis_id
+        self.flush_seconds = flush_seconds
+        self.interactions = interactions
+        self.segment_count = 0
+        self.behavior_frames = Counter()
+        self.behavior_seconds = Counter()
+        self._buffer = []
+        self._events = []
+        self._last_flush = time.monotonic()
+
+    @property
+    def pending(self):
+        return self._buffer
+
+    def append(self, segment):
+        self._buffer.append(BehaviorSegment(
+            analysis_id=self.analysis_id,
+            cat_id=segment['cat_id'],
+            behavior=segment['behavior'],
+            start_frame=segment['start_frame'],
+            end_frame=segment['end_frame'],
+            frames=segment['frames'],
+            started_at=_to_datetime(segment['started_at']),
+            ended_at=_to_datetime(segment['ended_at']),
+            position_stats=segment.get('position_stats', {}),
+            position_step=segment.get('position_step', 1),
+            positions=segment.get('positions', {})
+        ))
+        key = (segment['cat_id'], segment['behavior'])
+        self.behavior_frames[key] += segment['frames']
+        if segment['started_at'] is not None and segment['ended_at'] is not None:
+            self.behavior_seconds[key] += segment['ended_at'] - segment['started_at']
+
+    def add_interactions(self, frame_index, frame_results, timestamp=None):
+        """检测一帧中猫之间的接近和互动，返回这一帧的事件
+
+        同一对猫持续接近时每帧都有事件，只缓存接近开始（第 1 帧）和记为互动（第 min_frames 帧）的事件。
+        """
+        if self.interactions is None:
+            return []
+        events = self.interactions.update(frame_results)
+        for event in events:
+            if event['frames'] == 1 or event['frames'] == self.interactions.min_frames:
+                self._events.append({'frame': frame_index, 'time': timestamp, **event})
+        return events
+
+    def due(self):
+        return time.monotonic() - self._last_flush >= self.flush_seconds
+
+    def summary(self):
+        per_cat = {}
+        for (cat_id, behavior), frames in sorted(self.behavior_frames.items(), key=lambda item: str(item[0])):
+            per_cat.setdefault(str(cat_id), {})[behavior] = {
+                'frames': frames,
+                'seconds': round(self.behavior_seconds[(cat_id, behavior)], 2),
+            }
+        return {'segments': self.segment_count, 'behaviors': per_cat}
+
+    def write(self):
+        """只写入缓存的区间，不更新 results"""
+        if self._buffer:
+            BehaviorSegment.objects.bulk_create(self._buffer)
+            self.segment_count += len(self._buffer)
+            self._buffer = []
+
+    def flush(self, **extra):
+        """写入缓存的区间并更新汇总，extra 一并写入 results
+
+        results['events'] 为上一次 flush() 之后的互动事件，同时随 live 事件推送给订阅者。
+        """
+        self.write()
+        results = {'summary': self.summary()}
+        if self.interactions is not None:
+            results['interactions'] = self.interactions.summary()
+            results['events'] = self._events
+            self._events = []
+        results.update(extra)
+        # updated_at 同时作为实时流的心跳，见 scheduler.recover_streams()
+        VideoAnalysis.objects.filter(id=self.analysis_id).update(results=results, updated_at=timezone.now())
+        self._last_flush = time.monotonic()
+        return results
+
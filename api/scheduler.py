@@ -0,0 +1,263 @@
+import os
+import struct
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThan
+from django.utils import timezone
+
+from cattax.ingest import MP4_EXTENSIONS, mp4_video_info
+from . import events, jobs
+from .models import VideoAnalysis
+
+JOB_CLASSES = ('short', 'long')
+REFERENCE_PIXELS = 1280 * 720  # 成本估算以 720p 帧为基准
+
+
+def client_id(request):
+    """上传者标识：优先 X-Client-Id 请求头，其次登录用户名，最后客户端 IP"""
+    header = request.headers.get('X-Client-Id', '').strip()
+    if header:
+        return header[:64]
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.get_username()}'[:64]
+    return request.META.get('REMOTE_ADDR', '')[:64]
+
+
+def estimate_seconds(frames, width, height):
+    """按帧数和分辨率估算处理时长（秒）
+
+    推理时输入统一缩放到模型尺寸，每帧耗时与分辨率关系不大；解码、缩放和轮廓提取
+    与像素数成正比。这里各按一半计，再除以 720p 下的吞吐 CATTAX_SCHEDULER_FRAMES_PER_SECOND。
+    """
+    pixels_ratio = width * height / REFERENCE_PIXELS if width and height else 1.0
+    frames_per_second = getattr(settings, 'CATTAX_SCHEDULER_FRAMES_PER_SECOND', 10.0)
+    return frames * (0.5 + 0.5 * pixels_ratio) / frames_per_second
+
+
+def estimate_cost(video_path, scale=1.0):
+    """不解码视频估算成本，返回帧数、分辨率、估算时长和估算来源 source
+
+    MP4/MOV 从 moov 读出视频轨道的帧数和分辨率（source='header'），不导入 OpenCV；其它容器、
+    moov 还没上传到或读不出时按文件大小和 CATTAX_SCHEDULER_BYTES_PER_FRAME 估算帧数、分辨率按 720p 计
+    （source='size'），worker 开始处理时按解码器读到的帧数和分辨率更正（见 correct_estimate）。
+    scale 用于上传中的文件按已上传比例放大，只作用于按大小的估算：moov 中的帧数已经是整个视频的。
+    """
+    info = None
+    if os.path.splitext(video_path)[1].lower() in MP4_EXTENSIONS:
+        try:
+            info = mp4_video_info(video_path)
+        except (OSError, struct.error) as e:
+            print(f"Could not read MP4 header of {video_path}: {str(e)}")
+    if info is not None:
+        frames, width, height = info
+        source = 'header'
+    else:
+        bytes_per_frame = getattr(settings, 'CATTAX_SCHEDULER_BYTES_PER_FRAME', 12500)
+        frames = int(os.path.getsize(video_path) * scale / bytes_per_frame)
+        width, height = 0, 0
+        source = 'size'
+    return {'frames': frames, 'width': width, 'height': height, 'source': source,
+            'seconds': round(estimate_seconds(frames, width, height), 1)}
+
+
+def correct_estimate(analysis_id, frames, width, height):
+    """worker 打开视频后按实际帧数和分辨率更正估算时长（队列已经分好，不再改变）"""
+    seconds = round(estimate_seconds(frames, width, height), 1) if frames > 0 else None
+    VideoAnalysis.objects.filter(id=analysis_id).update(estimated_seconds=seconds)
+    return seconds
+
+
+def classify(seconds):
+    """估算时长不超过 CATTAX_SHORT_JOB_SECONDS 的进 short 队列；无法估算的按 long 处理"""
+    if seconds is None or seconds <= 0:
+        return 'long'
+    return 'short' if seconds <= getattr(settings, 'CATTAX_SHORT_JOB_SECONDS', 120) else 'long'
+
+
+def queue_slots(job_class):
+    """每个队列同时派发的任务数上限，0 表示不限"""
+    if job_class == 'short':
+        return getattr(settings, 'CATTAX_SHORT_QUEUE_SLOTS', 2)
+    return getattr(settings, 'CATTAX_LONG_QUEUE_SLOTS', 2)
+
+
+def time_slice(job_class, growing=False):
+    """long 队列任务每次最多运行的秒数，到时在帧边界保存状态并重新排队；边上传边处理的任务不切片"""
+    if job_class != 'long' or growing:
+        return None
+    return getattr(settings, 'CATTAX_LONG_JOB_TIME_SLICE', 600) or None
+
+
+def pick_next(queued, active_per_client, max_per_client):
+    """公平份额选择下一个派发的任务
+
+    queued 为按排队时间排序的 (job_id, client_id) 序列，active_per_client 为各客户端正在运行的任务数。
+    跳过已达到 max_per_client 的客户端（0 表示不限），在其余客户端中选运行任务最少的，
+    并列时取排队最早的任务。返回 job_id，没有可派发的任务时返回 None。
+    """
+    best = None
+    seen = set()
+    for job_id, client in queued:
+        if client in seen:
+            continue
+        seen.add(client)
+        active = active_per_client.get(client, 0)
+        if max_per_client and active >= max_per_client:
+            continue
+        if best is None or active < best[0]:
+            best = (active, job_id)
+    return best[1] if best else None
+
+
+def _active_jobs():
+    return VideoAnalysis.objects.filter(status='processing').exclude(job_class='')
+
+
+def _next_job(job_class):
+    active = _active_jobs().filter(job_class=job_class)
+    slots = queue_slots(job_class)
+    if slots and active.count() >= slots:
+        return None
+    active_per_client = dict(
+        active.values('client_id').annotate(jobs=Count('id')).values_list('client_id', 'jobs')
+    )
+    queued = VideoAnalysis.objects.filter(status='queued', job_class=job_class).order_by(
+        'queued_at', 'id'
+    ).values_list('id', 'client_id')
+    return pick_next(queued, active_per_client, getattr(settings, 'CATTAX_MAX_ACTIVE_JOBS_PER_CLIENT', 1))
+
+
+def _count(jobs):
+    """jobs（同一个 job_class 的任务）的数量，作为子查询嵌入外层语句"""
+    counts = jobs.order_by().values('job_class').annotate(jobs=Count('id')).values('jobs')
+    return Coalesce(Subquery(counts[:1]), 0)
+
+
+def _claim(job_id, job_class):
+    """条件更新抢占一个排队中的任务，返回是否抢到
+
+    运行中的任务数在同一条 UPDATE 语句中重新统计，而不是沿用 _next_job 读到的值：
+    多个任务同时结束、并发调用 dispatch() 时都可能读到同一个空槽，只有槽位仍有空余的那次更新生效，
+    队列不会超过 queue_slots()，同一客户端也不会超过 CATTAX_MAX_ACTIVE_JOBS_PER_CLIENT。
+    """
+    claim = VideoAnalysis.objects.filter(id=job_id, status='queued')
+    active = _active_jobs().filter(job_class=job_class)
+    slots = queue_slots(job_class)
+    if slots:
+        claim = claim.filter(LessThan(_count(active), slots))
+    max_per_client = getattr(settings, 'CATTAX_MAX_ACTIVE_JOBS_PER_CLIENT', 1)
+    if max_per_client:
+        claim = claim.filter(LessThan(_count(active.filter(client_id=OuterRef('client_id'))), max_per_client))
+    # updated_at 作为任务的心跳，见 recover_jobs()
+    return claim.update(status='processing', updated_at=timezone.now()) > 0
+
+
+def _send(analysis_id):
+    analysis = VideoAnalysis.objects.get(pk=analysis_id)
+    print(f"Dispatching analysis {analysis.id} to {analysis.job_class} queue "
+          f"(client {analysis.client_id or '-'}, ~{analysis.estimated_seconds}s)")
+    return jobs.send(jobs.PROCESS_VIDEO, (analysis.video_file.path, analysis.id), analysis.job_options,
+                     queue=analysis.job_class)
+
+
+def recover_streams():
+    """把心跳停止的实时流标记为失败，返回 ID 列表
+
+    实时流任务每隔 CATTAX_STREAM_FLUSH_SECONDS 秒写入一次结果并更新 updated_at。worker 进程被杀掉
+    （OOM、重启、硬超时）时来不及标记失败，超过 CATTAX_STREAM_STALE_SECONDS 秒没有写入的流会一直停在
+    processing，这里把它们标记为 failed。
+    """
+    stale_before = timezone.now() - timedelta(seconds=getattr(settings, 'CATTAX_STREAM_STALE_SECONDS', 300))
+    stale = VideoAnalysis.objects.filter(status='processing', updated_at__lt=stale_before).exclude(stream_url='')
+    recovered = []
+    for analysis_id, results in stale.values_list('id', 'results'):
+        error = 'Stream worker stopped responding'
+        # 条件更新：期间恢复了心跳的流不受影响
+        if VideoAnalysis.objects.filter(id=analysis_id, status='processing', updated_at__lt=stale_before).update(
+                status='failed', results={**(results or {}), 'error': error}):
+            print(f"Stream analysis {analysis_id} stopped responding, marked as failed")
+            events.publish_status(analysis_id, 'failed', error=error)
+            recovered.append(analysis_id)
+    return recovered
+
+
+def recover_jobs():
+    """把心跳停止的视频任务重新排队，返回 ID 列表
+
+    worker 写入逐帧结果时更新进度和 updated_at。被 reject_on_worker_lost 以外的方式中断的任务
+    （硬超时、broker 丢失消息、派发后 worker 从未收到）会一直停在 processing 并占用一个槽位，
+    超过 CATTAX_JOB_STALE_SECONDS 秒没有心跳时按 resume=True 重新排队，从最近的检查点继续。
+    该值应大于任务的硬超时，正常运行的任务不会被误判。
+    """
+    stale_before = timezone.now() - timedelta(seconds=getattr(settings, 'CATTAX_JOB_STALE_SECONDS', 3600))
+    stale = _active_jobs().filter(updated_at__lt=stale_before)
+    recovered = []
+    for analysis_id, job_options in stale.values_list('id', 'job_options'):
+        if VideoAnalysis.objects.filter(id=analysis_id, status='processing', updated_at__lt=stale_before).update(
+                status='queued', queued_at=timezone.now(), job_options={**(job_options or {}), 'resume': True}):
+            print(f"Analysis {analysis_id} stopped responding, requeued")
+            recovered.append(analysis_id)
+    return recovered
+
+
+def dispatch():
+    """把排队中的分析按公平份额派发到 short / long 队列，返回派发的 ID 列表
+
+    broker 中只放有空槽的任务，排队顺序和公平性由这里决定，而不是 broker 的 FIFO：
+    一个客户端一次上传很多长视频时，其它客户端的短视频仍然能排在前面。
+    每个队列同时运行的任务数不超过 queue_slots()，同一客户端在每个队列中同时运行的任务数
+    不超过 CATTAX_MAX_ACTIVE_JOBS_PER_CLIENT。每个任务结束（完成、失败或被抢占）后都会再调用一次，
+    同时检查心跳停止的实时流和视频任务（recover_streams / recover_jobs）。
+    派发失败（broker 不可用等）时任务退回排队状态，不占用槽位，下一次调用时再派发。
+    """
+    recover_streams()
+    recover_jobs()
+    dispatched = []
+    for job_class in JOB_CLASSES:
+        while True:
+            job_id = _next_job(job_class)
+            if job_id is None:
+                break
+            # 被并发的调用抢先（任务已派发或槽位已满）时重新选择
+            if not _claim(job_id, job_class):
+                continue
+            try:
+                _send(job_id)
+            except Exception as e:
+                print(f"Failed to dispatch analysis {job_id}: {str(e)}")
+                # 保留原来的排队时间，下次仍按原来的顺序派发；本次不再派发这个队列
+                VideoAnalysis.objects.filter(id=job_id, status='processing').update(status='queued')
+                break
+            dispatched.append(job_id)
+    return dispatched
+
+
+def submit(analysis, growing=False, scale=1.0):
+    """估算成本并把分析排入调度队列，然后尝试派发；返回更新后的 analysis"""
+    estimate = estimate_cost(analysis.video_file.path, scale)
+    # 空文件等估算不出帧数的按 long 处理
+    seconds = estimate['seconds'] if estimate['frames'] else None
+    job_class = classify(seconds)
+    VideoAnalysis.objects.filter(id=analysis.id).update(
+        status='queued',
+        job_class=job_class,
+        estimated_seconds=seconds,
+        queued_at=timezone.now(),
+        job_options={'growing': growing} if growing else {}
+    )
+    dispatch()
+    analysis.refresh_from_db()
+    return analysis
+
+
+def requeue(analysis_id, **job_options):
+    """被抢占的任务重新排到队尾，下次派发时带上 job_options（例如 resume=True）"""
+    VideoAnalysis.objects.filter(id=analysis_id).update(
+        status='queued',
+        queued_at=timezone.now(),
+        job_options=job_options
+    )
@@ -5,4 +5,31 @@ class VideoAnalysisSerializer(serializers.ModelSerializer):
     class Meta:
         model = VideoAnalysis
         fields = ['id', 'video_file', 'processed_video', 'status', 'progress', 'results']
-        read_only_fields = ['processed_video', 'status', 'progress', 'results'] 
\ No newline at end of file
+        read_only_fields = ['processed_video', 'status', 'progress', 'results']
+
+
+def encode_frames(frames, since_frame, layout='rows'):
+    """把从 since_frame 开始的连续逐帧结果编码为响应数据
+
+    - rows：与 results['frames'] 相同的嵌套列表
+    - columnar：按列展开为 frame / cat_id / behavior / x / y 五个等长数组，
+      behavior 为 behaviors 表中的下标
+    """
+    if layout != 'columnar':
+        return {'frames': frames}
+
+    behaviors = []
+    behavior_codes = {}
+    columns = {'frame': [], 'cat_id': [], 'behavior': [], 'x': [], 'y': []}
+    for offset, frame_results in enumerate(frames):
+        for det in frame_results:
+            behavior = det['behavior']
+            if behavior not in behavior_codes:
+                behavior_codes[behavior] = len(behaviors)
+                behaviors.append(behavior)
+            columns['frame'].append(since_frame + offset)
+            columns['cat_id'].append(det['cat_id'])
+            columns['behavior'].append(behavior_codes[behavior])
+            columns['x'].append(det['position'][0])
+            columns['y'].append(det['position'][1])
+    return {'behaviors': behaviors, 'columns': columns}
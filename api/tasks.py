@@ -1,22 +1,198 @@
-from celery import shared_task
-from cattax.cat_capture import process_video
+import cv2
+from celery import shared_task, chord, group, current_app
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from cattax.cat_capture import process_video, open_video, reanalyze_video
 from cattax.cat_behavior import CatBehaviorAnalyzer
+from cattax import checkpoint, chunking
+from cattax.live import process_stream
 from .models import VideoAnalysis
+from . import events, media_store, scheduler, uploads
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
-@shared_task(name='api.tasks.process_video_task')  # 使用完整的任务名称
-def process_video_task(video_path, analysis_id):  # 移除 bind=True 和 self
+# 视频任务的硬超时（秒），实时流任务不设
+TASK_TIME_LIMIT = 30 * 60
+
+
+def mark_failed(analysis_id, e):
+    VideoAnalysis.objects.filter(id=analysis_id).update(
+        status='failed',
+        results={'error': str(e)}
+    )
+    events.publish_status(analysis_id, 'failed', error=str(e))
+
+
+def dispatch_next():
+    """任务结束（完成、失败或被抢占）后派发下一个排队的分析，调度出错不影响当前任务"""
+    try:
+        scheduler.dispatch()
+    except Exception as e:
+        logger.error(f"Error dispatching queued analyses: {str(e)}", exc_info=True)
+
+
+def correct_estimate(video_path, analysis_id):
+    """上传时不解码估算的成本（见 scheduler.estimate_cost）按解码器读到的帧数和分辨率更正，出错不影响处理"""
+    try:
+        cap = cv2.VideoCapture(video_path)
+        try:
+            frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        finally:
+            cap.release()
+        scheduler.correct_estimate(analysis_id, frames, width, height)
+    except Exception as e:
+        print(f"Could not correct cost estimate for analysis {analysis_id}: {str(e)}")
+
+
+def run_deadline(task, job_class, growing):
+    """本次运行的截止时间（time.monotonic()），没有限制时返回 None
+
+    取 long 任务的时间片和 Celery 硬超时前 CATTAX_TIME_LIMIT_MARGIN 秒中较早的一个：
+    到时保存检查点并重新排队，而不是被硬超时直接杀掉、从头再来。
+    """
+    budgets = []
+    time_slice = scheduler.time_slice(job_class, growing)
+    if time_slice:
+        budgets.append(time_slice)
+    time_limit = task.time_limit or current_app.conf.task_time_limit
+    if time_limit:
+        margin = getattr(settings, 'CATTAX_TIME_LIMIT_MARGIN', 120)
+        budgets.append(max(time_limit - margin, time_limit / 2))
+    return time.monotonic() + min(budgets) if budgets else None
+
+
+# acks_late + reject_on_worker_lost：worker 进程崩溃时任务消息重新投递，从最近的检查点继续
+@shared_task(name='api.tasks.process_video_task', acks_late=True, reject_on_worker_lost=True,
+             time_limit=TASK_TIME_LIMIT)  # 使用完整的任务名称
+def process_video_task(video_path, analysis_id, growing=False, resume=False, profile=None):  # 移除 bind=True 和 self
+    """growing=True 表示视频仍在分块上传中，边上传边处理（不分段）
+
+    long 队列的任务每次最多运行 CATTAX_LONG_JOB_TIME_SLICE 秒，到时保存检查点并重新排队，
+    下次派发时以 resume=True 从检查点继续，让排在后面的短任务先执行。
+    有检查点时（例如 worker 崩溃后重新投递）总是从检查点继续。
+    profile='cprofile' / 'sample' 只剖析这一个任务（默认取 CATTAX_PROFILER）。
+    """
     try:
         print(f"Starting to process video: {video_path} with ID: {analysis_id}")  # 添加日志
-        process_video(video_path, analysis_id)
+        job_class = VideoAnalysis.objects.values_list('job_class', flat=True).get(pk=analysis_id)
+        resume = resume or checkpoint.exists(analysis_id)
+        # 第一次运行时更正估算时长；上传中的文件解码器读到的帧数不完整，保留上传时的估算
+        if not resume and not growing:
+            correct_estimate(video_path, analysis_id)
+
+        # 长视频切分成多段并行处理
+        chunk_frames = getattr(settings, 'CATTAX_CHUNK_FRAMES', 0)
+        if chunk_frames and not growing and not resume:
+            cap, _, _, total_frames = open_video(video_path)
+            cap.release()
+            if total_frames > chunk_frames:
+                chunks = chunking.plan_chunks(total_frames, chunk_frames,
+                                              getattr(settings, 'CATTAX_CHUNK_OVERLAP', 30))
+                print(f"Splitting video {analysis_id} into {len(chunks)} chunks")
+                dispatch_chunks(video_path, analysis_id, chunks, queue=job_class or None)
+                return
+
+        deadline = run_deadline(process_video_task, job_class, growing)
+        output = process_video(video_path, analysis_id, growing=growing, deadline=deadline, resume=resume,
+                               profile=profile)
+        if output['preempted']:
+            job_options = {'resume': True}
+            if growing:
+                job_options['growing'] = True
+            if profile:
+                job_options['profile'] = profile
+            scheduler.requeue(analysis_id, **job_options)
+            print(f"Video {analysis_id} requeued at frame {output['next_frame']}")
+            return
+        if growing:
+            uploads.finish_streamed(analysis_id, video_path)
         print(f"Video processing completed for ID: {analysis_id}")  # 添加日志
+        media_store.evict()
     except Exception as e:
         print(f"Error in process_video_task: {str(e)}")
         logger.error(f"Error processing video {analysis_id}: {str(e)}", exc_info=True)  # 添加详细错误日志
-        VideoAnalysis.objects.filter(id=analysis_id).update(
-            status='failed',
-            results={'error': str(e)}
-        )
-        raise 
\ No newline at end of file
+        mark_failed(analysis_id, e)
+        raise 
+    finally:
+        dispatch_next()
+
+
+@shared_task(name='api.tasks.reanalyze_task', time_limit=TASK_TIME_LIMIT)
+def reanalyze_task(analysis_id, thresholds=None):
+    """用检测旁路文件按新的行为阈值重新分析，只用 CPU、不加载模型，不占用 short / long 调度槽位"""
+    try:
+        reanalyze_video(analysis_id, thresholds)
+        # 结果按新的阈值计算，缓存键随之改变，相同参数的上传才会命中
+        video_hash = VideoAnalysis.objects.values_list('video_hash', flat=True).get(pk=analysis_id)
+        if video_hash:
+            VideoAnalysis.objects.filter(id=analysis_id).update(
+                cache_key=media_store.cache_key(video_hash, media_store.analysis_params(thresholds))
+            )
+    except Exception as e:
+        logger.error(f"Error reanalyzing video {analysis_id}: {str(e)}", exc_info=True)
+        mark_failed(analysis_id, e)
+        raise
+
+
+# 不设硬超时：摄像头可能全天运行。被杀掉时来不及标记失败，由 scheduler.recover_streams() 按心跳发现
+@shared_task(name='api.tasks.process_stream_task')
+def process_stream_task(source, analysis_id, max_seconds=None, realtime=False):
+    """长时间运行的实时视频流分析，直到源结束、收到停止请求或超过 max_seconds"""
+    try:
+        process_stream(source, analysis_id, max_seconds=max_seconds, realtime=realtime)
+        print(f"Stream analysis finished for ID: {analysis_id}")
+    except Exception as e:
+        logger.error(f"Error analyzing stream {analysis_id}: {str(e)}", exc_info=True)
+        mark_failed(analysis_id, e)
+        raise
+
+
+def dispatch_chunks(video_path, analysis_id, chunks, queue=None):
+    """分段任务：worker 模式下用 chord 并行（发到 queue 队列），eager 模式下用本地进程池"""
+    if current_app.conf.task_always_eager:
+        chunk_infos = chunking.run_chunks_locally(video_path, analysis_id, chunks)
+        chunking.finalize_chunks(video_path, analysis_id, chunk_infos)
+        media_store.evict()
+        return
+    chord(
+        group(process_video_chunk_task.s(video_path, analysis_id, chunk, len(chunks)).set(queue=queue)
+              for chunk in chunks)
+    )(merge_video_chunks_task.s(video_path, analysis_id).set(queue=queue))
+
+
+@shared_task(name='api.tasks.process_video_chunk_task', time_limit=TASK_TIME_LIMIT)
+def process_video_chunk_task(video_path, analysis_id, chunk, chunk_count):
+    try:
+        # 分段各自写进度之前先更新一次心跳（updated_at），见 scheduler.recover_jobs()
+        VideoAnalysis.objects.filter(id=analysis_id).update(updated_at=timezone.now())
+        info = chunking.process_chunk(video_path, analysis_id, chunk)
+        # 每完成一段推进一部分进度，合并阶段再设为 100%
+        VideoAnalysis.objects.filter(id=analysis_id).update(progress=F('progress') + 90.0 / chunk_count,
+                                                            updated_at=timezone.now())
+        progress = VideoAnalysis.objects.values_list('progress', flat=True).get(id=analysis_id)
+        events.publish(analysis_id, 'progress', progress=progress)
+        return info
+    except Exception as e:
+        logger.error(f"Error processing chunk {chunk['index']} of video {analysis_id}: {str(e)}", exc_info=True)
+        mark_failed(analysis_id, e)
+        dispatch_next()
+        raise
+
+
+@shared_task(name='api.tasks.merge_video_chunks_task', time_limit=TASK_TIME_LIMIT)
+def merge_video_chunks_task(chunk_infos, video_path, analysis_id):
+    try:
+        chunking.finalize_chunks(video_path, analysis_id, chunk_infos)
+        print(f"Video processing completed for ID: {analysis_id} ({len(chunk_infos)} chunks)")
+        media_store.evict()
+    except Exception as e:
+        logger.error(f"Error merging chunks of video {analysis_id}: {str(e)}", exc_info=True)
+        mark_failed(analysis_id, e)
+        raise
+    finally:
+        dispatch_next()
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from cattax.interactions import InteractionDetector
+from .models import VideoAnalysis, FrameResultChunk
+from . import media_store, scheduler, uploads
+from .results_store import ResultsWriter, SegmentWriter
+
+
+def detection(cat_id, position, behavior='resting'):
+    return {'cat_id': cat_id, 'behavior': behavior, 'position': position}
+
+
+@override_settings(CATTAX_INTERACTIONS=True, CATTAX_INTERACTION_DISTANCE=100, CATTAX_INTERACTION_MIN_FRAMES=2)
+class ResultsWriterInteractionTests(TestCase):
+    def setUp(self):
+        self.analysis = VideoAnalysis.objects.create(video_file='videos/test.mp4')
+
+    def test_stored_frames_contain_interaction_events(self):
+        writer = ResultsWriter(self.analysis.id, total_frames=3, flush_frames=10, fps=25)
+        writer.append([detection(1, (100, 100)), detection(2, (400, 100))])
+        writer.append([detection(1, (100, 100)), detection(2, (150, 100))])
+        writer.append([detection(1, (100, 100)), detection(2, (160, 100))])
+        results = writer.finish()
+
+        frames = [frame for _, frame in self.analysis.iter_frames()]
+        self.assertEqual(len(frames), 3)
+        self.assertNotIn('interactions', frames[0][0])
+        self.assertEqual(frames[1][0]['interactions'],
+                         [{'type': 'proximity', 'cat': 2, 'distance': 50.0, 'frames': 1}])
+        self.assertEqual(frames[2][1]['interactions'],
+                         [{'type': 'interaction', 'cat': 1, 'distance': 60.0, 'frames': 2}])
+        self.assertEqual(FrameResultChunk.objects.filter(analysis=self.analysis).count(), 1)
+        self.assertEqual(results['interactions'], [
+            {'cats': [1, 2], 'proximity_frames': 2, 'interaction_frames': 2, 'interactions': 1},
+        ])
+
+    def test_live_writer_stores_interaction_events_with_segments(self):
+        writer = SegmentWriter(self.analysis.id, interactions=InteractionDetector())
+        for frame_index in range(3):
+            writer.add_interactions(frame_index, [detection(1, (100, 100)), detection(2, (150, 100))], 10.0 + frame_index)
+        results = writer.flush()
+
+        self.assertEqual([(event['frame'], event['type']) for event in results['events']],
+                         [(0, 'proximity'), (1, 'interaction')])
+        self.assertEqual(results['events'][0]['time'], 10.0)
+        self.analysis.refresh_from_db()
+        self.assertEqual(self.analysis.results['events'], results['events'])
+        self.assertEqual(self.analysis.results['interactions'][0]['interactions'], 1)
+        self.assertEqual(writer.flush()['events'], [])
+
+
+@override_settings(CATTAX_SHORT_QUEUE_SLOTS=2, CATTAX_MAX_ACTIVE_JOBS_PER_CLIENT=0)
+class SchedulerDispatchTests(TransactionTestCase):
+    def queue(self, count, client='client'):
+        return [VideoAnalysis.objects.create(video_file=f'uploads/{client}-{i}.mp4', status='queued',
+                                             job_class='short', client_id=client).id
+                for i in range(count)]
+
+    def test_concurrent_dispatch_respects_slot_limit(self):
+        VideoAnalysis.objects.create(video_file='uploads/running.mp4', status='processing', job_class='short')
+        self.queue(4)
+        next_job, pick_next, claim = scheduler._next_job, scheduler.pick_next, scheduler._claim
+        # 两个 dispatch() 交错执行：b 统计运行中的任务数（还有一个空槽）之后，a 抢占并派发一个任务，
+        # b 再读取排队中的任务并抢占另一个。数据库访问由事件排成先后顺序（内存 SQLite 不支持并发写）。
+        b_counted, a_claimed, b_done = threading.Event(), threading.Event(), threading.Event()
+        calls = {'a': 0, 'b': 0}
+
+        def ordered_next_job(job_class):
+            name = threading.current_thread().name
+            if name == 'a' and job_class == 'short':
+                calls['a'] += 1
+                (b_counted if calls['a'] == 1 else b_done).wait(10)
+            return next_job(job_class)
+
+        def ordered_pick_next(queued, active_per_client, max_per_client):
+            if threading.current_thread().name == 'b' and not calls['b']:
+                calls['b'] += 1
+                b_counted.set()
+                a_claimed.wait(10)
+            return pick_next(queued, active_per_client, max_per_client)
+
+        def ordered_claim(job_id, job_class):
+            claimed = claim(job_id, job_class)
+            if threading.current_thread().name == 'a':
+                a_claimed.set()
+            return claimed
+
+        dispatched = []
+
+        def run():
+            try:
+                dispatched.extend(scheduler.dispatch())
+            finally:
+                if threading.current_thread().name == 'b':
+                    b_done.set()
+                connection.close()
+
+        with mock.patch.object(scheduler, '_next_job', ordered_next_job), \
+                mock.patch.object(scheduler, 'pick_next', ordered_pick_next), \
+                mock.patch.object(scheduler, '_claim', ordered_claim), \
+                mock.patch.object(scheduler, '_send'):
+            threads = [threading.Thread(target=run, name=name) for name in ('a', 'b')]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(dispatched), 1)
+        self.assertEqual(VideoAnalysis.objects.filter(status='processing', job_class='short').count(), 2)
+
+    def test_failed_send_returns_job_to_queue(self):
+        first, second = self.queue(2)
+        with mock.patch.object(scheduler, '_send', side_effect=ConnectionError('broker down')) as send:
+            self.assertEqual(scheduler.dispatch(), [])
+        send.assert_called_once_with(first)
+        self.assertEqual(VideoAnalysis.objects.filter(status='queued').count(), 2)
+
+        with mock.patch.object(scheduler, '_send'):
+            self.assertEqual(scheduler.dispatch(), [first, second])
+
+    @override_settings(CATTAX_JOB_STALE_SECONDS=600)
+    def test_stale_jobs_are_requeued(self):
+        stale, alive = self.queue(2)
+        VideoAnalysis.objects.filter(id__in=(stale, alive)).update(status='processing', job_options={'growing': True})
+        VideoAnalysis.objects.filter(id=stale).update(updated_at=timezone.now() - timedelta(seconds=900))
+        self.assertEqual(scheduler.recover_jobs(), [stale])
+        analysis = VideoAnalysis.objects.get(id=stale)
+        self.assertEqual(analysis.status, 'queued')
+        self.assertEqual(analysis.job_options, {'growing': True, 'resume': True})
+        self.assertEqual(VideoAnalysis.objects.get(id=alive).status, 'processing')
+
+    @override_settings(CATTAX_MAX_ACTIVE_JOBS_PER_CLIENT=1)
+    def test_claim_respects_client_limit(self):
+        first, second = self.queue(2)
+        self.assertTrue(scheduler._claim(first, 'short'))
+        self.assertFalse(scheduler._claim(second, 'short'))
+        self.assertEqual(VideoAnalysis.objects.get(id=second).status, 'queued')
+
+
+@override_settings(CATTAX_STREAM_STALE_SECONDS=60, CATTAX_EVENTS_URL='')
+class StreamRecoveryTests(TestCase):
+    def stream(self, seconds_ago, status='processing'):
+        analysis = VideoAnalysis.objects.create(stream_url='rtsp://camera', status=status, results={'live': {}})
+        VideoAnalysis.objects.filter(id=analysis.id).update(updated_at=timezone.now() - timedelta(seconds=seconds_ago))
+        return analysis.id
+
+    def test_streams_without_heartbeat_are_marked_failed(self):
+        stale, alive, done = self.stream(120), self.stream(10), self.stream(120, status='completed')
+        self.assertEqual(scheduler.recover_streams(), [stale])
+        analysis = VideoAnalysis.objects.get(id=stale)
+        self.assertEqual(analysis.status, 'failed')
+        self.assertEqual(analysis.results['live'], {})
+        self.assertIn('error', analysis.results)
+        self.assertEqual(VideoAnalysis.objects.get(id=alive).status, 'processing')
+        self.assertEqual(VideoAnalysis.objects.get(id=done).status, 'completed')
+
+    def test_stream_task_has_no_time_limit(self):
+        from . import tasks
+
+        self.assertIsNone(tasks.process_stream_task.time_limit)
+        self.assertIsNone(tasks.process_stream_task.soft_time_limit)
+        self.assertFalse(tasks.process_stream_task.app.conf.task_time_limit)
+        self.assertEqual(tasks.process_video_task.time_limit, tasks.TASK_TIME_LIMIT)
+
+
+@override_settings(CATTAX_UPLOAD_EARLY_START_BYTES=0)
+class UploadHashTests(TestCase):
+    DATA = bytes(range(256)) * 1000
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.enterContext(mock.patch.object(scheduler, '_send'))
+
+    def upload(self, chunk_size=100000):
+        analysis = uploads.start('clip.mkv', len(self.DATA))
+        for index, offset in enumerate(range(0, len(self.DATA), chunk_size)):
+            chunk = SimpleUploadedFile('chunk', self.DATA[offset:offset + chunk_size])
+            uploads.append_chunk(analysis.id, index, offset, chunk)
+        return analysis
+
+    def test_commit_uses_running_hash(self):
+        analysis = self.upload()
+        # 重发已写入的块不影响哈希
+        uploads.append_chunk(analysis.id, 0, 0, SimpleUploadedFile('chunk', self.DATA[:100000]))
+        with mock.patch.object(media_store, 'hash_file') as hash_file:
+            committed, cached = uploads.commit(analysis.id)
+        hash_file.assert_not_called()
+        self.assertFalse(cached)
+        self.assertEqual(committed.video_hash, hashlib.sha256(self.DATA).hexdigest())
+        self.assertNotIn(analysis.id, uploads._digests)
+
+    def test_commit_falls_back_to_hashing_the_file(self):
+        analysis = self.upload()
+        # 块由其它进程接收时这个进程里没有哈希状态
+        uploads._digests.pop(analysis.id)
+        with mock.patch.object(media_store, 'hash_file', wraps=media_store.hash_file) as hash_file:
+            committed, _ = uploads.commit(analysis.id)
+        hash_file.assert_called_once()
+        self.assertEqual(committed.video_hash, hashlib.sha256(self.DATA).hexdigest())
+
+
+class WebImportTests(SimpleTestCase):
+    FORBIDDEN = ('cv2', 'torch', 'ultralytics', 'scipy')
+    PROBE = (
+        "import json, os, sys\n"
+        "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cattax.settings')\n"
+        "import django\n"
+        "django.setup()\n"
+        "import api.views, api.urls\n"
+        "print(json.dumps([name for name in sys.argv[1:] if name in sys.modules]))\n"
+    )
+
+    def test_web_modules_do_not_import_model_dependencies(self):
+        # 在新进程中导入，不受本进程中已加载的分析模块影响
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'cattax.settings'}
+        output = subprocess.run([sys.executable, '-c', self.PROBE, *self.FORBIDDEN], cwd=settings.BASE_DIR,
+                                env=env, check=True, capture_output=True, text=True).stdout
+        self.assertEqual(json.loads(output.strip().splitlines()[-1]), [])
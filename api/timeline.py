@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum
+
+from cattax.timeline import position_at
+from .models import BehaviorSegment
+
+SEGMENT_FIELDS = ('cat_id', 'behavior', 'start_frame', 'end_frame', 'frames', 'started_at', 'ended_at',
+                  'position_stats', 'position_step', 'positions')
+
+
+def behavior_time(analysis_id, fps=None, cat_id=None):
+    """每只猫在每种行为上花费的帧数和时长，直接在行为区间上聚合，不展开逐帧结果
+
+    给出 fps（视频文件，见 results['fps']）时按区间跨度 / fps 计算秒数；
+    实时流没有固定帧率，按区间的墙钟时间累计。
+    返回 {cat_id: {behavior: {'segments', 'frames', 'seconds'}}}，cat_id 为字符串。
+    """
+    segments = BehaviorSegment.objects.filter(analysis_id=analysis_id)
+    if cat_id is not None:
+        segments = segments.filter(cat_id=cat_id)
+    rows = segments.values('cat_id', 'behavior').annotate(
+        segments=Count('id'),
+        frames=Sum('frames'),
+        span=Sum(F('end_frame') - F('start_frame')),
+        duration=Sum(ExpressionWrapper(F('ended_at') - F('started_at'), output_field=DurationField())),
+    ).order_by('cat_id', 'behavior')
+
+    per_cat = {}
+    for row in rows:
+        if fps:
+            seconds = row['span'] / fps
+        else:
+            seconds = (row['duration'] or timedelta()).total_seconds()
+        per_cat.setdefault(str(row['cat_id']), {})[row['behavior']] = {
+            'segments': row['segments'],
+            'frames': row['frames'],
+            'seconds': round(seconds, 2),
+        }
+    return per_cat
+
+
+def behavior_at(analysis_id, frame_index):
+    """第 frame_index 帧每只猫的行为和位置（位置由区间内降采样的轨迹插值）
+
+    只查询覆盖该帧的区间；区间允许包含短暂漏检，漏检的帧也会返回该区间的行为。
+    """
+    segments = BehaviorSegment.objects.filter(
+        analysis_id=analysis_id, start_frame__lte=frame_index, end_frame__gt=frame_index
+    ).values(*SEGMENT_FIELDS).order_by('cat_id')
+    return [{
+        'cat_id': segment['cat_id'],
+        'behavior': segment['behavior'],
+        'position': position_at(segment, frame_index),
+        'start_frame': segment['start_frame'],
+        'end_frame': segment['end_frame'],
+    } for segment in segments]
+
+
+def segments_since(analysis_id, since_frame=0, limit=None):
+    """结束帧大于 since_frame 的行为区间，按起始帧排序"""
+    segments = BehaviorSegment.objects.filter(
+        analysis_id=analysis_id, end_frame__gt=since_frame
+    ).values(*SEGMENT_FIELDS)
+    if limit is not None:
+        segments = segments[:limit]
+    return list(segments)
@@ -0,0 +1,200 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+from cattax.ingest import is_streamable, mark_complete, DONE_SUFFIX
+from . import media_store, scheduler
+from .models import VideoAnalysis
+
+
+# 分块上传的增量 sha256：{analysis_id: (digest, 已哈希的字节数)}，随每块追加更新，提交时直接取结果。
+# 只在接收这些块的进程里有效；块分散到多个进程或进程重启后缺少状态，提交时回退为重新读整个文件
+MAX_RUNNING_DIGESTS = 256
+_digests = OrderedDict()
+_digests_lock = threading.Lock()
+
+
+def _take_digest(analysis_id, offset):
+    """取出从 offset 处继续的哈希状态；offset 为 0 时重新开始，状态对不上时返回 None"""
+    with _digests_lock:
+        entry = _digests.pop(analysis_id, None)
+    if offset == 0:
+        return hashlib.sha256()
+    if entry is not None and entry[1] == offset:
+        return entry[0]
+    return None
+
+
+def _put_digest(analysis_id, digest, size):
+    with _digests_lock:
+        _digests[analysis_id] = (digest, size)
+        # 放弃的上传不会提交，只保留最近的若干个
+        while len(_digests) > MAX_RUNNING_DIGESTS:
+            _digests.popitem(last=False)
+
+
+def _running_hash(analysis_id, size):
+    """已接收 size 字节时的 sha256，没有对应的哈希状态时返回 None"""
+    with _digests_lock:
+        entry = _digests.get(analysis_id)
+    if entry is None or entry[1] != size:
+        return None
+    return entry[0].copy().hexdigest()
+
+
+class UploadConflict(Exception):
+    """分块的 index / offset 与服务端状态不一致，客户端应按返回的状态续传"""
+
+    def __init__(self, message, analysis):
+        super().__init__(message)
+        self.analysis = analysis
+
+
+def upload_state(analysis):
+    return {
+        'id': analysis.id,
+        'status': analysis.status,
+        'index': analysis.upload_chunks,
+        'offset': analysis.upload_received,
+        'size': analysis.upload_size,
+        'committed': analysis.upload_committed,
+    }
+
+
+def start(filename, size=None, client_id=''):
+    """创建一个分块上传，文件写在 uploads/partial/<id><扩展名>"""
+    analysis = VideoAnalysis.objects.create(
+        status='uploading',
+        original_name=filename,
+        upload_size=size,
+        upload_committed=False,
+        client_id=client_id
+    )
+    analysis.video_file = media_store.partial_upload_path(analysis.id, filename)
+    analysis.save(update_fields=['video_file'])
+    os.makedirs(os.path.dirname(analysis.video_file.path), exist_ok=True)
+    open(analysis.video_file.path, 'wb').close()
+    return analysis
+
+
+def append_chunk(analysis_id, index, offset, chunk):
+    """以追加方式写入一块
+
+    index / offset 必须等于服务端已接收的块数和字节数；重发已经写入的块直接确认（幂等），
+    其余不一致抛出 UploadConflict。返回更新后的 VideoAnalysis。
+    """
+    with transaction.atomic():
+        analysis = VideoAnalysis.objects.select_for_update().get(pk=analysis_id)
+        if analysis.upload_committed:
+            raise UploadConflict('Upload already committed', analysis)
+        if index < analysis.upload_chunks and offset + chunk.size <= analysis.upload_received:
+            return analysis
+        if index != analysis.upload_chunks or offset != analysis.upload_received:
+            raise UploadConflict('Unexpected chunk index or offset', analysis)
+        if analysis.upload_size is not None and offset + chunk.size > analysis.upload_size:
+            raise ValueError('Chunk exceeds declared upload size')
+
+        digest = _take_digest(analysis.id, offset)
+        with open(analysis.video_file.path, 'ab') as destination:
+            # 丢弃上一次中断的写入留下的多余字节
+            if destination.tell() != offset:
+                destination.truncate(offset)
+            for part in chunk.chunks():
+                destination.write(part)
+                if digest is not None:
+                    digest.update(part)
+
+        analysis.upload_received = offset + chunk.size
+        analysis.upload_chunks = index + 1
+        analysis.save(update_fields=['upload_received', 'upload_chunks', 'updated_at'])
+        if digest is not None:
+            _put_digest(analysis.id, digest, analysis.upload_received)
+    return analysis
+
+
+def maybe_start_early(analysis):
+    """已上传的部分足够且容器支持顺序解码时，提前排队处理（worker 边读边等后续数据）"""
+    min_bytes = getattr(settings, 'CATTAX_UPLOAD_EARLY_START_BYTES', 0)
+    if analysis.status != 'uploading' or not min_bytes or analysis.upload_received < min_bytes:
+        return False
+    # 已经收齐时等提交，提交时还能命中结果缓存
+    if analysis.upload_size is not None and analysis.upload_received >= analysis.upload_size:
+        return False
+    path = analysis.video_file.path
+    if not is_streamable(path):
+        return False
+    # 用条件更新抢占，保证并发请求只启动一次
+    if not VideoAnalysis.objects.filter(id=analysis.id, status='uploading').update(status='queued'):
+        return False
+    print(f"Starting early processing for upload {analysis.id} ({analysis.upload_received} bytes received)")
+    # 按声明的总大小放大已上传部分的帧数来估算成本
+    scale = analysis.upload_size / analysis.upload_received if analysis.upload_size else 1.0
+    analysis.status = scheduler.submit(analysis, growing=True, scale=scale).status
+    return True
+
+
+def commit(analysis_id):
+    """提交上传：取内容哈希并排队处理
+
+    已提前开始处理时只写入完成标记，worker 读完剩余数据后结束；否则先查结果缓存，
+    命中时删除本次上传并返回已有分析。返回 (analysis, cached)。
+    """
+    analysis = VideoAnalysis.objects.get(pk=analysis_id)
+    if analysis.upload_committed:
+        return analysis, False
+    # 通常用接收分块时累计的哈希；没有时在事务外重新计算，避免大文件长时间占用数据库锁
+    path = analysis.video_file.path
+    hashed = analysis.upload_received
+    video_hash = _running_hash(analysis.id, hashed)
+    if video_hash is None:
+        video_hash = media_store.hash_file(path)
+        hashed = os.path.getsize(path)
+
+    with transaction.atomic():
+        analysis = VideoAnalysis.objects.select_for_update().get(pk=analysis_id)
+        if analysis.upload_committed:
+            return analysis, False
+        if analysis.upload_size is not None and analysis.upload_received != analysis.upload_size:
+            raise UploadConflict('Upload incomplete', analysis)
+        if os.path.getsize(path) != analysis.upload_received or hashed != analysis.upload_received:
+            raise UploadConflict('Chunk arrived during commit', analysis)
+        analysis.video_hash = video_hash
+        analysis.cache_key = media_store.cache_key(analysis.video_hash)
+        analysis.upload_size = analysis.upload_received
+        analysis.upload_committed = True
+        analysis.save(update_fields=['video_hash', 'cache_key', 'upload_size', 'upload_committed', 'updated_at'])
+    with _digests_lock:
+        _digests.pop(analysis.id, None)
+
+    # 与 maybe_start_early 一样用条件更新抢占：已被提前启动时只通知正在处理的 worker
+    if not VideoAnalysis.objects.filter(id=analysis.id, status='uploading').update(status='queued'):
+        mark_complete(path)
+        analysis.refresh_from_db()
+        return analysis, False
+
+    cached = media_store.find_cached(analysis.cache_key, exclude_id=analysis.id)
+    if cached is not None:
+        print(f"Cache hit for upload {analysis.id}: analysis {cached.id}")
+        os.remove(path)
+        analysis.delete()
+        media_store.touch(cached)
+        return cached, True
+
+    analysis.video_file = media_store.store_by_hash(path, analysis.video_hash, os.path.splitext(path)[1])
+    analysis.save(update_fields=['video_file', 'updated_at'])
+    return scheduler.submit(analysis), False
+
+
+def finish_streamed(analysis_id, video_path):
+    """边上传边处理结束后，把上传文件移到内容哈希路径并清理完成标记"""
+    if os.path.exists(video_path + DONE_SUFFIX):
+        os.remove(video_path + DONE_SUFFIX)
+    analysis = VideoAnalysis.objects.get(pk=analysis_id)
+    if not os.path.exists(video_path) or not analysis.video_hash:
+        return
+    relative_path = media_store.store_by_hash(video_path, analysis.video_hash, os.path.splitext(video_path)[1])
+    VideoAnalysis.objects.filter(id=analysis_id).update(video_file=relative_path)
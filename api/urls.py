@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import VideoAnalysisViewSet
+from .views import VideoAnalysisViewSet, analysis_events
 
 router = DefaultRouter()
 router.register(r'analysis', VideoAnalysisViewSet)
 
 urlpatterns = [
+    path('analysis/<int:pk>/events/', analysis_events, name='analysis-events'),
     path('', include(router.urls)),
 ] 
\ No newline at end of file
@@ -3,10 +3,39 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.conf import settings
 import os
-import cv2
-from .serializers import VideoAnalysisSerializer
+from itertools import islice
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from .serializers import VideoAnalysisSerializer, encode_frames
 from .models import VideoAnalysis
-from .tasks import process_video_task
+from cattax.thresholds import behavior_thresholds
+from . import events, jobs, media_store, scheduler, timeline, uploads
+
+RESULTS_PAGE_SIZE = 1000      # 结果接口默认每页帧数
+RESULTS_MAX_PAGE_SIZE = 10000  # 结果接口每页最多帧数
+STREAM_SCHEMES = ('rtsp', 'rtsps', 'rtmp', 'http', 'https')  # 允许的实时流地址协议
+
+
+def parse_thresholds(data):
+    """请求中的 thresholds（覆盖默认值的行为阈值），格式不对时抛出 ValueError"""
+    thresholds = data.get('thresholds') or {}
+    if not isinstance(thresholds, dict):
+        raise ValueError('thresholds must be an object')
+    try:
+        behavior_thresholds(thresholds)
+    except TypeError:
+        raise ValueError('thresholds must be numbers')
+    return thresholds
+
+
+def reanalyzable(analysis_ids):
+    """已结束且有完整检测旁路文件、可以重新分析的 ID"""
+    from cattax import detection_cache
+
+    finished = VideoAnalysis.objects.filter(id__in=analysis_ids, status__in=('completed', 'failed'))
+    return [analysis_id for analysis_id in finished.values_list('id', flat=True)
+            if detection_cache.load_meta(detection_cache.detections_dir(analysis_id)) is not None]
+
 
 class VideoAnalysisViewSet(viewsets.ModelViewSet):
     queryset = VideoAnalysis.objects.all()
@@ -24,27 +53,45 @@ class VideoAnalysisViewSet(viewsets.ModelViewSet):
                               status=status.HTTP_400_BAD_REQUEST)
 
             print(f"Processing video: {video_file.name}")  # 添加日志
-            # 保存上传的视频
-            video_path = os.path.join(settings.MEDIA_ROOT, 'uploads', video_file.name)
-            os.makedirs(os.path.dirname(video_path), exist_ok=True)
-            
-            with open(video_path, 'wb+') as destination:
-                for chunk in video_file.chunks():
-                    destination.write(chunk)
+            # 按内容哈希保存上传的视频，同名不同内容的文件不会互相覆盖
+            relative_path, video_hash, size = media_store.save_upload(video_file)
+
+            # 相同视频、相同模型和分析参数已有结果（或正在处理）时直接复用
+            key = media_store.cache_key(video_hash)
+            cached = media_store.find_cached(key)
+            if cached is not None:
+                print(f"Cache hit for {video_file.name}: analysis {cached.id}")
+                media_store.touch(cached)
+                return Response({
+                    'id': cached.id,
+                    'task_id': None,
+                    'status': cached.status,
+                    'cached': True,
+                    'processed_video': cached.processed_video.url if cached.processed_video else None,
+                    'results': cached.results,
+                    'message': 'Video already analyzed, returning cached results'
+                })
 
             # 创建分析任务记录
             analysis = VideoAnalysis.objects.create(
-                video_file=f'uploads/{video_file.name}',
-                status='processing'
+                video_file=relative_path,
+                original_name=video_file.name,
+                video_hash=video_hash,
+                cache_key=key,
+                client_id=scheduler.client_id(request),
+                status='queued'
             )
 
-            # 使用Celery异步处理视频
-            task = process_video_task.delay(video_path, analysis.id)  # 使用 delay 而不是 apply_async
+            # 按估算成本排入 short / long 队列，有空槽时立即派发给 Celery
+            analysis = scheduler.submit(analysis)
             
             return Response({
                 'id': analysis.id,
-                'task_id': task.id,
-                'status': 'processing',
+                'task_id': None,
+                'status': analysis.status,
+                'job_class': analysis.job_class,
+                'estimated_seconds': analysis.estimated_seconds,
+                'cached': False,
                 'message': 'Video upload successful, processing started'
             })
         except Exception as e:
@@ -53,17 +100,296 @@ class VideoAnalysisViewSet(viewsets.ModelViewSet):
                 'error': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['POST'])
+    def start_upload(self, request):
+        """开始分块上传，参数 filename、size（可选，文件总字节数）"""
+        filename = request.data.get('filename')
+        if not filename:
+            return Response({'error': 'filename is required'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        try:
+            size = int(request.data['size']) if request.data.get('size') not in (None, '') else None
+        except ValueError:
+            return Response({'error': 'size must be an integer'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        analysis = uploads.start(filename, size, client_id=scheduler.client_id(request))
+        data = uploads.upload_state(analysis)
+        data['chunk_size'] = getattr(settings, 'CATTAX_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['GET', 'POST'])
+    def upload_chunk(self, request, pk=None):
+        """GET 返回续传位置；POST 追加一块，参数 index、offset 和文件字段 chunk
+
+        index / offset 与服务端不一致时返回 409 和当前状态，客户端据此续传。
+        """
+        if request.method == 'GET':
+            try:
+                return Response(uploads.upload_state(VideoAnalysis.objects.get(pk=pk)))
+            except VideoAnalysis.DoesNotExist:
+                return Response({'error': 'Analysis not found'}, 
+                              status=status.HTTP_404_NOT_FOUND)
+
+        chunk = request.FILES.get('chunk')
+        try:
+            index = int(request.data.get('index'))
+            offset = int(request.data.get('offset'))
+        except (TypeError, ValueError):
+            return Response({'error': 'index and offset must be integers'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if chunk is None:
+            return Response({'error': 'No chunk provided'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            analysis = uploads.append_chunk(pk, index, offset, chunk)
+        except VideoAnalysis.DoesNotExist:
+            return Response({'error': 'Analysis not found'}, 
+                          status=status.HTTP_404_NOT_FOUND)
+        except uploads.UploadConflict as e:
+            return Response({'error': str(e), **uploads.upload_state(e.analysis)},
+                          status=status.HTTP_409_CONFLICT)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 已上传的部分可以顺序解码时，不等上传结束就开始处理
+        uploads.maybe_start_early(analysis)
+        return Response(uploads.upload_state(analysis))
+
+    @action(detail=True, methods=['POST'])
+    def commit_upload(self, request, pk=None):
+        """完成分块上传并开始分析；命中结果缓存时返回已有分析"""
+        try:
+            analysis, cached = uploads.commit(pk)
+        except VideoAnalysis.DoesNotExist:
+            return Response({'error': 'Analysis not found'}, 
+                          status=status.HTTP_404_NOT_FOUND)
+        except uploads.UploadConflict as e:
+            return Response({'error': str(e), **uploads.upload_state(e.analysis)},
+                          status=status.HTTP_409_CONFLICT)
+
+        return Response({
+            'id': analysis.id,
+            'status': analysis.status,
+            'cached': cached,
+            'processed_video': analysis.processed_video.url if analysis.processed_video else None,
+            'results': analysis.results if cached else None,
+        })
+
+    @action(detail=False, methods=['POST'])
+    def start_stream(self, request):
+        """开始分析实时视频流，参数 source（RTSP/HTTP 地址或摄像头编号）、max_seconds（可选）"""
+        source = str(request.data.get('source', '')).strip()
+        if not source:
+            return Response({'error': 'source is required'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        is_url = source.split('://', 1)[0].lower() in STREAM_SCHEMES and '://' in source
+        if not (is_url or source.isdigit() or getattr(settings, 'CATTAX_STREAM_ALLOW_FILES', False)):
+            return Response({'error': f'Unsupported stream source, expected one of {STREAM_SCHEMES} or a camera index'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        try:
+            max_seconds = float(request.data['max_seconds']) if request.data.get('max_seconds') else None
+        except ValueError:
+            return Response({'error': 'max_seconds must be a number'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        analysis = VideoAnalysis.objects.create(
+            original_name=source,
+            stream_url=source,
+            status='processing'
+        )
+        task = jobs.send(jobs.PROCESS_STREAM, (source, analysis.id), {'max_seconds': max_seconds})
+        return Response({
+            'id': analysis.id,
+            'task_id': task.id,
+            'status': 'processing',
+            'message': 'Stream analysis started'
+        })
+
+    @action(detail=True, methods=['POST'])
+    def stop_stream(self, request, pk=None):
+        """请求停止实时流分析，worker 在下一次写入行为区间时退出"""
+        updated = VideoAnalysis.objects.filter(pk=pk).exclude(stream_url='').update(stop_requested=True)
+        if not updated:
+            return Response({'error': 'Stream analysis not found'}, 
+                          status=status.HTTP_404_NOT_FOUND)
+        return Response({'id': int(pk), 'stop_requested': True})
+
+    @action(detail=True, methods=['POST'])
+    def reanalyze(self, request, pk=None):
+        """按新的行为阈值重新分析，不重新运行模型和解码视频；参数 thresholds，例如 {"movement": 20}"""
+        try:
+            thresholds = parse_thresholds(request.data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not VideoAnalysis.objects.filter(pk=pk).exists():
+            return Response({'error': 'Analysis not found'}, 
+                          status=status.HTTP_404_NOT_FOUND)
+        if not reanalyzable([pk]):
+            return Response({'error': 'Analysis is not finished or has no detection cache'},
+                          status=status.HTTP_409_CONFLICT)
+        jobs.reanalyze_many([int(pk)], thresholds)
+        return Response({
+            'id': int(pk),
+            'status': VideoAnalysis.objects.values_list('status', flat=True).get(pk=pk),
+            'thresholds': thresholds,
+        })
+
+    @action(detail=False, methods=['POST'])
+    def reanalyze_all(self, request):
+        """批量重新分析，参数 ids（默认全部）和 thresholds；各分析作为独立任务由 worker 并行执行，
+        没有检测旁路文件或未结束的分析被跳过"""
+        try:
+            thresholds = parse_thresholds(request.data)
+            ids = request.data.get('ids')
+            ids = [int(i) for i in ids] if ids else VideoAnalysis.objects.values_list('id', flat=True)
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        analysis_ids = reanalyzable(ids)
+        if analysis_ids:
+            jobs.reanalyze_many(analysis_ids, thresholds)
+        return Response({'ids': analysis_ids, 'thresholds': thresholds})
+
+    @action(detail=True, methods=['GET'])
+    def segments(self, request, pk=None):
+        """已写入的行为区间，参数 since_frame（返回结束帧大于它的区间）、limit"""
+        try:
+            since_frame = max(0, int(request.query_params.get('since_frame', 0)))
+            limit = min(max(1, int(request.query_params.get('limit', RESULTS_PAGE_SIZE))), RESULTS_MAX_PAGE_SIZE)
+        except ValueError:
+            return Response({'error': 'since_frame and limit must be integers'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if not VideoAnalysis.objects.filter(pk=pk).exists():
+            return Response({'error': 'Analysis not found'}, 
+                          status=status.HTTP_404_NOT_FOUND)
+        segments = timeline.segments_since(pk, since_frame, limit)
+        return Response({'id': int(pk), 'since_frame': since_frame, 'segments': segments})
+
+    @action(detail=True, methods=['GET'])
+    def timeline(self, request, pk=None):
+        """行为时间线查询：默认返回每只猫各行为的时长；参数 frame 返回该帧每只猫的行为和位置，
+        参数 cat_id 只统计一只猫"""
+        try:
+            frame = request.query_params.get('frame')
+            frame = max(0, int(frame)) if frame is not None else None
+            cat_id = request.query_params.get('cat_id')
+            cat_id = int(cat_id) if cat_id is not None else None
+        except ValueError:
+            return Response({'error': 'frame and cat_id must be integers'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        analysis = VideoAnalysis.objects.filter(pk=pk).values('status', 'results').first()
+        if analysis is None:
+            return Response({'error': 'Analysis not found'}, 
+                          status=status.HTTP_404_NOT_FOUND)
+        if frame is not None:
+            return Response({'id': int(pk), 'frame': frame, 'cats': timeline.behavior_at(pk, frame)})
+        fps = (analysis['results'] or {}).get('fps')
+        return Response({
+            'id': int(pk),
+            'status': analysis['status'],
+            'fps': fps,
+            'behaviors': timeline.behavior_time(pk, fps=fps, cat_id=cat_id),
+        })
+
     @action(detail=True, methods=['GET'])
     def status(self, request, pk=None):
-        """获取视频分析状态"""
+        """获取视频分析状态
+
+        ?results=none 时只返回状态和进度（轮询用）；默认附带完整 results（兼容旧客户端）
+        """
         try:
             analysis = VideoAnalysis.objects.get(pk=pk)
-            return Response({
+            data = {
                 'id': analysis.id,
                 'status': analysis.status,
                 'progress': analysis.progress,
-                'results': analysis.results
-            })
+            }
+            if request.query_params.get('results') == 'none':
+                data['frames_available'] = analysis.frames_available()
+                return Response(data)
+
+            # 逐帧结果存放在分块表中，这里拼回原来的 results['frames'] 格式
+            results = dict(analysis.results)
+            if 'error' not in results:
+                results['frames'] = [frame for _, frame in analysis.iter_frames()]
+            data['results'] = results
+            return Response(data)
         except VideoAnalysis.DoesNotExist:
             return Response({'error': 'Analysis not found'}, 
-                          status=status.HTTP_404_NOT_FOUND) 
\ No newline at end of file
+                          status=status.HTTP_404_NOT_FOUND)
+
+    @action(detail=True, methods=['GET'])
+    def results(self, request, pk=None):
+        """增量获取逐帧结果
+
+        参数：since_frame（起始帧，默认 0）、limit（最多返回帧数）、layout=rows|columnar。
+        响应中的 next_frame 作为下一次请求的 since_frame。
+        """
+        try:
+            since_frame = max(0, int(request.query_params.get('since_frame', 0)))
+            limit = int(request.query_params.get('limit', RESULTS_PAGE_SIZE))
+        except ValueError:
+            return Response({'error': 'since_frame and limit must be integers'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        limit = min(max(1, limit), RESULTS_MAX_PAGE_SIZE)
+        layout = request.query_params.get('layout', 'rows')
+
+        try:
+            analysis = VideoAnalysis.objects.get(pk=pk)
+        except VideoAnalysis.DoesNotExist:
+            return Response({'error': 'Analysis not found'}, 
+                          status=status.HTTP_404_NOT_FOUND)
+
+        frames = [frame for _, frame in islice(analysis.iter_frames(since_frame), limit)]
+        next_frame = since_frame + len(frames)
+        frames_available = analysis.frames_available()
+        data = {
+            'id': analysis.id,
+            'status': analysis.status,
+            'progress': analysis.progress,
+            'since_frame': since_frame,
+            'next_frame': next_frame,
+            'frames_available': frames_available,
+            'has_more': next_frame < frames_available,
+            'layout': layout,
+        }
+        data.update(encode_frames(frames, since_frame, layout))
+        if analysis.status in ('completed', 'failed') and not data['has_more']:
+            data['summary'] = analysis.results
+        return Response(data)
+
+
+async def analysis_events(request, pk):
+    """以 Server-Sent Events 推送分析进度和逐帧行为
+
+    首条 snapshot 事件是当前状态；之后转发 worker 发布的 frames / status 事件，
+    分析结束（completed / failed）后关闭连接。ASGI 下异步转发，WSGI 下按同步迭代器输出。
+    """
+    broker = events.get_broker()
+    if broker is None:
+        return JsonResponse({'error': 'Event streaming is disabled'}, status=503)
+    if not await VideoAnalysis.objects.filter(pk=pk).aexists():
+        return JsonResponse({'error': 'Analysis not found'}, status=404)
+
+    def load_snapshot():
+        analysis = VideoAnalysis.objects.get(pk=pk)
+        return {
+            'event': 'snapshot',
+            'id': analysis.id,
+            'status': analysis.status,
+            'progress': analysis.progress,
+            'frames_available': analysis.frames_available(),
+        }
+
+    subscription = broker.subscribe(events.channel_name(pk))
+    heartbeat = getattr(settings, 'CATTAX_EVENTS_HEARTBEAT', 15)
+    if isinstance(request, ASGIRequest):
+        stream = events.async_event_stream(subscription, load_snapshot, heartbeat)
+    else:
+        stream = events.event_stream(subscription, load_snapshot, heartbeat)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
@@ -0,0 +1,86 @@
+"""自适应抽帧基准：对比逐帧检测与自适应抽帧的速度和结果一致性
+
+用法:
+    python benchmarks/bench_adaptive_sampling.py clip1.mp4 clip2.mp4 --frame-skip 5
+
+每个视频分别以 frame_skip=1（基线）和 --frame-skip 跑一遍 process_video（临时测试数据库），
+报告：
+  - speedup：基线耗时 / 抽帧耗时
+  - detect_ratio：实际跑检测的帧占比
+  - behavior_agreement：基线中每个 (帧, 猫) 的行为标签与抽帧结果一致的比例
+  - mean_position_error：同一 (帧, 猫) 的位置误差（像素）
+  - missing：基线有而抽帧结果中没有的 (帧, 猫) 比例
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cattax.settings')
+
+import django
+
+django.setup()
+
+from django.test.utils import setup_test_environment, setup_databases, teardown_databases
+
+from api.models import VideoAnalysis
+from cattax.cat_capture import process_video
+
+
+def run(video, frame_skip):
+    analysis = VideoAnalysis.objects.create(video_file=video, status='processing')
+    start = time.perf_counter()
+    output = process_video(video, analysis.id, frame_skip=frame_skip)
+    return time.perf_counter() - start, output, analysis
+
+
+def compare(baseline, sampled):
+    agree = total = missing = 0
+    errors = []
+    for base_frame, sampled_frame in zip(baseline, sampled):
+        sampled_by_cat = {det['cat_id']: det for det in sampled_frame}
+        for det in base_frame:
+            total += 1
+            other = sampled_by_cat.get(det['cat_id'])
+            if other is None:
+                missing += 1
+                continue
+            agree += det['behavior'] == other['behavior']
+            errors.append(np.hypot(det['position'][0] - other['position'][0],
+                                   det['position'][1] - other['position'][1]))
+    return {
+        'behavior_agreement': agree / total if total else 1.0,
+        'mean_position_error': float(np.mean(errors)) if errors else 0.0,
+        'missing': missing / total if total else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('videos', nargs='+')
+    parser.add_argument('--frame-skip', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        print(f"{'video':<30} {'speedup':>8} {'detect%':>8} {'agree%':>7} {'pos err':>8} {'missing%':>9}")
+        for video in args.videos:
+            base_s, _, base = run(video, 1)
+            sampled_s, sampled, sampled_analysis = run(video, args.frame_skip)
+            metrics = compare((frame for _, frame in base.iter_frames()),
+                              (frame for _, frame in sampled_analysis.iter_frames()))
+            print(f"{os.path.basename(video):<30} {base_s / sampled_s:>7.2f}x "
+                  f"{sampled['sampling']['detect_ratio'] * 100:>7.1f}% "
+                  f"{metrics['behavior_agreement'] * 100:>6.1f}% "
+                  f"{metrics['mean_position_error']:>8.2f} {metrics['missing'] * 100:>8.1f}%")
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
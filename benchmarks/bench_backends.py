@@ -0,0 +1,149 @@
+"""推理后端对比：不同模型尺寸 / 后端 / INT8 在样例视频上的吞吐和检测一致性
+
+用法:
+    python benchmarks/bench_backends.py clip1.mp4 clip2.mp4 --sizes n s x --backends torch onnx openvino --int8
+
+每个配置写作 尺寸:后端[:int8]，例如 n:onnx:int8。未安装的后端自动跳过，首次运行会导出模型
+（缓存在 CATTAX_EXPORT_DIR）。帧先全部解码并按 RESIZE_FACTOR 缩放到内存中，只计检测 + 追踪耗时。
+一致性以 --reference 配置（默认 x:torch）的检测框为基准，逐帧按 IoU >= 0.5 贪心匹配，
+输出 recall / precision / 匹配框的平均 IoU。
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cattax.settings')
+
+import django
+
+django.setup()
+
+from cattax import backends
+from cattax.cat_capture import RESIZE_FACTOR
+from cattax.detection import CatDetector, read_batch
+
+
+def load_frames(video_path, max_frames, resize_factor):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise SystemExit(f"Could not open video file: {video_path}")
+    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) * resize_factor)
+    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) * resize_factor)
+    frames = read_batch(cap, max_frames, (w, h))
+    cap.release()
+    return frames
+
+
+def parse_config(text):
+    parts = text.split(':')
+    size, backend = parts[0], parts[1] if len(parts) > 1 else 'torch'
+    return size, backend, len(parts) > 2 and parts[2] == 'int8'
+
+
+def config_name(size, backend, int8):
+    return f"{size}:{backend}{':int8' if int8 else ''}"
+
+
+def run(detector, clips, batch_size):
+    """返回 (耗时秒数, 每段视频每帧的检测框数组)"""
+    boxes = []
+    elapsed = 0.0
+    for frames in clips:
+        detector.reset()
+        clip_boxes = []
+        start = time.perf_counter()
+        for i in range(0, len(frames), batch_size):
+            for result in detector.track(frames[i:i + batch_size]):
+                clip_boxes.append(result.boxes.xyxy.cpu().numpy().reshape(-1, 4))
+        elapsed += time.perf_counter() - start
+        boxes.append(clip_boxes)
+    return elapsed, boxes
+
+
+def iou_matrix(a, b):
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def agreement(reference, candidate, threshold=0.5):
+    """逐帧贪心匹配，返回 (recall, precision, 匹配框平均 IoU)"""
+    matched = ref_total = cand_total = 0
+    ious = []
+    for ref_clip, cand_clip in zip(reference, candidate):
+        for ref, cand in zip(ref_clip, cand_clip):
+            ref_total += len(ref)
+            cand_total += len(cand)
+            if not len(ref) or not len(cand):
+                continue
+            iou = iou_matrix(ref, cand)
+            while iou.size and iou.max() >= threshold:
+                i, j = np.unravel_index(iou.argmax(), iou.shape)
+                ious.append(iou[i, j])
+                matched += 1
+                iou[i, :] = -1
+                iou[:, j] = -1
+    recall = matched / ref_total if ref_total else 1.0
+    precision = matched / cand_total if cand_total else 1.0
+    return recall, precision, float(np.mean(ious)) if ious else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('videos', nargs='+')
+    parser.add_argument('--sizes', nargs='+', default=['n', 's', 'x'], choices=backends.MODEL_SIZES)
+    parser.add_argument('--backends', nargs='+', default=list(backends.BACKENDS), choices=backends.BACKENDS)
+    parser.add_argument('--int8', action='store_true', help='同时测试 onnx / openvino 的 INT8 模型')
+    parser.add_argument('--reference', default='x:torch', help='一致性基准配置，默认 x:torch')
+    parser.add_argument('--frames', type=int, default=240, help='每段视频最多使用的帧数')
+    parser.add_argument('--batch-size', type=int, default=1)
+    args = parser.parse_args()
+
+    clips = [load_frames(video, args.frames, RESIZE_FACTOR) for video in args.videos]
+    total_frames = sum(len(frames) for frames in clips)
+    print(f"Loaded {total_frames} frames from {len(clips)} clip(s); "
+          f"available backends: {', '.join(backends.available_backends())}")
+
+    configs = []
+    for size in args.sizes:
+        for backend in args.backends:
+            if not backends.is_available(backend):
+                continue
+            configs.append((size, backend, False))
+            if args.int8 and backend != 'torch':
+                configs.append((size, backend, True))
+    reference_config = parse_config(args.reference)
+    if reference_config in configs:
+        configs.remove(reference_config)
+    configs.insert(0, reference_config)
+
+    reference = None
+    print(f"\n{'config':>16} {'load s':>7} {'fps':>8} {'ms/frame':>9} {'recall':>7} {'precision':>9} {'mIoU':>6}")
+    for size, backend, int8 in configs:
+        weights = backends.resolve_weights(size)
+        start = time.perf_counter()
+        model = backends.load_model(weights, backend, int8)
+        load_s = time.perf_counter() - start
+        detector = CatDetector(model)
+        # 预热，避免首次推理的初始化开销计入结果
+        detector.track(clips[0][:1])
+        elapsed, boxes = run(detector, clips, args.batch_size)
+        if reference is None:
+            reference = boxes
+        recall, precision, mean_iou = agreement(reference, boxes)
+        print(f"{config_name(size, backend, int8):>16} {load_s:>7.2f} {total_frames / elapsed:>8.2f} "
+              f"{elapsed / total_frames * 1000:>9.2f} {recall:>7.3f} {precision:>9.3f} {mean_iou:>6.3f}")
+
+
+if __name__ == '__main__':
+    main()
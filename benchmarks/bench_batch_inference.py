@@ -0,0 +1,80 @@
+"""批量推理基准：比较不同 batch_size 下的检测 + 追踪吞吐 (frames/sec)
+
+用法:
+    python benchmarks/bench_batch_inference.py path/to/clip.mp4 --frames 240 --batch-sizes 1 4 8 16
+
+默认强制使用 CPU。为了只测推理本身，帧会先全部解码并缩放到内存中。
+同时会校验各 batch_size 下的 track ID 序列与 batch_size=1 完全一致。
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ultralytics import YOLO
+
+from cattax.detection import CatDetector, read_batch
+
+
+def load_frames(video_path, max_frames, resize_factor):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise SystemExit(f"Could not open video file: {video_path}")
+    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) * resize_factor)
+    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) * resize_factor)
+    frames = read_batch(cap, max_frames, (w, h))
+    cap.release()
+    return frames
+
+
+def run(detector, frames, batch_size):
+    """返回 (耗时秒数, 每帧的 track ID 列表)"""
+    detector.reset()
+    ids = []
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        for result in detector.track(frames[i:i + batch_size]):
+            if result.boxes.id is None:
+                ids.append([])
+            else:
+                ids.append(result.boxes.id.int().cpu().tolist())
+    return time.perf_counter() - start, ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video')
+    parser.add_argument('--model', default='yolo11x-seg.pt')
+    parser.add_argument('--frames', type=int, default=240)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--resize-factor', type=float, default=0.5)
+    parser.add_argument('--device', default='cpu')
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.frames, args.resize_factor)
+    print(f"Loaded {len(frames)} frames ({frames[0].shape[1]}x{frames[0].shape[0]})")
+
+    model = YOLO(args.model)
+    model.to(args.device)
+    detector = CatDetector(model)
+
+    # 预热，避免首次推理的初始化开销计入结果
+    detector.track(frames[:1])
+
+    baseline_ids = None
+    print(f"{'batch':>6} {'seconds':>9} {'fps':>8} {'speedup':>8} {'ids match':>10}")
+    baseline_fps = None
+    for batch_size in args.batch_sizes:
+        elapsed, ids = run(detector, frames, batch_size)
+        fps = len(frames) / elapsed
+        if baseline_ids is None:
+            baseline_ids, baseline_fps = ids, fps
+        print(f"{batch_size:>6} {elapsed:>9.2f} {fps:>8.2f} {fps / baseline_fps:>7.2f}x {str(ids == baseline_ids):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""行为分析吞吐基准：逐次调用 analyze_behavior vs 批量 analyze_frames
+
+用法:
+    python benchmarks/bench_behavior_batch.py --frames 2000 --cats 2 5 10
+
+生成随机猫形轮廓和位置，分别用两种接口处理同样的帧序列，
+输出每秒处理的检测数，并校验两者的行为结果完全一致。
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cattax.settings')
+
+import django
+
+django.setup()
+
+from cattax.cat_behavior import CatBehaviorAnalyzer, BEHAVIOR_CODES
+
+
+def make_frames(n_frames, n_cats, rng):
+    frames = []
+    centers = rng.uniform(100, 800, (n_cats, 2))
+    for _ in range(n_frames):
+        centers += rng.normal(0, 8, centers.shape)
+        contours, positions = [], []
+        for cx, cy in centers:
+            points = rng.integers(12, 40)
+            angles = np.sort(rng.uniform(0, 2 * np.pi, points))
+            rx, ry = rng.uniform(20, 80, 2)
+            contour = np.stack([cx + rx * np.cos(angles), cy + ry * np.sin(angles)], axis=1)
+            contours.append(contour.astype(np.int32).reshape(-1, 1, 2))
+            positions.append((int(cx), int(cy)))
+        frames.append((list(range(1, n_cats + 1)), contours, positions))
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=2000)
+    parser.add_argument('--cats', type=int, nargs='+', default=[2, 5, 10])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'cats':>5} {'per-call det/s':>15} {'batch det/s':>12} {'speedup':>8} {'identical':>10}")
+    for n_cats in args.cats:
+        frames = make_frames(args.frames, n_cats, rng)
+        detections = args.frames * n_cats
+
+        analyzer = CatBehaviorAnalyzer()
+        start = time.perf_counter()
+        per_call = [analyzer.analyze_behavior(cat_id, contour, position, None)
+                    for cat_ids, contours, positions in frames
+                    for cat_id, contour, position in zip(cat_ids, contours, positions)]
+        per_call_s = time.perf_counter() - start
+
+        analyzer = CatBehaviorAnalyzer()
+        start = time.perf_counter()
+        _, _, codes = analyzer.analyze_frames(frames)
+        batch_s = time.perf_counter() - start
+
+        identical = per_call == [BEHAVIOR_CODES[code] for code in codes]
+        print(f"{n_cats:>5} {detections / per_call_s:>15.0f} {detections / batch_s:>12.0f} "
+              f"{per_call_s / batch_s:>7.2f}x {str(identical):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""摄像机运动补偿（CATTAX_CAMERA_MOTION）的逐帧耗时预算和合成平移视频上的准确度
+
+用法:
+    python benchmarks/bench_camera_motion.py
+    python benchmarks/bench_camera_motion.py --frame-skip 4 --budget-ms 5 --pan-speed 30
+
+在带纹理的大背景上放几只猫（交替走动和趴着不动，趴着时身体细长），用已知的相似变换模拟摄像机：
+  - static：固定机位
+  - pan：水平来回摇镜头
+  - handheld：摇镜头 + 手持抖动 + 轻微旋转
+每 --frame-skip 帧做一次行为分析（与抽帧时的检测帧一致），输出：
+  - camera error：估计的帧间变换与真实变换在画面四角的偏差（像素，平均 / p95），以及无法估计的比例
+  - ms/frame：CameraMotionEstimator 的逐帧耗时（平均 / p95），对比整帧 Farneback 稠密光流（旧实现）的耗时
+  - spurious：不动的猫被判为移动（位移超过行为阈值 movement）的比例，补偿前 -> 补偿后
+  - missed：走动的猫位移没有超过阈值的比例，补偿前 -> 补偿后
+任一场景 p95 耗时超过 --budget-ms、p95 偏差超过 --max-error 或补偿后的 spurious 超过 --max-spurious 时以退出码 1 结束。
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cattax.settings')
+
+import django
+
+django.setup()
+
+from cattax.camera_motion import CameraMotionEstimator
+from cattax.cat_behavior import CatBehaviorAnalyzer, DEFAULT_THRESHOLDS
+from synthetic import CAT_COLORS, make_background
+
+SCENARIOS = ('static', 'pan', 'handheld')
+MARGIN = 320  # 背景在画面四周多出的像素，摄像机在其中移动
+
+
+def camera_matrices(scenario, frames, frame_size, pan_speed, seed=0):
+    """每帧 世界坐标 -> 画面坐标 的 2x3 相似变换"""
+    w, h = frame_size
+    rng = np.random.RandomState(seed)
+    center = np.array([w / 2, h / 2])
+    x, shake = 0.0, np.zeros(2)
+    matrices = []
+    for i in range(frames):
+        angle = 0.0
+        if scenario != 'static':
+            # 速度按正弦变化的来回摇镜头，最大速度 pan_speed 像素/帧，位移不超出背景
+            x = MARGIN * 0.9 * math.sin(i * pan_speed / (MARGIN * 0.9))
+        if scenario == 'handheld':
+            shake = np.clip(shake * 0.9 + rng.normal(0, 2.0, 2), -MARGIN * 0.08, MARGIN * 0.08)
+            angle = math.radians(1.5 * math.sin(i / 23))
+        offset = np.array([MARGIN + x, MARGIN]) + shake
+        rotation = np.array([[math.cos(angle), -math.sin(angle)], [math.sin(angle), math.cos(angle)]])
+        matrices.append(np.hstack([rotation, (center - rotation @ (offset + center)).reshape(2, 1)]))
+    return matrices
+
+
+def cat_tracks(frames, frame_size, cats, cat_speed, period=90):
+    """每帧每只猫在世界坐标中的中心和是否在走动：走 period/2 帧、趴 period/2 帧，水平来回走"""
+    w, h = frame_size
+    tracks = []
+    walked = [0.0] * cats
+    for i in range(frames):
+        states = []
+        for k in range(cats):
+            moving = (i + 37 * k) % period < period // 2
+            if moving:
+                walked[k] += cat_speed
+            span = w * 0.2
+            phase = (walked[k] / span) % 2
+            x = MARGIN + w * (k + 1) / (cats + 1) + span * (phase if phase < 1 else 2 - phase) - span / 2
+            states.append(((x, MARGIN + h * (0.35 + 0.3 * (k % 2))), moving))
+        tracks.append(states)
+    return tracks
+
+
+def to_image(matrix, points):
+    return np.asarray(points, dtype=np.float64) @ matrix[:, :2].T + matrix[:, 2]
+
+
+def inverse(matrix):
+    return cv2.invertAffineTransform(matrix)
+
+
+def compose(a, b):
+    """先 b 再 a"""
+    return np.hstack([a[:, :2] @ b[:, :2], (a[:, :2] @ b[:, 2] + a[:, 2]).reshape(2, 1)])
+
+
+def corner_error(estimated, truth, frame_size):
+    w, h = frame_size
+    corners = np.array([[0, 0], [w, 0], [0, h], [w, h]], dtype=np.float64)
+    if estimated is None:
+        estimated = np.hstack([np.eye(2), np.zeros((2, 1))])
+    return float(np.abs(to_image(estimated, corners) - to_image(truth, corners)).max())
+
+
+def run_scenario(scenario, args, frame_size, world):
+    w, h = frame_size
+    matrices = camera_matrices(scenario, args.frames, frame_size, args.pan_speed)
+    tracks = cat_tracks(args.frames, frame_size, args.cats, args.cat_speed)
+    radius = h * args.cat_size
+    compensated = CatBehaviorAnalyzer(camera_motion=CameraMotionEstimator(args.width, args.corners))
+    raw = CatBehaviorAnalyzer()
+    threshold = DEFAULT_THRESHOLDS['movement']
+    errors, costs, failures = [], [], 0
+    counts = {'still': 0, 'moving': 0, 'spurious_raw': 0, 'spurious': 0, 'missed_raw': 0, 'missed': 0}
+    farneback = []
+    prev_key, prev_gray = None, None
+
+    for i in range(0, args.frames, args.frame_skip):
+        canvas = world.copy()
+        contours_world = []
+        for k, ((cx, cy), _) in enumerate(tracks[i]):
+            cv2.ellipse(canvas, (int(cx), int(cy)), (int(radius * 1.6), int(radius * 0.7)), 0, 0, 360,
+                        CAT_COLORS[k % len(CAT_COLORS)], -1)
+            contours_world.append(cv2.ellipse2Poly((int(cx), int(cy)), (int(radius * 1.6), int(radius * 0.7)),
+                                                   0, 0, 360, 10))
+        frame = cv2.warpAffine(canvas, matrices[i], (w, h), flags=cv2.INTER_LINEAR)
+        contours = [to_image(matrices[i], poly).round().astype(np.int32).reshape(-1, 1, 2) for poly in contours_world]
+        boxes = [(c[:, 0, 0].min(), c[:, 0, 1].min(), c[:, 0, 0].max(), c[:, 0, 1].max()) for c in contours]
+        positions = [tuple(to_image(matrices[i], [center])[0]) for center, _ in tracks[i]]
+
+        start = time.perf_counter()
+        motion = compensated.detect_background_motion(frame, boxes)
+        costs.append(time.perf_counter() - start)
+        if len(farneback) < 20:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if prev_gray is not None:
+                start = time.perf_counter()
+                cv2.calcOpticalFlowFarneback(prev_gray, gray, None, 0.5, 3, 15, 3, 5, 1.2, 0)
+                farneback.append(time.perf_counter() - start)
+            prev_gray = gray
+
+        cat_ids = list(range(1, args.cats + 1))
+        movement = compensated.analyze_batch(cat_ids, contours, positions)[0][:, 5]
+        movement_raw = raw.analyze_batch(cat_ids, contours, positions)[0][:, 5]
+        if prev_key is not None:
+            truth = compose(matrices[i], inverse(matrices[prev_key]))
+            error = corner_error(motion, truth, frame_size)
+            errors.append(error)
+            if motion is None and error >= 1.0:
+                failures += 1
+            for k in range(args.cats):
+                (x0, y0), _ = tracks[prev_key][k]
+                (x1, y1), _ = tracks[i][k]
+                still = math.hypot(x1 - x0, y1 - y0) < 1e-6
+                if not still and math.hypot(x1 - x0, y1 - y0) <= threshold:
+                    continue  # 真实位移本来就不超过阈值的帧不参与统计
+                label = 'still' if still else 'moving'
+                counts[label] += 1
+                if still:
+                    counts['spurious_raw'] += movement_raw[k] > threshold
+                    counts['spurious'] += movement[k] > threshold
+                else:
+                    counts['missed_raw'] += movement_raw[k] <= threshold
+                    counts['missed'] += movement[k] <= threshold
+        prev_key = i
+
+    costs_ms = np.array(costs[1:]) * 1000
+    return {
+        'error_mean': float(np.mean(errors)),
+        'error_p95': float(np.percentile(errors, 95)),
+        'failures': failures / max(1, len(errors)),
+        'cost_mean': float(costs_ms.mean()),
+        'cost_p95': float(np.percentile(costs_ms, 95)),
+        'farneback_ms': float(np.mean(farneback) * 1000) if farneback else 0.0,
+        'spurious_raw': counts['spurious_raw'] / max(1, counts['still']),
+        'spurious': counts['spurious'] / max(1, counts['still']),
+        'missed_raw': counts['missed_raw'] / max(1, counts['moving']),
+        'missed': counts['missed'] / max(1, counts['moving']),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument('--size', default='960x540', help='处理分辨率（1080p 视频按 RESIZE_FACTOR 缩放后的大小）')
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--frame-skip', type=int, default=1, help='每隔多少帧分析一次（检测帧间隔）')
+    parser.add_argument('--cats', type=int, default=3)
+    parser.add_argument('--cat-size', type=float, default=0.05, help='猫的半径（相对画面高度）')
+    parser.add_argument('--cat-speed', type=float, default=20.0, help='猫走动的速度（像素/帧）')
+    parser.add_argument('--pan-speed', type=float, default=20.0, help='摇镜头的最大速度（像素/帧）')
+    parser.add_argument('--width', type=int, default=320, help='CATTAX_CAMERA_MOTION_WIDTH')
+    parser.add_argument('--corners', type=int, default=60, help='CATTAX_CAMERA_MOTION_CORNERS')
+    parser.add_argument('--budget-ms', type=float, default=5.0, help='p95 逐帧耗时预算（毫秒）')
+    parser.add_argument('--max-error', type=float, default=2.0, help='p95 画面四角偏差上限（像素）')
+    parser.add_argument('--max-spurious', type=float, default=0.02, help='补偿后不动的猫被判为移动的比例上限')
+    args = parser.parse_args()
+    w, h = (int(v) for v in args.size.split('x'))
+    world = make_background((w + 2 * MARGIN, h + 2 * MARGIN))
+
+    print(f"{args.frames} frames at {w}x{h}, {args.cats} cats, frame skip {args.frame_skip}, "
+          f"estimator width {args.width}, movement threshold {DEFAULT_THRESHOLDS['movement']}px")
+    print(f"\n{'scenario':<10} {'err mean':>8} {'err p95':>8} {'failed':>7} {'ms/frame':>9} {'p95 ms':>7} "
+          f"{'farneback':>10} {'spurious':>16} {'missed':>16}")
+    failed = []
+    for scenario in args.scenarios:
+        r = run_scenario(scenario, args, (w, h), world)
+        print(f"{scenario:<10} {r['error_mean']:>8.2f} {r['error_p95']:>8.2f} {r['failures']:>7.1%} "
+              f"{r['cost_mean']:>9.2f} {r['cost_p95']:>7.2f} {r['farneback_ms']:>8.1f}ms "
+              f"{r['spurious_raw']:>6.1%} -> {r['spurious']:>5.1%} {r['missed_raw']:>6.1%} -> {r['missed']:>5.1%}")
+        if r['cost_p95'] > args.budget_ms:
+            failed.append(f"{scenario}: p95 {r['cost_p95']:.2f}ms over budget {args.budget_ms}ms")
+        if r['error_p95'] > args.max_error:
+            failed.append(f"{scenario}: p95 error {r['error_p95']:.2f}px over {args.max_error}px")
+        if r['spurious'] > args.max_spurious:
+            failed.append(f"{scenario}: spurious movement {r['spurious']:.1%} over {args.max_spurious:.1%}")
+    if failed:
+        raise SystemExit('\n'.join(['', *failed]))
+    print("\nAll scenarios within budget.")
+
+
+if __name__ == '__main__':
+    main()
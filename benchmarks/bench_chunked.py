@@ -0,0 +1,59 @@
+"""分段并行基准：同一视频切成不同段数时的总耗时
+
+用法:
+    python benchmarks/bench_chunked.py path/to/long_clip.mp4 --chunks 1 2 4 --overlap 30
+
+每种段数都用本地进程池（与 Celery eager 模式相同的路径）处理全部分段，
+再对齐 track ID 并拼接视频，输出墙钟时间和相对单段的加速比。
+"""
+import argparse
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cattax.settings')
+
+import django
+
+django.setup()
+
+from django.conf import settings
+
+from cattax import chunking
+from cattax.cat_capture import open_video
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video')
+    parser.add_argument('--chunks', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--overlap', type=int, default=30)
+    args = parser.parse_args()
+
+    cap, _, _, total_frames = open_video(args.video)
+    cap.release()
+
+    settings.MEDIA_ROOT = tempfile.mkdtemp(prefix='cattax-bench-')
+    baseline = None
+    try:
+        print(f"{'chunks':>6} {'workers':>8} {'seconds':>9} {'speedup':>8} {'frames':>7}")
+        for count in args.chunks:
+            chunks = chunking.plan_chunks(total_frames, math.ceil(total_frames / count), args.overlap)
+            analysis_id = f'bench-{count}'
+            start = time.perf_counter()
+            infos = chunking.run_chunks_locally(args.video, analysis_id, chunks, workers=len(chunks))
+            output_path = os.path.join(settings.MEDIA_ROOT, 'processed', f'{analysis_id}.mp4')
+            frames = chunking.merge_chunks(args.video, infos, output_path)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"{len(chunks):>6} {len(chunks):>8} {elapsed:>9.2f} {baseline / elapsed:>7.2f}x {frames:>7}")
+    finally:
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""实时流模式基准：长时间回放本地视频，观察内存是否平稳以及丢帧情况
+
+用法:
+    python benchmarks/bench_live_stream.py clip.mp4 --minutes 30 --report-every 60
+
+把 clip.mp4 按源帧率循环回放（模拟摄像头），用 process_stream 持续分析（临时测试数据库），
+每隔 --report-every 秒输出一次进程 RSS、已读/已分析/丢弃的帧数和已写入的行为区间数。
+RSS 在预热后应保持平稳；推理跟不上源帧率时丢帧数上升而不是内存上升。
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cattax.settings')
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.db import connections
+from django.test.utils import setup_test_environment, setup_databases, teardown_databases
+
+from api.models import VideoAnalysis, BehaviorSegment
+from cattax.live import process_stream
+
+
+def rss_mb():
+    """当前进程的常驻内存（MB），读取 /proc，非 Linux 上退回 ru_maxrss"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video')
+    parser.add_argument('--minutes', type=float, default=30)
+    parser.add_argument('--report-every', type=float, default=60)
+    parser.add_argument('--no-realtime', action='store_true', help='不按源帧率节流，尽可能快地读取')
+    args = parser.parse_args()
+
+    settings.CATTAX_STREAM_FLUSH_SECONDS = min(settings.CATTAX_STREAM_FLUSH_SECONDS, args.report_every)
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        analysis = VideoAnalysis.objects.create(stream_url=args.video, status='processing')
+        worker = threading.Thread(target=process_stream, args=(args.video, analysis.id), kwargs={
+            'max_seconds': args.minutes * 60, 'realtime': not args.no_realtime, 'loop': True,
+        })
+        start = time.monotonic()
+        worker.start()
+        print(f"{'elapsed s':>9} {'rss MB':>8} {'read':>8} {'analyzed':>9} {'dropped':>8} {'segments':>9}")
+        while worker.is_alive():
+            worker.join(args.report_every)
+            live = VideoAnalysis.objects.get(id=analysis.id).results.get('live', {})
+            print(f"{time.monotonic() - start:>9.0f} {rss_mb():>8.1f} {live.get('frames_read', 0):>8} "
+                  f"{live.get('frames_analyzed', 0):>9} {live.get('frames_dropped', 0):>8} "
+                  f"{BehaviorSegment.objects.filter(analysis_id=analysis.id).count():>9}")
+    finally:
+        connections.close_all()
+        teardown_databases(old_config, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
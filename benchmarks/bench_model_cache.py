@@ -0,0 +1,64 @@
+"""模型缓存基准：比较冷启动任务与复用缓存模型的热任务延迟
+
+用法:
+    python benchmarks/bench_model_cache.py path/to/clip.mp4 --frames 60 --tasks 3
+
+每个“任务”都通过 model_registry.get_detector() 获取检测器并处理同一段帧，
+第一个任务前清空缓存模拟冷启动；同时检查各任务的 track ID 序列一致，
+即追踪器状态没有在任务之间泄漏。
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cattax.settings')
+
+import django
+
+django.setup()
+
+from cattax import model_registry
+from cattax.detection import read_batch
+
+
+def run_task(frames):
+    start = time.perf_counter()
+    detector = model_registry.get_detector()
+    ready = time.perf_counter()
+    ids = []
+    for result in detector.track(frames):
+        ids.append([] if result.boxes.id is None else result.boxes.id.int().cpu().tolist())
+    return ready - start, time.perf_counter() - start, ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video')
+    parser.add_argument('--frames', type=int, default=60)
+    parser.add_argument('--tasks', type=int, default=3)
+    args = parser.parse_args()
+
+    cap = cv2.VideoCapture(args.video)
+    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) * 0.5)
+    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) * 0.5)
+    frames = read_batch(cap, args.frames, (w, h))
+    cap.release()
+
+    model_registry.clear()
+    first_ids = None
+    print(f"{'task':>5} {'kind':>5} {'init s':>8} {'total s':>8} {'ids match':>10}")
+    for i in range(args.tasks):
+        kind = 'warm' if model_registry.is_loaded() else 'cold'
+        init_s, total_s, ids = run_task(frames)
+        if first_ids is None:
+            first_ids = ids
+        print(f"{i + 1:>5} {kind:>5} {init_s:>8.3f} {total_s:>8.3f} {str(ids == first_ids):>10}")
+    print(f"load stats: {model_registry.load_stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""多猫场景（猫舍摄像头）下逐帧行为分析和互动检测的耗时
+
+用法:
+    python benchmarks/bench_multi_cat.py
+    python benchmarks/bench_multi_cat.py --cats 2 10 30 50 --frames 3000 --churn 0.01
+
+在 --size 的画面中模拟 --cats 只猫随机游走，每帧每只猫以 --churn 的概率跟丢并以新的追踪 ID 重新出现
+（追踪 ID 不断增长，与长时间运行的摄像头一致）。对每个猫数输出：
+  - behavior：CatBehaviorAnalyzer.analyze_batch 的逐帧耗时，以及结束时保存状态的猫数，
+    丢弃过期状态（--max-age，即 CATTAX_TRACK_MAX_AGE）-> 不丢弃（max_age=0）
+  - interactions：InteractionDetector.update（猫多时用 KD 树，含生成事件）与逐对比较距离的逐帧耗时，以及平均每帧接近的猫对数
+两种互动检测的猫对不一致时以退出码 1 结束。
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cattax.settings')
+
+import django
+
+django.setup()
+
+from cattax.cat_behavior import CatBehaviorAnalyzer
+from cattax.interactions import InteractionDetector
+
+
+def make_frames(n_frames, n_cats, frame_size, churn, seed=0):
+    """返回 [(cat_ids, contours, positions), ...]：随机游走的猫，跟丢后换新 ID 从随机位置重新出现"""
+    w, h = frame_size
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform((40, 40), (w - 40, h - 40), (n_cats, 2))
+    velocity = rng.normal(0, 4, (n_cats, 2))
+    ids = np.arange(1, n_cats + 1)
+    next_id = n_cats + 1
+    shape = cv2.ellipse2Poly((0, 0), (36, 18), 0, 0, 360, 20).reshape(-1, 1, 2)
+    frames = []
+    for _ in range(n_frames):
+        velocity = velocity * 0.9 + rng.normal(0, 1.5, velocity.shape)
+        centers = np.clip(centers + velocity, (40, 40), (w - 40, h - 40))
+        lost = rng.random(n_cats) < churn
+        for k in np.flatnonzero(lost):
+            ids[k] = next_id
+            next_id += 1
+            centers[k] = rng.uniform((40, 40), (w - 40, h - 40))
+        positions = [(int(x), int(y)) for x, y in centers]
+        contours = [shape + np.array(position, dtype=np.int32) for position in positions]
+        frames.append((ids.tolist(), contours, positions))
+    return frames
+
+
+def pairwise(frame_results, distance):
+    """旧的两两比较：每一对猫算一次距离"""
+    pairs = []
+    for i in range(len(frame_results)):
+        for j in range(i + 1, len(frame_results)):
+            (x0, y0), (x1, y1) = frame_results[i]['position'], frame_results[j]['position']
+            if math.sqrt((x0 - x1)**2 + (y0 - y1)**2) <= distance:
+                a, b = frame_results[i]['cat_id'], frame_results[j]['cat_id']
+                pairs.append((min(a, b), max(a, b)))
+    return pairs
+
+
+def run_behavior(frames, max_age):
+    analyzer = CatBehaviorAnalyzer(max_age=max_age)
+    start = time.perf_counter()
+    for cat_ids, contours, positions in frames:
+        analyzer.analyze_batch(cat_ids, contours, positions)
+    return (time.perf_counter() - start) / len(frames), len(analyzer.prev_positions)
+
+
+def run_interactions(frames, distance, min_frames):
+    results = [[{'cat_id': cat_id, 'position': position} for cat_id, position in zip(cat_ids, positions)]
+               for cat_ids, _, positions in frames]
+    detector = InteractionDetector(distance, min_frames)
+    start = time.perf_counter()
+    events = [detector.update(frame_results) for frame_results in results]
+    indexed_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = [pairwise(frame_results, distance) for frame_results in results]
+    pairwise_s = time.perf_counter() - start
+
+    mismatched = sum(sorted(tuple(event['cats']) for event in frame_events) != sorted(pairs)
+                     for frame_events, pairs in zip(events, expected))
+    close = sum(len(pairs) for pairs in expected) / len(frames)
+    return indexed_s / len(frames), pairwise_s / len(frames), close, mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cats', type=int, nargs='+', default=[2, 10, 50])
+    parser.add_argument('--frames', type=int, default=2000)
+    parser.add_argument('--size', default='960x540', help='处理分辨率')
+    parser.add_argument('--churn', type=float, default=0.005, help='每帧每只猫跟丢后换新 ID 的概率')
+    parser.add_argument('--max-age', type=int, default=60, help='CATTAX_TRACK_MAX_AGE')
+    parser.add_argument('--distance', type=float, default=100, help='CATTAX_INTERACTION_DISTANCE')
+    parser.add_argument('--min-frames', type=int, default=12, help='CATTAX_INTERACTION_MIN_FRAMES')
+    args = parser.parse_args()
+    frame_size = tuple(int(v) for v in args.size.split('x'))
+
+    print(f"{args.frames} frames at {args.size}, churn {args.churn}, max age {args.max_age}, "
+          f"interaction distance {args.distance}px")
+    print(f"\n{'cats':>5} {'track ids':>9} {'behavior ms':>11} {'state cats':>16} "
+          f"{'detector us':>11} {'pairwise us':>11} {'close pairs':>11}")
+    failed = []
+    for n_cats in args.cats:
+        frames = make_frames(args.frames, n_cats, frame_size, args.churn)
+        track_ids = len({cat_id for cat_ids, _, _ in frames for cat_id in cat_ids})
+        behavior_s, state = run_behavior(frames, args.max_age)
+        _, state_unbounded = run_behavior(frames, 0)
+        indexed_s, pairwise_s, close, mismatched = run_interactions(frames, args.distance, args.min_frames)
+        print(f"{n_cats:>5} {track_ids:>9} {behavior_s * 1000:>11.3f} {state:>7} -> {state_unbounded:>5} "
+              f"{indexed_s * 1e6:>11.1f} {pairwise_s * 1e6:>11.1f} {close:>11.1f}")
+        if mismatched:
+            failed.append(f"{n_cats} cats: interaction pairs differ from pairwise check in {mismatched} frames")
+    if failed:
+        raise SystemExit('\n'.join(['', *failed]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""从检测旁路文件重新分析与完整重跑 process_video 的耗时对比
+
+用法:
+    python benchmarks/bench_reanalyze.py --resolution 720p --frames 1800 --frame-skip 1
+
+在临时测试数据库和临时 MEDIA_ROOT 中，用合成视频和桩检测模型（见 synthetic.py）完整处理一次，
+同时写出检测旁路文件；然后：
+  - 用默认阈值从旁路文件重新分析，校验逐帧结果和行为区间与原始处理完全一致；
+  - 用 --thresholds 给出的阈值重新分析 --repeat 次，取最快一次的帧率。
+输出完整处理和重新分析的帧率、旁路文件大小（每帧字节数）和两种阈值下的行为汇总。
+完整处理的帧率不含真实模型的推理耗时，真实场景下两者的差距还要大得多。
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cattax.settings')
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.test.utils import setup_test_environment, setup_databases, teardown_databases
+
+from api.models import VideoAnalysis, BehaviorSegment
+from cattax import model_registry
+from cattax.cat_capture import process_video, reanalyze_video
+from synthetic import StubModel, make_video
+
+
+def snapshot(analysis_id):
+    analysis = VideoAnalysis.objects.get(pk=analysis_id)
+    segments = list(BehaviorSegment.objects.filter(analysis_id=analysis_id).order_by(
+        'start_frame', 'cat_id').values_list('cat_id', 'behavior', 'start_frame', 'end_frame', 'frames', 'positions'))
+    return [frame for _, frame in analysis.iter_frames()], segments, analysis.results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--resolution', default='720p', choices=['360p', '720p', '1080p'])
+    parser.add_argument('--frames', type=int, default=1800)
+    parser.add_argument('--frame-skip', type=int, default=1, help='CATTAX_MAX_FRAME_SKIP')
+    parser.add_argument('--thresholds', default='{"movement": 1}', help='重新分析使用的行为阈值（JSON）')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--video-dir', default=os.path.join(tempfile.gettempdir(), 'cattax-bench-videos'))
+    args = parser.parse_args()
+    thresholds = json.loads(args.thresholds)
+
+    video = make_video(os.path.join(args.video_dir, f'{args.resolution}-{args.frames}.mp4'),
+                       args.resolution, args.frames)
+    settings.MEDIA_ROOT = tempfile.mkdtemp(prefix='cattax-bench-')
+    settings.CATTAX_RENDER_MODE = 'analysis'
+    settings.CATTAX_MAX_FRAME_SKIP = args.frame_skip
+    model_registry.register(StubModel())
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        analysis = VideoAnalysis.objects.create(video_file=video, status='processing')
+        start = time.perf_counter()
+        process_video(video, analysis.id)
+        process_s = time.perf_counter() - start
+        frames, segments, results = snapshot(analysis.id)
+        detections = results['detections']
+
+        reanalyze_video(analysis.id)
+        same_frames, same_segments, same_results = snapshot(analysis.id)
+        identical = (same_frames == frames and same_segments == segments
+                     and same_results['summary'] == results['summary'])
+
+        best = None
+        for _ in range(max(1, args.repeat)):
+            start = time.perf_counter()
+            reanalyze_video(analysis.id, thresholds)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        tuned = VideoAnalysis.objects.get(pk=analysis.id).results
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+    print(f"\n{args.frames} frames at {args.resolution}, frame skip {args.frame_skip}, "
+          f"{detections['keyframes']} keyframes cached in {detections['parts']} part(s)")
+    print(f"{'mode':<22} {'seconds':>9} {'fps':>9}")
+    print(f"{'process_video':<22} {process_s:>9.2f} {args.frames / process_s:>9.1f}")
+    print(f"{'reanalyze':<22} {best:>9.2f} {args.frames / best:>9.1f}")
+    print(f"\ndetection cache: {detections['bytes'] / 1024:.1f} KB ({detections['bytes'] / args.frames:.0f} B/frame)")
+    print(f"default thresholds reproduce original results: {identical}")
+    print(f"summary (default):   {results['summary']['behavior_frames']}")
+    print(f"summary ({args.thresholds}): {tuned['summary']['behavior_frames']}")
+
+
+if __name__ == '__main__':
+    main()
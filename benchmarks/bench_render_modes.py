@@ -0,0 +1,65 @@
+"""渲染模式基准：比较 preview / headless / analysis 三种模式的处理帧率
+
+用法:
+    python benchmarks/bench_render_modes.py clip.mp4 --modes headless analysis --repeat 3
+
+每种模式用 process_video 完整处理一遍视频（临时测试数据库、临时 MEDIA_ROOT），
+报告每种模式的帧率以及标注编码阶段（绘制 + 写视频 + 结果回调）的平均每帧耗时。
+preview 模式需要图形界面，只在有显示器的机器上加入对比。
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cattax.settings')
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.test.utils import setup_test_environment, setup_databases, teardown_databases
+
+from api.models import VideoAnalysis
+from cattax import model_registry
+from cattax.cat_capture import RENDER_MODES, process_video
+
+
+def run(video, render_mode):
+    analysis = VideoAnalysis.objects.create(video_file=video, status='processing')
+    start = time.perf_counter()
+    output = process_video(video, analysis.id, render_mode=render_mode)
+    elapsed = time.perf_counter() - start
+    encode = output['pipeline']['stages']['encode']
+    return output['processed_frames'] / elapsed, encode['avg_ms']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video')
+    parser.add_argument('--modes', nargs='+', choices=RENDER_MODES, default=['headless', 'analysis'])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    settings.MEDIA_ROOT = tempfile.mkdtemp(prefix='cattax-bench-')
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        model_registry.get_model()  # 预先加载模型，避免冷启动计入第一种模式
+        print(f"{'mode':<10} {'fps':>8} {'encode ms/frame':>16}")
+        for mode in args.modes:
+            runs = [run(args.video, mode) for _ in range(args.repeat)]
+            fps = max(r[0] for r in runs)
+            encode_ms = min(r[1] for r in runs)
+            print(f"{mode:<10} {fps:>8.1f} {encode_ms:>16.3f}")
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
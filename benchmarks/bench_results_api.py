@@ -0,0 +1,101 @@
+"""结果接口负载测试：比较整包轮询 status 与增量拉取 results 的响应大小和耗时
+
+用法:
+    python benchmarks/bench_results_api.py --frames 20000 --polls 40 --layout columnar
+
+在临时测试数据库中模拟一个正在处理的分析：每次轮询前追加 frames/polls 帧结果，然后
+  - legacy：GET /api/analysis/{id}/status/（每次返回全部逐帧结果）
+  - incremental：GET status/?results=none，再用 since_frame 游标 GET results/ 拉取新增帧
+按轮询区间输出平均每次轮询的响应字节数和耗时。legacy 随已处理帧数线性增长，
+incremental 只与两次轮询之间新增的帧数相关。
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cattax.settings')
+
+import django
+
+django.setup()
+
+from django.test import Client
+from django.test.utils import setup_test_environment, setup_databases, teardown_databases
+
+from api.models import VideoAnalysis
+from api.results_store import ResultsWriter
+
+
+def fake_frame(i):
+    return [
+        {'cat_id': 1, 'behavior': 'resting', 'position': (100 + i % 7, 200)},
+        {'cat_id': 2, 'behavior': 'walking', 'position': (300 + i % 50, 120)},
+    ]
+
+
+def poll_legacy(client, analysis_id, state):
+    response = client.get(f'/api/analysis/{analysis_id}/status/')
+    return len(response.content)
+
+
+def poll_incremental(client, analysis_id, state, layout='rows'):
+    response = client.get(f'/api/analysis/{analysis_id}/status/', {'results': 'none'})
+    size = len(response.content)
+    has_more = response.json()['frames_available'] > state['next_frame']
+    while has_more:
+        response = client.get(f'/api/analysis/{analysis_id}/results/',
+                              {'since_frame': state['next_frame'], 'layout': layout})
+        size += len(response.content)
+        page = response.json()
+        state['next_frame'] = page['next_frame']
+        has_more = page['has_more']
+    return size
+
+
+def run(poll, total, polls, **kwargs):
+    analysis = VideoAnalysis.objects.create(video_file='uploads/bench.mp4', status='processing')
+    writer = ResultsWriter(analysis.id, total, flush_frames=100, flush_seconds=float('inf'))
+    client = Client()
+    state = {'next_frame': 0}
+    step = total // polls
+    rows = []
+    for p in range(polls):
+        for i in range(p * step, (p + 1) * step):
+            writer.append(fake_frame(i))
+        writer.flush()
+        start = time.perf_counter()
+        size = poll(client, analysis.id, state, **kwargs)
+        rows.append(((p + 1) * step, size, (time.perf_counter() - start) * 1000))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=20000)
+    parser.add_argument('--polls', type=int, default=40)
+    parser.add_argument('--layout', choices=['rows', 'columnar'], default='rows')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        legacy = run(poll_legacy, args.frames, args.polls)
+        incremental = run(poll_incremental, args.frames, args.polls, layout=args.layout)
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+    print(f"{'frames':>8} {'legacy KB':>10} {'legacy ms':>10} {'incr KB':>9} {'incr ms':>8}")
+    report_every = max(1, args.polls // 10)
+    for (frames, l_size, l_ms), (_, i_size, i_ms) in zip(legacy[report_every - 1::report_every],
+                                                         incremental[report_every - 1::report_every]):
+        print(f"{frames:>8} {l_size / 1024:>10.1f} {l_ms:>10.2f} {i_size / 1024:>9.1f} {i_ms:>8.2f}")
+    l_total = sum(size for _, size, _ in legacy)
+    i_total = sum(size for _, size, _ in incremental)
+    print(f"\n总传输: legacy {l_total / 1024:.0f} KB, incremental ({args.layout}) {i_total / 1024:.0f} KB "
+          f"({l_total / max(i_total, 1):.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""结果持久化基准：比较每帧重写整个 results JSON 与分块追加写的数据库耗时
+
+用法:
+    python benchmarks/bench_results_store.py --frames 20000 --report-every 2000
+
+在临时测试数据库中模拟两只猫的逐帧结果，按区间输出平均每帧数据库耗时。
+旧方式（legacy）随帧数线性增长，ResultsWriter 应保持平稳。
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cattax.settings')
+
+import django
+
+django.setup()
+
+from django.test.utils import setup_test_environment, setup_databases, teardown_databases
+
+from api.models import VideoAnalysis
+from api.results_store import ResultsWriter
+
+
+def fake_frame(i):
+    return [
+        {'cat_id': 1, 'behavior': 'resting', 'position': (100 + i % 7, 200)},
+        {'cat_id': 2, 'behavior': 'walking', 'position': (300 + i % 50, 120)},
+    ]
+
+
+def bench_legacy(total, report_every):
+    analysis = VideoAnalysis.objects.create(video_file='uploads/bench.mp4', status='processing')
+    results_data = []
+    rows = []
+    window = 0.0
+    for i in range(total):
+        results_data.append(fake_frame(i))
+        start = time.perf_counter()
+        VideoAnalysis.objects.filter(id=analysis.id).update(
+            progress=i / total * 100,
+            results={'frames': results_data}
+        )
+        window += time.perf_counter() - start
+        if (i + 1) % report_every == 0:
+            rows.append((i + 1, window / report_every * 1000))
+            window = 0.0
+    return rows
+
+
+def bench_writer(total, report_every, flush_frames):
+    analysis = VideoAnalysis.objects.create(video_file='uploads/bench.mp4', status='processing')
+    writer = ResultsWriter(analysis.id, total, flush_frames=flush_frames, flush_seconds=float('inf'))
+    rows = []
+    window = 0.0
+    for i in range(total):
+        frame = fake_frame(i)
+        start = time.perf_counter()
+        writer.append(frame)
+        window += time.perf_counter() - start
+        if (i + 1) % report_every == 0:
+            rows.append((i + 1, window / report_every * 1000))
+            window = 0.0
+    start = time.perf_counter()
+    writer.finish()
+    return rows, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=20000)
+    parser.add_argument('--report-every', type=int, default=2000)
+    parser.add_argument('--flush-frames', type=int, default=100)
+    parser.add_argument('--legacy-frames', type=int, default=None,
+                        help='旧方式只跑前 N 帧（默认与 --frames 相同，帧数大时会非常慢）')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        legacy = bench_legacy(args.legacy_frames or args.frames, args.report_every)
+        chunked, finish_ms = bench_writer(args.frames, args.report_every, args.flush_frames)
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+    legacy = dict(legacy)
+    print(f"{'frames':>8} {'legacy ms/frame':>16} {'chunked ms/frame':>17}")
+    for frames, ms in chunked:
+        legacy_ms = f"{legacy[frames]:.4f}" if frames in legacy else '-'
+        print(f"{frames:>8} {legacy_ms:>16} {ms:>17.4f}")
+    print(f"final summary write: {finish_ms:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""ROI 推理（CATTAX_ROI_INFERENCE）与整帧推理的吞吐和召回对比
+
+用法:
+    python benchmarks/bench_roi.py                                   # 广角合成视频 + 桩检测模型
+    python benchmarks/bench_roi.py room1.mp4 room2.mp4 --model x:torch --rescan 15 30 60
+
+不给视频时生成 1080p 的广角合成视频（见 synthetic.py：几只很小的猫在大画面中走动、休息），检测用
+StubModel，不需要模型文件；桩模型的耗时与输入像素数成正比，加速比只反映 ROI 减少的像素量，
+用 --model 尺寸:后端 换成真实模型才能得到实际的推理加速。
+帧先全部解码并按 RESIZE_FACTOR 缩放到内存中，只计检测 + 追踪耗时。以整帧推理的检测框为基准，
+逐帧按 IoU >= 0.5 贪心匹配，输出每个整帧检测间隔（--rescan）下 ROI 推理的帧率、加速比、
+推理像素占整帧的比例、ROI 帧的比例以及 recall / precision。
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cattax.settings')
+
+import django
+
+django.setup()
+
+from bench_backends import agreement, load_frames, parse_config, run
+from cattax import backends
+from cattax.cat_capture import RESIZE_FACTOR
+from cattax.detection import CatDetector
+from cattax.roi import RegionPlanner
+from synthetic import StubModel, make_video
+
+
+def run_roi(detector, clips, batch_size):
+    """与 bench_backends.run 相同，另外累计各段视频的 RegionPlanner 统计（每段开始时 reset）"""
+    elapsed, boxes = 0.0, []
+    stats = dict.fromkeys(('full_frames', 'region_frames', 'region_pixels', 'frame_pixels'), 0)
+    for frames in clips:
+        clip_s, clip_boxes = run(detector, [frames], batch_size)
+        elapsed += clip_s
+        boxes += clip_boxes
+        for key in stats:
+            stats[key] += getattr(detector.roi, key)
+    return elapsed, boxes, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('videos', nargs='*', help='样例视频，默认生成广角合成视频')
+    parser.add_argument('--model', help='真实模型配置 尺寸:后端[:int8]，例如 x:torch；默认使用桩检测模型')
+    parser.add_argument('--rescan', type=int, nargs='+', default=[10, 30, 90], help='CATTAX_ROI_RESCAN_FRAMES')
+    parser.add_argument('--padding', type=float, default=0.5, help='CATTAX_ROI_PADDING')
+    parser.add_argument('--min-size', type=int, default=96, help='CATTAX_ROI_MIN_SIZE')
+    parser.add_argument('--frames', type=int, default=600, help='每段视频最多使用的帧数')
+    parser.add_argument('--batch-size', type=int, default=4)
+    parser.add_argument('--cats', type=int, default=3, help='合成视频中猫的数量')
+    parser.add_argument('--cat-scale', type=float, default=0.35, help='合成视频中猫的大小（相对默认）')
+    parser.add_argument('--video-dir', default=os.path.join(tempfile.gettempdir(), 'cattax-bench-videos'))
+    args = parser.parse_args()
+
+    videos = args.videos or [make_video(
+        os.path.join(args.video_dir, f'wide-1080p-{args.frames}-{args.cats}cats-{args.cat_scale}.mp4'),
+        '1080p', args.frames, cats=args.cats, cat_scale=args.cat_scale)]
+    clips = [load_frames(video, args.frames, RESIZE_FACTOR) for video in videos]
+    total_frames = sum(len(frames) for frames in clips)
+    h, w = clips[0][0].shape[:2]
+    if args.model:
+        size, backend, int8 = parse_config(args.model)
+        model = backends.load_model(backends.resolve_weights(size), backend, int8)
+    else:
+        model = StubModel()
+    print(f"Loaded {total_frames} frames from {len(clips)} clip(s) at {w}x{h}, "
+          f"model: {args.model or 'synthetic stub'}, batch size {args.batch_size}")
+
+    detector = CatDetector(model)
+    # 预热，避免首次推理的初始化开销计入结果
+    detector.track(clips[0][:1])
+    full_s, reference = run(detector, clips, args.batch_size)
+
+    print(f"\n{'mode':>12} {'fps':>8} {'speedup':>8} {'pixels':>7} {'roi frames':>10} {'recall':>7} {'precision':>9}")
+    print(f"{'full':>12} {total_frames / full_s:>8.2f} {1.0:>7.2f}x {1.0:>7.1%} {0.0:>10.1%} {1.0:>7.3f} {1.0:>9.3f}")
+    for rescan in args.rescan:
+        planner = RegionPlanner(rescan, args.padding, args.min_size)
+        detector = CatDetector(model, roi=planner)
+        elapsed, boxes, stats = run_roi(detector, clips, args.batch_size)
+        recall, precision, _ = agreement(reference, boxes)
+        print(f"{f'roi/{rescan}':>12} {total_frames / elapsed:>8.2f} {full_s / elapsed:>7.2f}x "
+              f"{stats['region_pixels'] / stats['frame_pixels']:>7.1%} "
+              f"{stats['region_frames'] / (stats['full_frames'] + stats['region_frames']):>10.1%} "
+              f"{recall:>7.3f} {precision:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
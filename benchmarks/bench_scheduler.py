@@ -0,0 +1,162 @@
+"""任务调度模拟：混合负载下单队列 FIFO 与 short/long 公平调度的排队延迟对比
+
+用法:
+    python benchmarks/bench_scheduler.py --hours 2 --seed 0
+
+离散事件模拟，不运行真实分析。负载：
+  - 一个客户端在开始时批量上传 --batch 个长视频（处理 10-30 分钟）；
+  - --clients 个其它客户端按泊松过程上传短视频（处理 20-120 秒），偶尔上传长视频；
+  - 上传时的时长估算带 ±30% 误差（按帧数和分辨率估算并不精确）。
+两种策略使用相同的 worker 总数：
+  - fifo：所有任务进同一个队列，按到达顺序执行到结束（调度层之前的行为）；
+  - fair：按估算时长分到 short / long 队列（api.scheduler.classify），short 队列占
+    --short-slots 个槽位，其余给 long 队列，空槽时用 api.scheduler.pick_next 按客户端公平选择，long 任务每运行
+    --time-slice 秒保存检查点并重新排队，恢复时额外付出 --resume-overhead 秒。
+输出短任务和长任务从上传到完成的延迟分位数（秒）。
+"""
+import argparse
+import heapq
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cattax.settings')
+
+import django
+
+django.setup()
+
+from api.scheduler import classify, pick_next
+
+
+def make_workload(hours, clients, batch, seed):
+    rng = random.Random(seed)
+    jobs = []
+
+    def add(arrival, client, seconds):
+        jobs.append({
+            'id': len(jobs), 'client': client, 'arrival': arrival, 'seconds': seconds,
+            'estimated': seconds * rng.uniform(0.7, 1.3), 'short': seconds <= 120,
+        })
+
+    for i in range(batch):
+        add(i * 5.0, 'heavy', rng.uniform(600, 1800))
+    for c in range(clients):
+        t = rng.expovariate(1 / 300)
+        while t < hours * 3600:
+            if rng.random() < 0.1:
+                add(t, f'client{c}', rng.uniform(600, 1800))
+            else:
+                add(t, f'client{c}', rng.uniform(20, 120))
+            t += rng.expovariate(1 / 300)
+    return sorted(jobs, key=lambda job: job['arrival'])
+
+
+def simulate_fifo(jobs, workers):
+    free_at = [0.0] * workers
+    heapq.heapify(free_at)
+    done = {}
+    for job in jobs:
+        start = max(job['arrival'], heapq.heappop(free_at))
+        end = start + job['seconds']
+        done[job['id']] = end
+        heapq.heappush(free_at, end)
+    return done
+
+
+def simulate_fair(jobs, workers, short_slots, max_per_client, time_slice, resume_overhead):
+    slots = {'short': short_slots, 'long': max(1, workers - short_slots)}
+    for job in jobs:
+        job['class'] = classify(job['estimated'])
+        job['remaining'] = job['seconds']
+        job['slices'] = 0
+    queued = {'short': [], 'long': []}   # [(queued_at, job_id)]
+    running = {'short': {}, 'long': {}}  # job_id -> job
+    events = []  # (time, seq, kind, job_id)
+    seq = 0
+    by_id = {job['id']: job for job in jobs}
+    for job in jobs:
+        events.append((job['arrival'], seq, 'arrive', job['id']))
+        seq += 1
+    heapq.heapify(events)
+    done = {}
+
+    def dispatch(now):
+        nonlocal seq
+        for job_class in ('short', 'long'):
+            while len(running[job_class]) < slots[job_class] and queued[job_class]:
+                active = {}
+                for job in running[job_class].values():
+                    active[job['client']] = active.get(job['client'], 0) + 1
+                order = sorted(queued[job_class])
+                job_id = pick_next([(job_id, by_id[job_id]['client']) for _, job_id in order],
+                                   active, max_per_client)
+                if job_id is None:
+                    break
+                queued[job_class] = [item for item in queued[job_class] if item[1] != job_id]
+                job = by_id[job_id]
+                running[job_class][job_id] = job
+                run_for = job['remaining'] + (resume_overhead if job['slices'] else 0)
+                if job_class == 'long' and time_slice and run_for > time_slice:
+                    heapq.heappush(events, (now + time_slice, seq, 'preempt', job_id))
+                else:
+                    heapq.heappush(events, (now + run_for, seq, 'finish', job_id))
+                seq += 1
+
+    while events:
+        now, _, kind, job_id = heapq.heappop(events)
+        job = by_id[job_id]
+        if kind == 'arrive':
+            queued[job['class']].append((now, job_id))
+        else:
+            del running[job['class']][job_id]
+            if kind == 'finish':
+                done[job_id] = now
+            else:
+                job['remaining'] -= time_slice - (resume_overhead if job['slices'] else 0)
+                job['slices'] += 1
+                queued[job['class']].append((now, job_id))
+        dispatch(now)
+    return done
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * p / 100
+    f = int(k)
+    return values[f] + (values[min(f + 1, len(values) - 1)] - values[f]) * (k - f)
+
+
+def report(name, jobs, done):
+    for label, selected in (('short', [j for j in jobs if j['short']]), ('long', [j for j in jobs if not j['short']])):
+        latency = [done[j['id']] - j['arrival'] for j in selected]
+        print(f"{name:>5} {label:>6} {len(latency):>5} {percentile(latency, 50):>9.0f} "
+              f"{percentile(latency, 95):>9.0f} {max(latency, default=0):>9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hours', type=float, default=2)
+    parser.add_argument('--clients', type=int, default=6)
+    parser.add_argument('--batch', type=int, default=12, help='heavy 客户端一次上传的长视频数')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--short-slots', type=int, default=2, help='fair 策略中留给 short 队列的 worker 数')
+    parser.add_argument('--max-per-client', type=int, default=1)
+    parser.add_argument('--time-slice', type=float, default=600)
+    parser.add_argument('--resume-overhead', type=float, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    jobs = make_workload(args.hours, args.clients, args.batch, args.seed)
+    print(f"{len(jobs)} jobs ({sum(j['short'] for j in jobs)} short), {args.workers} workers\n")
+    print(f"{'policy':>5} {'jobs':>6} {'count':>5} {'p50 s':>9} {'p95 s':>9} {'max s':>9}")
+    report('fifo', jobs, simulate_fifo(jobs, args.workers))
+    report('fair', jobs, simulate_fair([dict(j) for j in jobs], args.workers, args.short_slots,
+                                       args.max_per_client, args.time_slice, args.resume_overhead))
+
+
+if __name__ == '__main__':
+    main()
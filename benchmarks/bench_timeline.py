@@ -0,0 +1,141 @@
+"""行为时间线与逐帧结果分块的存储大小和查询耗时对比
+
+用法:
+    python benchmarks/bench_timeline.py --minutes 60 --cats 2 --queries 50
+
+在临时测试数据库中为一段长视频生成合成的逐帧结果（每只猫交替休息/走动/站立，
+休息时位置只有少量抖动，偶尔短暂漏检），经 ResultsWriter 同时写入两种布局：
+  - frames：FrameResultChunk 逐帧结果分块
+  - timeline：BehaviorSegment 行为区间（位置统计 + 降采样 delta 轨迹）
+输出两种布局的行数和序列化字节数，以及两个查询的中位耗时：
+  - 每只猫各行为的时长（frames 需要遍历全部帧，timeline 直接在区间上聚合）
+  - 第 N 帧每只猫的行为（frames 定位分块后取一帧，timeline 查覆盖该帧的区间）
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cattax.settings')
+
+import django
+
+django.setup()
+
+from django.test.utils import setup_test_environment, setup_databases, teardown_databases
+
+from api import timeline
+from api.models import VideoAnalysis, FrameResultChunk
+from api.results_store import ResultsWriter
+
+BEHAVIORS = ('resting', 'walking', 'standing')
+
+
+def synthetic_frames(total, cats, fps, seed=0):
+    """逐帧生成合成结果，行为持续 1-120 秒，约 1% 的帧漏检"""
+    rng = random.Random(seed)
+    state = {}
+    for cat_id in range(1, cats + 1):
+        state[cat_id] = {'behavior': 'resting', 'left': 0, 'x': rng.randint(50, 550), 'y': rng.randint(50, 350)}
+    for _ in range(total):
+        frame_results = []
+        for cat_id, cat in state.items():
+            if cat['left'] <= 0:
+                cat['behavior'] = rng.choice(BEHAVIORS)
+                cat['left'] = rng.randint(fps, fps * 120)
+                cat['dx'], cat['dy'] = rng.choice((-2, -1, 1, 2)), rng.choice((-2, -1, 1, 2))
+            cat['left'] -= 1
+            if cat['behavior'] == 'walking':
+                cat['x'] = min(max(cat['x'] + cat['dx'], 0), 640)
+                cat['y'] = min(max(cat['y'] + cat['dy'], 0), 360)
+            if rng.random() < 0.01:
+                continue
+            jitter = rng.randint(-1, 1)
+            frame_results.append({'cat_id': cat_id, 'behavior': cat['behavior'],
+                                  'position': (cat['x'] + jitter, cat['y'] + jitter)})
+        yield frame_results
+
+
+def timed(fn, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def legacy_behavior_time(analysis, fps):
+    counts = Counter()
+    for _, frame_results in analysis.iter_frames():
+        for det in frame_results:
+            counts[(det['cat_id'], det['behavior'])] += 1
+    return {key: frames / fps for key, frames in counts.items()}
+
+
+def legacy_behavior_at(analysis_id, frame_index):
+    chunk = FrameResultChunk.objects.filter(
+        analysis_id=analysis_id, start_frame__lte=frame_index, end_frame__gt=frame_index
+    ).first()
+    return chunk.frames[frame_index - chunk.start_frame]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--minutes', type=float, default=60)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--cats', type=int, default=2)
+    parser.add_argument('--queries', type=int, default=50, help='每个查询重复的次数')
+    args = parser.parse_args()
+    total = int(args.minutes * 60 * args.fps)
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        analysis = VideoAnalysis.objects.create(video_file='uploads/bench.mp4', status='processing')
+        writer = ResultsWriter(analysis.id, total, flush_seconds=float('inf'), fps=args.fps, store_frames=True)
+        start = time.perf_counter()
+        for frame_results in synthetic_frames(total, args.cats, args.fps):
+            writer.append(frame_results)
+        writer.finish()
+        print(f"写入 {total} 帧（{args.minutes:g} 分钟 @ {args.fps} fps, {args.cats} 只猫）: "
+              f"{time.perf_counter() - start:.1f}s")
+
+        chunks = list(FrameResultChunk.objects.filter(analysis=analysis).values_list('frames', flat=True))
+        frames_bytes = sum(len(json.dumps(frames)) for frames in chunks)
+        segments = timeline.segments_since(analysis.id)
+        timeline_bytes = sum(len(json.dumps(segment, default=str)) for segment in segments)
+
+        rng = random.Random(1)
+        probes = [rng.randrange(total) for _ in range(args.queries)]
+        probe_iter = iter(probes * 2)
+        legacy_time_ms = timed(lambda: legacy_behavior_time(analysis, args.fps), max(1, args.queries // 10))
+        timeline_time_ms = timed(lambda: timeline.behavior_time(analysis.id, fps=args.fps), args.queries)
+        legacy_at_ms = timed(lambda: legacy_behavior_at(analysis.id, next(probe_iter)), args.queries)
+        timeline_at_ms = timed(lambda: timeline.behavior_at(analysis.id, next(probe_iter)), args.queries)
+
+        # 抽查时间线与逐帧结果的一致性（区间包含短暂漏检，只比较检测到的猫）
+        mismatched = 0
+        for frame_index in probes:
+            actual = {det['cat_id']: det['behavior'] for det in legacy_behavior_at(analysis.id, frame_index)}
+            compact = {cat['cat_id']: cat['behavior'] for cat in timeline.behavior_at(analysis.id, frame_index)}
+            mismatched += any(compact.get(cat_id) != behavior for cat_id, behavior in actual.items())
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+    print(f"\n{'layout':>9} {'rows':>8} {'KB':>10} {'time/cat ms':>12} {'at frame ms':>12}")
+    print(f"{'frames':>9} {len(chunks):>8} {frames_bytes / 1024:>10.1f} {legacy_time_ms:>12.2f} {legacy_at_ms:>12.3f}")
+    print(f"{'timeline':>9} {len(segments):>8} {timeline_bytes / 1024:>10.1f} "
+          f"{timeline_time_ms:>12.2f} {timeline_at_ms:>12.3f}")
+    print(f"\n存储: {frames_bytes / max(timeline_bytes, 1):.1f}x 更小, "
+          f"时长查询: {legacy_time_ms / max(timeline_time_ms, 1e-6):.0f}x 更快, "
+          f"抽查 {len(probes)} 帧行为不一致 {mismatched} 帧")
+
+
+if __name__ == '__main__':
+    main()
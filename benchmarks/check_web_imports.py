@@ -0,0 +1,159 @@
+"""web 进程导入体积检查：加载 API 的 URLconf 和处理上传后不应导入模型和 CV 依赖
+
+用法:
+    python benchmarks/check_web_imports.py
+    python benchmarks/check_web_imports.py --compare --max-seconds 1.5 --max-rss-mb 150
+
+在新的 Python 进程中依次执行 django.setup()、get_wsgi_application() 和加载 ROOT_URLCONF 的全部路由
+（相当于 gunicorn / runserver 处理第一个请求之前），输出导入耗时、进程 RSS；然后在临时测试数据库中
+用测试客户端 POST /api/analysis/upload_video/ 上传一个 MP4 和一个其它容器的视频（估算成本、排队、派发，
+派发给 Celery 的消息只记录不发送）。输出 --forbidden 中被导入的模块和最先导入它的项目代码位置。
+有被禁止的模块、上传失败，或导入耗时 / RSS 超过 --max-seconds / --max-rss-mb 时以退出码 1 结束，
+可直接用于 CI。--compare 同时测量 worker 进程导入 api.tasks 后的耗时和 RSS 作为对比。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FORBIDDEN = ('torch', 'ultralytics', 'scipy', 'cv2')
+
+# 子进程中执行：记录每个被禁止的模块第一次被导入时项目代码中的调用位置
+PROBE = r'''
+import json, os, sys, time, traceback
+
+root, forbidden, target, videos = sys.argv[1], sys.argv[2].split(','), sys.argv[3], sys.argv[4:]
+sys.path.insert(0, root)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cattax.settings')
+importers = {}
+
+
+class Recorder:
+    def find_spec(self, name, path=None, target=None):
+        top = name.partition('.')[0]
+        if top in forbidden and top not in importers:
+            frames = [f for f in traceback.extract_stack()[:-1]
+                      if f.filename.startswith(root) and 'benchmarks' not in f.filename]
+            importers[top] = f"{os.path.relpath(frames[-1].filename, root)}:{frames[-1].lineno}" if frames else '?'
+        return None
+
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+
+sys.meta_path.insert(0, Recorder())
+start = time.perf_counter()
+if target == 'web':
+    from django.core.wsgi import get_wsgi_application
+    from django.urls import get_resolver
+    get_wsgi_application()
+    get_resolver().url_patterns
+else:
+    import django
+    django.setup()
+    import api.tasks
+seconds = time.perf_counter() - start
+rss = rss_mb()
+
+uploads = []
+if videos:
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import override_settings, setup_test_environment
+    from api import jobs
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    sent = []
+    jobs.send = lambda name, *args, **kwargs: sent.append(name)
+    with override_settings(MEDIA_ROOT=os.path.dirname(videos[0]), CATTAX_EVENTS_URL=''):
+        for i, video in enumerate(videos):
+            # 每个上传用不同的客户端，都能立即派发
+            with open(video, 'rb') as f:
+                response = Client().post('/api/analysis/upload_video/', {'video': f}, HTTP_X_CLIENT_ID=f'check-{i}')
+            data = response.json()
+            uploads.append({'name': os.path.basename(video), 'status_code': response.status_code,
+                            'status': data.get('status'), 'job_class': data.get('job_class'),
+                            'estimated_seconds': data.get('estimated_seconds'), 'error': data.get('error')})
+    uploads.append({'dispatched': len(sent)})
+
+print(json.dumps({
+    'seconds': seconds,
+    'rss_mb': rss,
+    'modules': len(sys.modules),
+    'forbidden': {name: importers.get(name, '?') for name in forbidden if name in sys.modules},
+    'uploads': uploads,
+}))
+'''
+
+
+def make_videos(directory, frames=50, size=(320, 240)):
+    """生成上传用的视频：一个 MP4，和一个按文件大小估算成本的其它容器文件（内容只需互不相同）"""
+    mp4 = os.path.join(directory, 'check.mp4')
+    writer = cv2.VideoWriter(mp4, cv2.VideoWriter_fourcc(*'mp4v'), 25, size)
+    for i in range(frames):
+        frame = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        cv2.circle(frame, (20 + i * 5, size[1] // 2), 15, (255, 255, 255), -1)
+        writer.write(frame)
+    writer.release()
+    mkv = os.path.join(directory, 'check.mkv')
+    with open(mkv, 'wb') as f:
+        f.write(np.random.default_rng(0).bytes(256 * 1024))
+    return [mp4, mkv]
+
+
+def measure(target, forbidden, videos=()):
+    output = subprocess.run([sys.executable, '-c', PROBE, ROOT, ','.join(forbidden), target, *videos],
+                            check=True, capture_output=True, text=True, cwd=ROOT).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--forbidden', nargs='+', default=list(FORBIDDEN), help='web 进程不允许导入的顶层模块')
+    parser.add_argument('--max-seconds', type=float, default=2.0, help='web 进程导入耗时上限（秒）')
+    parser.add_argument('--max-rss-mb', type=float, default=200.0, help='web 进程 RSS 上限（MB）')
+    parser.add_argument('--compare', action='store_true', help='同时测量 worker 导入 api.tasks 的耗时和 RSS')
+    args = parser.parse_args()
+
+    targets = ['web', 'worker'] if args.compare else ['web']
+    print(f"{'process':<8} {'seconds':>8} {'rss MB':>8} {'modules':>8}  forbidden modules")
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for target in targets:
+            videos = make_videos(directory) if target == 'web' else ()
+            r = results[target] = measure(target, args.forbidden, videos)
+            loaded = ', '.join(f"{name} (from {where})" for name, where in r['forbidden'].items()) or '-'
+            print(f"{target:<8} {r['seconds']:>8.2f} {r['rss_mb']:>8.1f} {r['modules']:>8}  {loaded}")
+
+    web = results['web']
+    failed = []
+    print()
+    for upload in web['uploads'][:-1]:
+        print(f"upload {upload['name']}: HTTP {upload['status_code']}, {upload['status']}, "
+              f"{upload['job_class']} queue, ~{upload['estimated_seconds']}s")
+        if upload['status_code'] != 200:
+            failed.append(f"upload {upload['name']} failed: {upload['error']}")
+    if web['uploads'][-1]['dispatched'] != len(web['uploads']) - 1:
+        failed.append(f"{web['uploads'][-1]['dispatched']} of {len(web['uploads']) - 1} uploads dispatched")
+    if web['forbidden']:
+        failed.append(f"web process imports {', '.join(web['forbidden'])}")
+    if web['seconds'] > args.max_seconds:
+        failed.append(f"web import took {web['seconds']:.2f}s, over {args.max_seconds}s")
+    if web['rss_mb'] > args.max_rss_mb:
+        failed.append(f"web RSS {web['rss_mb']:.1f}MB over {args.max_rss_mb}MB")
+    if failed:
+        raise SystemExit('\n'.join(['', *failed]))
+    print("\nWeb process stays free of model and CV dependencies, including after an upload.")
+
+
+if __name__ == '__main__':
+    main()
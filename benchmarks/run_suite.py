@@ -0,0 +1,276 @@
+"""离线基准套件：合成视频 + 桩检测模型，跑完整的 process_video 并与基线对比
+
+用法:
+    python benchmarks/run_suite.py                       # 全部用例，结果写到 benchmarks/results/
+    python benchmarks/run_suite.py --quick               # 只跑两个短用例
+    python benchmarks/run_suite.py --baseline benchmarks/baseline.json --tolerance 0.1
+    python benchmarks/run_suite.py --save-baseline benchmarks/baseline.json
+
+用例是不同分辨率和长度的确定性合成视频（见 synthetic.py，缓存在 --video-dir），检测用
+StubModel 代替 YOLO，不需要下载模型，因此测的是模型以外的部分：解码、追踪、轮廓、行为分析、
+绘制、编码和写库。每个用例在独立的子进程中运行（临时测试数据库、临时 MEDIA_ROOT），记录：
+  - fps：端到端帧率（--repeat 次取最好）
+  - peak_rss_mb：子进程的峰值内存
+  - db：写库的语句数（INSERT / UPDATE）和参数字节数
+  - stages：results['perf'] 中各阶段的平均和 p95 逐帧耗时（毫秒，各次重复中取最小）
+结果保存为 JSON。给出 --baseline 时逐项对比，变差超过 --tolerance 的指标列为回归，并以退出码 1 结束。
+三个流水线线程互相争抢 CPU，单个阶段的耗时波动比端到端帧率大，用单独的 --stage-tolerance 判断。
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cattax.settings')
+
+RESULT_MARKER = 'BENCH_RESULT '
+
+# 用例名: (分辨率, 帧数)，合成视频都是 30fps
+CASES = {
+    '360p-10s': ('360p', 300),
+    '720p-10s': ('720p', 300),
+    '1080p-10s': ('1080p', 300),
+    '720p-60s': ('720p', 1800),
+}
+QUICK_CASES = ('360p-10s', '720p-10s')
+
+# 越大越好的指标；其余指标（内存、写库量、耗时）越小越好
+HIGHER_IS_BETTER = ('fps',)
+
+
+class WriteCounter:
+    """统计所有数据库连接（包括流水线标注线程的连接）执行的写语句数和参数字节数"""
+
+    def __init__(self):
+        self.statements = {'INSERT': 0, 'UPDATE': 0, 'DELETE': 0}
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        verb = sql.lstrip().split(' ', 1)[0].upper()
+        if verb in self.statements:
+            size = sum(len(str(p)) for row in (params if many else [params or ()]) for p in row)
+            with self._lock:
+                self.statements[verb] += len(params) if many else 1
+                self.bytes += size
+        return execute(sql, params, many, context)
+
+    def snapshot(self):
+        with self._lock:
+            return {'statements': dict(self.statements), 'bytes': self.bytes}
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位是 KB，macOS 上是字节
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_case(name, video_dir, repeat):
+    """在当前（子）进程中运行一个用例，返回指标字典"""
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+    from django.db.backends.signals import connection_created
+    from django.test.utils import setup_test_environment, setup_databases, teardown_databases
+
+    from api.models import VideoAnalysis
+    from cattax import model_registry
+    from cattax.cat_capture import process_video
+    from synthetic import StubModel, make_video
+
+    resolution, frames = CASES[name]
+    video = make_video(os.path.join(video_dir, f'{name}.mp4'), resolution, frames)
+
+    settings.MEDIA_ROOT = tempfile.mkdtemp(prefix='cattax-bench-')
+    settings.CATTAX_RENDER_MODE = 'headless'
+    settings.CATTAX_PROFILER = ''
+    settings.CATTAX_METRICS_PORT = 0
+    counter = WriteCounter()
+    connection_created.connect(lambda sender, connection, **kwargs: connection.execute_wrappers.append(counter),
+                               weak=False)
+    model_registry.register(StubModel())
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        runs = []
+        for _ in range(max(1, repeat)):
+            analysis = VideoAnalysis.objects.create(video_file=video, status='processing')
+            before = counter.snapshot()
+            start = time.perf_counter()
+            output = process_video(video, analysis.id)
+            elapsed = time.perf_counter() - start
+            after = counter.snapshot()
+            analysis.refresh_from_db()
+            runs.append({
+                'elapsed': elapsed,
+                'frames': output['processed_frames'],
+                'perf': analysis.results['perf'],
+                'db': {
+                    'statements': {verb: after['statements'][verb] - before['statements'][verb]
+                                   for verb in after['statements']},
+                    'bytes': after['bytes'] - before['bytes'],
+                },
+            })
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+    best = min(runs, key=lambda run: run['elapsed'])
+    return {
+        'resolution': resolution,
+        'frames': best['frames'],
+        'fps': round(best['frames'] / best['elapsed'], 2),
+        'wall_s': round(best['elapsed'], 3),
+        'peak_rss_mb': peak_rss_mb(),
+        'db': best['db'],
+        'stages': {stage: {metric: min(run['perf']['stages'][stage][metric] for run in runs)
+                           for metric in ('avg_ms', 'p95_ms')}
+                   for stage in best['perf']['stages']},
+        'bottleneck': best['perf']['bottleneck'],
+    }
+
+
+def run_in_subprocess(name, video_dir, repeat):
+    """每个用例一个子进程，峰值内存和进程级缓存互不影响"""
+    command = [sys.executable, os.path.abspath(__file__), '--child', name,
+               '--video-dir', video_dir, '--repeat', str(repeat)]
+    proc = subprocess.run(command, capture_output=True, text=True, cwd=ROOT)
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    print(proc.stdout[-2000:])
+    print(proc.stderr[-4000:])
+    raise SystemExit(f"Case {name} failed with exit code {proc.returncode}")
+
+
+def flatten(case):
+    """把一个用例的结果展开成 {指标路径: 数值}，用于和基线对比"""
+    metrics = {'fps': case['fps'], 'db.bytes': case['db']['bytes'],
+               'db.statements': sum(case['db']['statements'].values())}
+    if case.get('peak_rss_mb') is not None:
+        metrics['peak_rss_mb'] = case['peak_rss_mb']
+    for stage, data in case['stages'].items():
+        metrics[f'stages.{stage}.avg_ms'] = data['avg_ms']
+    return metrics
+
+
+def compare(results, baseline, tolerance, stage_tolerance, min_ms=0.2):
+    """返回 [(用例, 指标, 基线值, 当前值, 变化比例, 是否回归)]
+
+    阶段耗时按 stage_tolerance 判断；耗时很小（低于 min_ms 毫秒）的阶段波动比例大，不参与回归判断。
+    """
+    rows = []
+    for name, case in results['cases'].items():
+        base_case = baseline.get('cases', {}).get(name)
+        if base_case is None:
+            continue
+        base_metrics = flatten(base_case)
+        for metric, value in flatten(case).items():
+            base = base_metrics.get(metric)
+            if base is None or not base:
+                continue
+            change = (value - base) / base
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if metric.startswith('stages.'):
+                regressed = worse > stage_tolerance and max(value, base) >= min_ms
+            else:
+                regressed = worse > tolerance
+            rows.append((name, metric, base, value, change, regressed))
+    return rows
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=ROOT, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), help='要运行的用例，默认全部')
+    parser.add_argument('--quick', action='store_true', help=f"只运行 {' '.join(QUICK_CASES)}")
+    parser.add_argument('--repeat', type=int, default=3, help='每个用例重复次数，取最快的一次')
+    parser.add_argument('--video-dir', default=os.path.join(tempfile.gettempdir(), 'cattax-bench-videos'),
+                        help='合成视频缓存目录')
+    parser.add_argument('--output', help='结果 JSON 路径，默认 benchmarks/results/suite-<时间>.json')
+    parser.add_argument('--baseline', help='与这个基线 JSON 对比，默认 benchmarks/baseline.json（存在时）')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='帧率、内存和写库量变差超过这个比例视为回归')
+    parser.add_argument('--stage-tolerance', type=float, default=0.25, help='单个阶段耗时变差超过这个比例视为回归')
+    parser.add_argument('--save-baseline', help='把本次结果另存为基线')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        print(RESULT_MARKER + json.dumps(run_case(args.child, args.video_dir, args.repeat)))
+        return
+
+    names = args.cases or (list(QUICK_CASES) if args.quick else list(CASES))
+    results = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'git': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'repeat': args.repeat,
+        },
+        'cases': {},
+    }
+    print(f"{'case':<10} {'frames':>6} {'fps':>8} {'rss MB':>8} {'db stmts':>9} {'db KB':>8}  bottleneck")
+    for name in names:
+        case = run_in_subprocess(name, args.video_dir, args.repeat)
+        results['cases'][name] = case
+        print(f"{name:<10} {case['frames']:>6} {case['fps']:>8.1f} {case['peak_rss_mb'] or 0:>8.1f} "
+              f"{sum(case['db']['statements'].values()):>9} {case['db']['bytes'] / 1024:>8.1f}  {case['bottleneck']}")
+
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results',
+                                         f"suite-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    baseline_path = args.baseline or os.path.join(ROOT, 'benchmarks', 'baseline.json')
+    if not os.path.exists(baseline_path):
+        if args.baseline:
+            raise SystemExit(f"Baseline not found: {baseline_path}")
+        return
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    rows = compare(results, baseline, args.tolerance, args.stage_tolerance)
+    regressions = [row for row in rows if row[5]]
+    print(f"\nCompared with {baseline_path} (git {baseline['meta'].get('git')}, "
+          f"tolerance {args.tolerance:.0%} / stages {args.stage_tolerance:.0%}):")
+    for name, metric, base, value, change, regressed in rows:
+        if regressed or metric in ('fps', 'peak_rss_mb', 'db.bytes'):
+            print(f"  {'REGRESSION' if regressed else 'ok':<10} {name:<10} {metric:<26} {base:>10} -> {value:<10} "
+                  f"({change:+.1%})")
+    if regressions:
+        raise SystemExit(f"{len(regressions)} metric(s) regressed")
+    print("No regressions.")
+
+
+if __name__ == '__main__':
+    main()
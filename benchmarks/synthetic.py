@@ -0,0 +1,118 @@
+"""基准测试用的合成视频和桩检测模型
+
+make_video() 生成确定性的“猫”视频：带轻微噪声纹理的深色背景上有几只亮色椭圆，
+按固定轨迹走动、停下休息、再走动（走动时细长、休息时接近圆形），同样的参数总是生成同样的帧。
+StubModel 实现 CatDetector 用到的 model.predict 接口：把亮色连通区域当作猫，
+返回带框和分割掩膜的 ultralytics Results，不需要下载或加载任何模型。
+与 YOLO 一样在缩小后的图像上得到掩膜（长边最多 mask_size 像素），由 Results 缩放回原图坐标。
+"""
+import math
+import os
+
+import cv2
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+from cattax.detection import CAT_CLASS_ID
+
+RESOLUTIONS = {
+    '360p': (640, 360),
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+}
+CAT_COLORS = ((235, 235, 235), (60, 160, 250), (200, 220, 240))
+
+
+def cat_states(frame_index, frame_size, cats=2, cat_scale=1.0):
+    """第 frame_index 帧每只猫的 (cx, cy, 长半轴, 短半轴, 角度)，只依赖参数
+
+    每只猫在自己的水平条带内活动，彼此不会重叠（重叠时连通区域会合并，追踪 ID 不稳定）。
+    cat_scale 缩放猫的大小，小于 1 时模拟广角镜头下猫只占画面很小一部分。
+    """
+    w, h = frame_size
+    band = h / cats
+    states = []
+    for k in range(cats):
+        # 每只猫按自己的周期循环：走 4 秒、休息 3 秒（按 30fps 计帧）
+        period = 210 + 40 * k
+        phase = (frame_index + 53 * k) % period
+        walked = (frame_index + 53 * k) // period * 120 + min(phase, 120)
+        t = walked / 120
+        cx = w * (0.5 + 0.38 * math.sin(t * 0.9 + k * 2.1))
+        cy = band * (k + 0.5 + 0.2 * math.sin(t * 1.3 + k * 1.3))
+        radius = min((26 + 6 * k) * min(w, h) / 360, band * 0.18) * cat_scale
+        if phase < 120:
+            dx = 0.9 * 0.38 * w * math.cos(t * 0.9 + k * 2.1)
+            dy = 1.3 * 0.2 * band * math.cos(t * 1.3 + k * 1.3)
+            states.append((cx, cy, radius * 1.6, radius * 0.8, math.degrees(math.atan2(dy, dx))))
+        else:
+            states.append((cx, cy, radius, radius * 0.9, 0.0))
+    return states
+
+
+def render_frame(frame_index, frame_size, cats=2, background=None, cat_scale=1.0):
+    w, h = frame_size
+    frame = background.copy() if background is not None else np.full((h, w, 3), 40, np.uint8)
+    for k, (cx, cy, a, b, angle) in enumerate(cat_states(frame_index, frame_size, cats, cat_scale)):
+        cv2.ellipse(frame, (int(cx), int(cy)), (int(a), int(b)), angle, 0, 360, CAT_COLORS[k % len(CAT_COLORS)], -1)
+    return frame
+
+
+def make_background(frame_size, seed=0):
+    w, h = frame_size
+    rng = np.random.RandomState(seed)
+    noise = rng.randint(0, 24, size=(h // 8 + 1, w // 8 + 1, 1)).astype(np.uint8)
+    texture = cv2.resize(noise, (w, h), interpolation=cv2.INTER_LINEAR)
+    return cv2.merge([texture + 30, texture + 34, texture + 38])
+
+
+def make_video(path, resolution='360p', frames=300, fps=30, cats=2, seed=0, cat_scale=1.0):
+    """生成合成视频，已存在时直接复用（内容只由参数决定），返回路径"""
+    if os.path.exists(path):
+        return path
+    frame_size = RESOLUTIONS.get(resolution, resolution)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    background = make_background(frame_size, seed)
+    tmp_path = path + '.tmp.mp4'
+    out = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, tuple(frame_size))
+    try:
+        for i in range(frames):
+            out.write(render_frame(i, frame_size, cats, background, cat_scale))
+    finally:
+        out.release()
+    os.replace(tmp_path, path)
+    return path
+
+
+class StubModel:
+    """亮色连通区域即为猫的桩检测模型"""
+
+    def __init__(self, threshold=128, min_area=50, mask_size=640):
+        self.threshold = threshold
+        self.min_area = min_area
+        self.mask_size = mask_size
+
+    def detect_one(self, frame):
+        h, w = frame.shape[:2]
+        scale = min(1.0, self.mask_size / max(h, w))
+        small = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA) if scale < 1 else frame
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        count, labels, stats, _ = cv2.connectedComponentsWithStats((gray > self.threshold).astype(np.uint8))
+        boxes, masks = [], []
+        for k in range(1, count):
+            x, y, bw, bh, area = stats[k]
+            if area < self.min_area * scale * scale:
+                continue
+            boxes.append([x / scale, y / scale, (x + bw) / scale, (y + bh) / scale, 0.9, CAT_CLASS_ID])
+            masks.append(torch.from_numpy((labels == k).astype(np.float32)))
+        return Results(
+            frame, 'synthetic.jpg', {CAT_CLASS_ID: 'cat'},
+            boxes=torch.tensor(boxes, dtype=torch.float32).reshape(-1, 6),
+            masks=torch.stack(masks) if masks else None
+        )
+
+    def predict(self, frames, **kwargs):
+        if isinstance(frames, np.ndarray):
+            frames = [frames]
+        return [self.detect_one(frame) for frame in frames]
@@ -0,0 +1,131 @@
+import importlib.util
+import os
+import shutil
+
+from django.conf import settings
+
+# 推理后端：torch 直接加载 .pt；onnx / openvino 使用从 .pt 导出的模型，仅 CPU
+BACKENDS = ('torch', 'onnx', 'openvino')
+BACKEND_MODULES = {'onnx': 'onnxruntime', 'openvino': 'openvino'}
+MODEL_SIZES = ('n', 's', 'm', 'l', 'x')
+EXPORT_IMGSZ = 640
+
+
+def is_available(backend):
+    """后端依赖是否已安装（onnxruntime / openvino 是可选依赖）"""
+    if backend == 'torch':
+        return True
+    module = BACKEND_MODULES.get(backend)
+    return module is not None and importlib.util.find_spec(module) is not None
+
+
+def available_backends():
+    return [backend for backend in BACKENDS if is_available(backend)]
+
+
+def resolve_weights(size=None):
+    """设置了模型尺寸（n/s/m/l/x）时使用对应的 yolo11{size}-seg.pt，否则使用 CATTAX_MODEL_WEIGHTS"""
+    if size is None:
+        size = getattr(settings, 'CATTAX_MODEL_SIZE', '')
+    if not size:
+        return getattr(settings, 'CATTAX_MODEL_WEIGHTS', 'yolo11x-seg.pt')
+    if size not in MODEL_SIZES:
+        raise ValueError(f"Unknown model size: {size} (expected one of {', '.join(MODEL_SIZES)})")
+    return f'yolo11{size}-seg.pt'
+
+
+def resolve_backend(backend=None):
+    """返回实际使用的后端，未安装的可选后端回退到 torch"""
+    if backend is None:
+        backend = getattr(settings, 'CATTAX_INFERENCE_BACKEND', 'torch')
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend} (expected one of {', '.join(BACKENDS)})")
+    if not is_available(backend):
+        print(f"Inference backend {backend} is not installed ({BACKEND_MODULES[backend]}), falling back to torch")
+        return 'torch'
+    return backend
+
+
+def resolve_int8(backend, int8=None):
+    if int8 is None:
+        int8 = getattr(settings, 'CATTAX_MODEL_INT8', False)
+    # torch 后端不做量化
+    return bool(int8) and backend != 'torch'
+
+
+def model_spec(weights=None, backend=None, int8=None, size=None):
+    """归一化后的模型配置 (weights, backend, int8)，用作模型缓存键和分析缓存参数"""
+    weights = weights or resolve_weights(size)
+    backend = resolve_backend(backend)
+    return weights, backend, resolve_int8(backend, int8)
+
+
+def export_dir():
+    return str(getattr(settings, 'CATTAX_EXPORT_DIR', os.path.join(settings.BASE_DIR, 'models')))
+
+
+def exported_path(weights, backend, int8=False):
+    stem = os.path.splitext(os.path.basename(weights))[0] + ('-int8' if int8 else '')
+    if backend == 'onnx':
+        return os.path.join(export_dir(), f'{stem}.onnx')
+    # ultralytics 按目录名后缀 _openvino_model 识别 OpenVINO 模型
+    return os.path.join(export_dir(), f'{stem}_openvino_model')
+
+
+def quantize_onnx(source, target):
+    """ONNX Runtime 动态 INT8 量化（权重 INT8，激活运行时量化），不需要校准数据"""
+    import onnx
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(source, target, weight_type=QuantType.QUInt8)
+    # 保留 ultralytics 写入的类别名、任务类型和输入尺寸，加载时依赖这些元数据
+    metadata = {prop.key: prop.value for prop in onnx.load(source).metadata_props}
+    model = onnx.load(target)
+    existing = {prop.key for prop in model.metadata_props}
+    for key, value in metadata.items():
+        if key not in existing:
+            model.metadata_props.add(key=key, value=value)
+    onnx.save(model, target)
+
+
+def export_model(weights, backend, int8=False, imgsz=EXPORT_IMGSZ):
+    """把 .pt 导出为 ONNX / OpenVINO 模型并缓存在 CATTAX_EXPORT_DIR，已导出时直接返回路径
+
+    导出使用动态输入，批量推理（CATTAX_BATCH_SIZE > 1）可以直接使用。
+    OpenVINO 的 INT8 由 ultralytics 调用 NNCF 做训练后量化，校准数据为
+    CATTAX_INT8_CALIBRATION_DATA（留空使用 ultralytics 默认的 coco8-seg）。
+    """
+    from ultralytics import YOLO
+
+    path = exported_path(weights, backend, int8)
+    if os.path.exists(path):
+        return path
+    os.makedirs(export_dir(), exist_ok=True)
+    print(f"Exporting {weights} to {backend}{' (INT8)' if int8 else ''}: {path}")
+    model = YOLO(weights)
+    if backend == 'onnx':
+        exported = model.export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+        if int8:
+            quantize_onnx(exported, path)
+            os.remove(exported)
+        else:
+            shutil.move(exported, path)
+    elif backend == 'openvino':
+        kwargs = {'format': 'openvino', 'imgsz': imgsz, 'dynamic': True, 'int8': int8}
+        calibration = getattr(settings, 'CATTAX_INT8_CALIBRATION_DATA', '')
+        if int8 and calibration:
+            kwargs['data'] = calibration
+        exported = model.export(**kwargs)
+        shutil.move(exported, path)
+    else:
+        raise ValueError(f"Backend {backend} does not need an export")
+    return path
+
+
+def load_model(weights, backend, int8=False):
+    """按后端加载 ultralytics 模型；导出的模型与 .pt 共用 predict 接口，CatDetector 无需区分"""
+    from ultralytics import YOLO
+
+    if backend == 'torch':
+        return YOLO(weights)
+    return YOLO(export_model(weights, backend, int8), task='segment')
@@ -0,0 +1,113 @@
+import cv2
+import numpy as np
+from django.conf import settings
+
+BOX_PADDING = 0.1  # 屏蔽猫的区域时框向外扩展的比例
+# 相似变换只有 4 个自由度，几十个分散的点加 RANSAC 就足够；LK 的耗时与点数和迭代次数成正比
+LK_PARAMS = {'winSize': (15, 15), 'maxLevel': 3,
+             'criteria': (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03)}
+
+
+class CameraMotionEstimator:
+    """全局（摄像机）运动估计：相邻两个检测帧之间背景的相似变换（平移、旋转、缩放）
+
+    灰度图先缩小到 width 像素宽，在上一帧的背景区域（猫的框以外）取最多 max_corners 个角点，
+    用金字塔 LK 光流跟踪到当前帧，丢弃跟踪失败和落进当前帧猫框内的点，再用 RANSAC 拟合相似变换。
+    拟合的内点留作下一帧的特征点继续跟踪，少于 max_corners 的一半时才重新检测角点。
+    每帧只算一次，所有猫共用。可用的背景点少于 min_points 时认为无法估计；画面四角的位移都小于
+    min_shift 像素时视为静止机位。这两种情况都返回 None（不补偿），静止机位的结果与不做补偿时相同。
+    """
+
+    def __init__(self, width=None, max_corners=None, min_points=12, min_shift=0.5):
+        if width is None:
+            width = getattr(settings, 'CATTAX_CAMERA_MOTION_WIDTH', 320)
+        if max_corners is None:
+            max_corners = getattr(settings, 'CATTAX_CAMERA_MOTION_CORNERS', 60)
+        self.width = width
+        self.max_corners = max_corners
+        self.min_points = min_points
+        self.min_shift = min_shift
+        self.reset()
+
+    def reset(self):
+        self._prev = None       # 上一个检测帧缩小后的灰度图
+        self._prev_mask = None  # 上一个检测帧的背景掩膜（猫的区域为 0）
+        self._points = None     # 上一个检测帧中仍在跟踪的背景点
+
+    def get_state(self):
+        return {'prev': self._prev, 'prev_mask': self._prev_mask, 'points': self._points}
+
+    def set_state(self, state):
+        self._prev = state['prev']
+        self._prev_mask = state['prev_mask']
+        self._points = state.get('points')
+
+    def background_mask(self, shape, boxes, scale):
+        mask = np.full(shape, 255, np.uint8)
+        h, w = shape
+        for x0, y0, x1, y1 in np.asarray(boxes, dtype=np.float64).reshape(-1, 4) * scale:
+            pad_x, pad_y = (x1 - x0) * BOX_PADDING, (y1 - y0) * BOX_PADDING
+            mask[max(0, int(y0 - pad_y)):min(h, int(np.ceil(y1 + pad_y))),
+                 max(0, int(x0 - pad_x)):min(w, int(np.ceil(x1 + pad_x)))] = 0
+        return mask
+
+    def fit(self, prev, gray, mask, points):
+        """把 points 从 prev 跟踪到 gray 并拟合相似变换，返回 (缩小图上的 2x3 矩阵, 内点在 gray 中的坐标)，失败时返回 None"""
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(prev, gray, points, None, **LK_PARAMS)
+        moved, points = moved.reshape(-1, 2), points.reshape(-1, 2)
+        x, y = moved[:, 0].round().astype(int), moved[:, 1].round().astype(int)
+        inside = (x >= 0) & (x < gray.shape[1]) & (y >= 0) & (y < gray.shape[0])
+        keep = (status.reshape(-1) == 1) & inside
+        # 跟到当前帧猫身上的点（被猫遮挡的背景）不算
+        keep[keep] = mask[y[keep], x[keep]] > 0
+        if keep.sum() < self.min_points:
+            return None
+        matrix, inliers = cv2.estimateAffinePartial2D(points[keep], moved[keep], method=cv2.RANSAC,
+                                                      ransacReprojThreshold=1.0)
+        if matrix is None or inliers.sum() < self.min_points:
+            return None
+        return matrix, moved[keep][inliers.reshape(-1) == 1].reshape(-1, 1, 2)
+
+    def estimate(self, frame, boxes=()):
+        """返回把上一个检测帧的坐标变换到这一帧的 2x3 矩阵（frame 的像素坐标），无法估计或静止时返回 None
+
+        boxes 为这一帧猫的框 (x0, y0, x1, y1)，不参与估计。
+        """
+        h, w = frame.shape[:2]
+        scale = min(1.0, self.width / w)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if scale < 1:
+            gray = cv2.resize(gray, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+        mask = self.background_mask(gray.shape, boxes, scale)
+        prev, prev_mask, points = self._prev, self._prev_mask, self._points
+        self._prev, self._prev_mask, self._points = gray, mask, None
+        if prev is None or prev.shape != gray.shape:
+            return None
+
+        fitted = None
+        if points is not None and len(points) >= max(self.min_points, self.max_corners // 2):
+            fitted = self.fit(prev, gray, mask, points)
+        if fitted is None:
+            # 沿用的点不够或拟合失败（例如运动过大时跟丢）时重新检测角点再试一次
+            points = cv2.goodFeaturesToTrack(prev, maxCorners=self.max_corners, qualityLevel=0.01, minDistance=12,
+                                             mask=prev_mask)
+            if points is None or len(points) < self.min_points:
+                return None
+            fitted = self.fit(prev, gray, mask, points)
+            if fitted is None:
+                return None
+        matrix, self._points = fitted
+
+        # 缩小图上的变换换算回原图：线性部分不变，平移除以缩放比例
+        matrix[:, 2] /= scale
+        corners = np.array([[0, 0], [w, 0], [0, h], [w, h]], dtype=np.float64)
+        if np.abs(corners @ matrix[:, :2].T + matrix[:, 2] - corners).max() < self.min_shift:
+            return None
+        return matrix
+
+
+def from_settings():
+    """CATTAX_CAMERA_MOTION 开启时返回新的估计器，否则返回 None"""
+    if not getattr(settings, 'CATTAX_CAMERA_MOTION', True):
+        return None
+    return CameraMotionEstimator()
@@ -1,8 +1,11 @@
 import cv2
 import numpy as np
-from collections import defaultdict, deque, Counter
+from collections import OrderedDict, defaultdict, deque
+from django.conf import settings
 from enum import Enum
-from scipy.spatial.distance import cosine, euclidean
+# 阈值定义在不依赖 OpenCV 的 thresholds.py 中（web 进程只导入它），这里重新导出，原有的导入路径不变
+from .thresholds import (MOVEMENT_THRESHOLD, WALKING_ASPECT_RATIO, RESTING_SOLIDITY, RESTING_SHAPE_RATIO,
+                         STANDING_ASPECT_RATIO, STATE_CHANGE_THRESHOLD, DEFAULT_THRESHOLDS, behavior_thresholds)
 
 class CatBehavior(Enum):
     WALKING = "walking"      # 移动状态
@@ -10,118 +13,297 @@ class CatBehavior(Enum):
     STANDING = "standing"    # 站立状态
     UNKNOWN = "unknown"      # 无法识别
 
+# 行为编码，批量接口中用整数数组表示行为
+BEHAVIOR_CODES = [CatBehavior.WALKING, CatBehavior.RESTING, CatBehavior.STANDING, CatBehavior.UNKNOWN]
+BEHAVIOR_INDEX = {behavior: code for code, behavior in enumerate(BEHAVIOR_CODES)}
+WALKING, RESTING, STANDING, UNKNOWN = range(len(BEHAVIOR_CODES))
+
+# 批量接口返回的特征列；movement 在没有上一帧位置时为 NaN
+FEATURE_NAMES = ('aspect_ratio', 'area', 'compactness', 'solidity', 'shape_ratio', 'movement')
+
+
+def contour_features(contour):
+    """计算单个轮廓的形状特征 (aspect_ratio, area, compactness, solidity, shape_ratio)
+
+    退化轮廓（高度为 0、椭圆拟合失败等）会抛出异常，由调用方按 UNKNOWN 处理。
+    """
+    # 基本特征
+    (x, y, w, h) = cv2.boundingRect(contour)
+    aspect_ratio = float(w) / h
+    area = cv2.contourArea(contour)
+
+    # 形状特征
+    perimeter = cv2.arcLength(contour, True)
+    compactness = 4 * np.pi * area / (perimeter * perimeter) if perimeter > 0 else 0
+
+    # 计算轮廓的主要特征
+    if len(contour) >= 5:
+        hull = cv2.convexHull(contour)
+        hull_area = cv2.contourArea(hull)
+        solidity = float(area) / hull_area if hull_area > 0 else 0
+
+        # 分析轮廓的形状特征
+        _, (width, height), _ = cv2.fitEllipse(contour)
+        shape_ratio = min(width, height) / max(width, height)
+    else:
+        solidity = 1
+        shape_ratio = 1
+
+    return aspect_ratio, area, compactness, solidity, shape_ratio
+
+
+def classify_behavior(is_moving, aspect_ratio, solidity, shape_ratio, thresholds=DEFAULT_THRESHOLDS):
+    """根据运动和形状特征判断当前帧的行为编码"""
+    if is_moving and aspect_ratio > thresholds['walking_aspect_ratio']:
+        return WALKING
+    # 静止状态的判断
+    if solidity > thresholds['resting_solidity'] and shape_ratio > thresholds['resting_shape_ratio']:
+        # 形状紧凑且较为圆润，可能是蜷缩/休息状态
+        return RESTING
+    if aspect_ratio < thresholds['standing_aspect_ratio']:
+        # 明显的竖直特征才判断为站立
+        return STANDING
+    return RESTING
+
+
+def classify_behaviors(is_moving, aspect_ratio, solidity, shape_ratio, thresholds=DEFAULT_THRESHOLDS):
+    """classify_behavior 的向量化版本，参数为等长 NumPy 数组"""
+    walking = is_moving & (aspect_ratio > thresholds['walking_aspect_ratio'])
+    curled = (solidity > thresholds['resting_solidity']) & (shape_ratio > thresholds['resting_shape_ratio'])
+    standing = aspect_ratio < thresholds['standing_aspect_ratio']
+    return np.where(walking, WALKING, np.where(curled, RESTING, np.where(standing, STANDING, RESTING)))
+
+
 class CatBehaviorAnalyzer:
-    def __init__(self):
+    """逐只猫（按 cat_id）维护位置、静止计数和行为历史的行为分析器
+
+    每次 analyze_batch 计为一个检测帧，逐只猫调用 analyze_behavior 时同一画面计为一个检测帧
+    （见 _begin_frame）；超过 max_age 个检测帧没有出现的猫的状态会被丢弃，
+    猫很多、追踪 ID 不断更替时状态不会无限增长。max_age 默认取 CATTAX_TRACK_MAX_AGE，
+    应大于追踪器保留丢失目标的帧数（BYTETracker 的 track_buffer），这样被丢弃的 ID 不会再出现，
+    结果与不丢弃时相同；0 表示不丢弃。
+    """
+
+    def __init__(self, thresholds=None, camera_motion=None, max_age=None):
+        # 行为判断阈值，见 behavior_thresholds()
+        self.thresholds = behavior_thresholds(thresholds)
+        # 摄像机运动估计（camera_motion.CameraMotionEstimator），None 表示不做补偿
+        self.camera_motion = camera_motion
+        if max_age is None:
+            max_age = getattr(settings, 'CATTAX_TRACK_MAX_AGE', 60)
+        self.max_age = max_age
+        self.frame_count = 0
+        # cat_id -> 最后出现时的 frame_count，按最后出现的先后排列，过期的猫总在最前面
+        self.last_seen = OrderedDict()
+        self._frame = None  # analyze_behavior 上一次传入的画面，用于判断是否进入新的检测帧
         self.prev_positions = {}
         self.static_duration = defaultdict(int)
         # 添加行为历史记录，用于平滑处理
         self.behavior_history = defaultdict(lambda: deque(maxlen=5))
+        # 历史记录中各行为的票数，随 behavior_history 增量维护
+        self.behavior_votes = defaultdict(lambda: [0] * len(BEHAVIOR_CODES))
         # 增加状态切换的阈值
-        self.state_change_threshold = 3
+        self.state_change_threshold = self.thresholds['state_change_threshold']
+
+    def get_state(self):
+        """可序列化的分析状态（位置、静止计数、行为历史），用于任务中断后继续处理"""
+        return {
+            'prev_positions': dict(self.prev_positions),
+            'static_duration': dict(self.static_duration),
+            'behavior_history': {cat_id: list(history) for cat_id, history in self.behavior_history.items()},
+            'behavior_votes': {cat_id: list(votes) for cat_id, votes in self.behavior_votes.items()},
+            'camera_motion': self.camera_motion.get_state() if self.camera_motion is not None else None,
+            'frame_count': self.frame_count,
+            'last_seen': list(self.last_seen.items()),
+        }
+
+    def set_state(self, state):
+        self.prev_positions = dict(state['prev_positions'])
+        self.static_duration.clear()
+        self.static_duration.update(state['static_duration'])
+        self.behavior_history.clear()
+        for cat_id, history in state['behavior_history'].items():
+            self.behavior_history[cat_id].extend(history)
+        self.behavior_votes.clear()
+        for cat_id, votes in state['behavior_votes'].items():
+            self.behavior_votes[cat_id] = list(votes)
+        if self.camera_motion is not None and state.get('camera_motion') is not None:
+            self.camera_motion.set_state(state['camera_motion'])
+        self.frame_count = state.get('frame_count', 0)
+        # 旧检查点没有 last_seen：已知的猫都按刚出现过处理
+        self.last_seen = OrderedDict(state.get('last_seen') or [(cat_id, self.frame_count)
+                                                                  for cat_id in self.prev_positions])
+
+    def forget(self, cat_id):
+        """丢弃一只猫的位置和行为历史（长时间运行时猫离开画面后调用，避免状态无限增长）"""
+        self.prev_positions.pop(cat_id, None)
+        self.static_duration.pop(cat_id, None)
+        self.behavior_history.pop(cat_id, None)
+        self.behavior_votes.pop(cat_id, None)
+        self.last_seen.pop(cat_id, None)
+
+    def evict(self):
+        """丢弃超过 max_age 个检测帧没有出现的猫的状态，返回被丢弃的 cat_id 列表"""
+        evicted = []
+        while self.max_age and self.last_seen:
+            cat_id, seen = next(iter(self.last_seen.items()))
+            if self.frame_count - seen <= self.max_age:
+                break
+            self.forget(cat_id)
+            evicted.append(cat_id)
+        return evicted
+
+    def _begin_frame(self, frame=None, cat_id=None):
+        """计入一个检测帧并丢弃过期的猫的状态，analyze_behavior 和 analyze_batch 共用
+
+        analyze_batch（cat_id 为 None）每次调用都是新的一帧。analyze_behavior 逐只猫调用：
+        传入画面时画面对象变化才是新的一帧；不传画面时，本帧已经出现过的猫再次出现才是新的一帧。
+        """
+        if cat_id is not None:
+            if frame is not None:
+                if frame is self._frame:
+                    return
+            elif self.last_seen.get(cat_id) != self.frame_count:
+                return
+        self._frame = frame
+        self.frame_count += 1
+        self.evict()
+
+    def _mark_seen(self, cat_id):
+        self.last_seen[cat_id] = self.frame_count
+        self.last_seen.move_to_end(cat_id)
+
+    def _smooth(self, cat_id, code):
+        """把当前帧的行为计入历史，返回平滑后的行为编码
+
+        与对 behavior_history 做 Counter().most_common(1) 等价：票数并列时取历史中最早出现的行为，
+        但只增量维护票数，不在每次调用时重建 Counter。
+        """
+        history = self.behavior_history[cat_id]
+        votes = self.behavior_votes[cat_id]
+        if len(history) == history.maxlen:
+            votes[BEHAVIOR_INDEX[history[0]]] -= 1
+        history.append(BEHAVIOR_CODES[code])
+        votes[code] += 1
+
+        # 只有当新状态在历史记录中占主导地位时才改变状态；
+        # 历史不足阈值长度时，保持当前状态
+        if len(history) < self.state_change_threshold:
+            return code
+        best = max(votes)
+        if votes.count(best) == 1:
+            return votes.index(best)
+        for behavior in history:
+            if votes[BEHAVIOR_INDEX[behavior]] == best:
+                return BEHAVIOR_INDEX[behavior]
 
     def analyze_behavior(self, cat_id, contour, position, frame):
         """分析猫的行为"""
+        self._begin_frame(frame, cat_id)
         try:
-            # 基本特征
-            (x, y, w, h) = cv2.boundingRect(contour)
-            aspect_ratio = float(w) / h
-            area = cv2.contourArea(contour)
-            
-            # 形状特征
-            perimeter = cv2.arcLength(contour, True)
-            compactness = 4 * np.pi * area / (perimeter * perimeter) if perimeter > 0 else 0
-            
-            # 计算轮廓的主要特征
-            if len(contour) >= 5:
-                hull = cv2.convexHull(contour)
-                hull_area = cv2.contourArea(hull)
-                solidity = float(area) / hull_area if hull_area > 0 else 0
-                
-                # 分析轮廓的形状特征
-                _, (width, height), _ = cv2.fitEllipse(contour)
-                shape_ratio = min(width, height) / max(width, height)
-            else:
-                solidity = 1
-                shape_ratio = 1
-            
+            aspect_ratio, area, compactness, solidity, shape_ratio = contour_features(contour)
+
             # 计算运动特征，增加容忍度
             is_moving = False
             if cat_id in self.prev_positions:
                 prev_pos = self.prev_positions[cat_id]
                 movement = np.sqrt((position[0] - prev_pos[0])**2 + 
                                  (position[1] - prev_pos[1])**2)
-                is_moving = movement > 15  # 增加移动阈值，减少抖动影响
+                is_moving = movement > self.thresholds['movement']
             
             self.prev_positions[cat_id] = position
+            self._mark_seen(cat_id)
             
-            # 行为判断逻辑
-            current_behavior = None
-            if is_moving and aspect_ratio > 1.2:
-                current_behavior = CatBehavior.WALKING
-            else:
-                # 静止状态的判断
-                if solidity > 0.75 and shape_ratio > 0.6:
-                    # 形状紧凑且较为圆润，可能是蜷缩/休息状态
-                    current_behavior = CatBehavior.RESTING
-                elif aspect_ratio < 0.7:
-                    # 明显的竖直特征才判断为站立
-                    current_behavior = CatBehavior.STANDING
-                else:
-                    current_behavior = CatBehavior.RESTING
-            
-            # 使用历史记录来平滑行为判断
-            self.behavior_history[cat_id].append(current_behavior)
-            
-            # 只有当新状态在历史记录中占主导地位时才改变状态
-            behavior_counts = Counter(self.behavior_history[cat_id])
-            most_common_behavior = behavior_counts.most_common(1)[0][0]
-            if behavior_counts[most_common_behavior] >= self.state_change_threshold:
-                return most_common_behavior
-            
-            # 如果没有明显的主导状态，保持当前状态
-            return current_behavior if len(self.behavior_history[cat_id]) < self.state_change_threshold else most_common_behavior
+            # 行为判断逻辑，并使用历史记录来平滑行为判断
+            current = classify_behavior(is_moving, aspect_ratio, solidity, shape_ratio, self.thresholds)
+            return BEHAVIOR_CODES[self._smooth(cat_id, current)]
             
         except Exception as e:
             print(f"Error in analyze_behavior: {str(e)}")
             return CatBehavior.UNKNOWN
 
-    def detect_background_motion(self, frame):
-        if self.last_frame is None:
-            self.last_frame = frame.copy()
-            return np.zeros(2)
-        
-        # 使用光流法检测背景运动
-        prev_gray = cv2.cvtColor(self.last_frame, cv2.COLOR_BGR2GRAY)
-        curr_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # 计算整体光流
-        flow = cv2.calcOpticalFlowFarneback(prev_gray, curr_gray, None, 
-                                          0.5, 3, 15, 3, 5, 1.2, 0)
-        
-        # 计算平均运动向量
-        avg_motion = np.mean(flow, axis=(0,1))
-        
-        self.last_frame = frame.copy()
-        return avg_motion
-        
-    def calculate_relative_speed(self, positions, background_motion):
-        if len(positions) < 2:
-            return 0
-        
-        # 计算猫咪的实际运动
-        p1, p2 = positions[-2], positions[-1]
-        cat_motion = np.array([p2[0] - p1[0], p2[1] - p1[1]])
-        
-        # 减去背景运动的影响
-        relative_motion = cat_motion - background_motion
-        
-        # 计算相对速度并添加阈值过滤
-        speed = np.sqrt(np.sum(relative_motion**2))
-        
-        # 添加噪声过滤
-        if speed < 0.1:  # 极小的移动视为静止
-            return 0
-        return speed
+    def analyze_batch(self, cat_ids, contours, positions):
+        """批量分析一组检测（通常是同一帧中的所有猫）
+
+        与按顺序对每一行调用 analyze_behavior 的结果完全一致（包括重复的 cat_id）。
+        返回 (features, codes)：
+        - features: float64 数组 (n, len(FEATURE_NAMES))，无法计算的特征为 NaN
+        - codes: int 数组 (n,)，平滑后的行为编码，对应 BEHAVIOR_CODES
+        """
+        n = len(cat_ids)
+        features = np.full((n, len(FEATURE_NAMES)), np.nan)
+        codes = np.full(n, UNKNOWN, dtype=np.int64)
+        self._begin_frame()
+        if n == 0:
+            return features, codes
+
+        # 轮廓特征依赖 OpenCV，只能逐个计算；失败的行与 analyze_behavior 一样记为 UNKNOWN 且不更新状态
+        rows, valid = [], []
+        for i, contour in enumerate(contours):
+            try:
+                rows.append(contour_features(contour))
+                valid.append(i)
+            except Exception as e:
+                print(f"Error in analyze_behavior: {str(e)}")
+        if not valid:
+            return features, codes
+        features[valid, :5] = rows
+
+        # 上一次出现的位置：按行顺序解析，重复的 cat_id 使用前一行的位置
+        prev = np.full((n, 2), np.nan)
+        for i in valid:
+            cat_id = cat_ids[i]
+            if cat_id in self.prev_positions:
+                prev[i] = self.prev_positions[cat_id]
+            self.prev_positions[cat_id] = positions[i]
+            self._mark_seen(cat_id)
+
+        delta = np.asarray(positions, dtype=np.float64).reshape(n, 2) - prev
+        features[:, 5] = np.sqrt(delta[:, 0]**2 + delta[:, 1]**2)
+        current = classify_behaviors(features[:, 5] > self.thresholds['movement'],
+                                     features[:, 0], features[:, 3], features[:, 4], self.thresholds).tolist()
+
+        # 平滑依赖每只猫的历史，按顺序增量更新
+        for i in valid:
+            codes[i] = self._smooth(cat_ids[i], current[i])
+        return features, codes
+
+    def analyze_frames(self, frames):
+        """离线批量分析连续多帧，frames 为 [(cat_ids, contours, positions), ...]
+
+        整个区块展开后一次性计算，返回按行对齐的 (frame_index, features, codes)。
+        整个区块只计一个检测帧（见 max_age）。
+        """
+        frame_index, cat_ids, contours, positions = [], [], [], []
+        for index, (ids, cs, ps) in enumerate(frames):
+            frame_index.extend([index] * len(ids))
+            cat_ids.extend(ids)
+            contours.extend(cs)
+            positions.extend(ps)
+        features, codes = self.analyze_batch(cat_ids, contours, positions)
+        return np.array(frame_index, dtype=np.int64), features, codes
+
+    def detect_background_motion(self, frame, boxes=()):
+        """估计这一帧相对上一个检测帧的摄像机运动并补偿记录的位置，返回 2x3 变换矩阵
+
+        每个检测帧在行为分析之前调用一次，所有猫共用；boxes 为这一帧猫的框，不参与估计。
+        没有估计器、无法估计或机位静止时返回 None。
+        """
+        if self.camera_motion is None:
+            return None
+        motion = self.camera_motion.estimate(frame, boxes)
+        self.compensate(motion)
+        return motion
+
+    def compensate(self, motion):
+        """把记录的上一次位置变换到当前帧坐标，之后的位移即为猫相对背景的运动"""
+        if motion is None or not self.prev_positions:
+            return
+        cat_ids = list(self.prev_positions)
+        points = np.array([self.prev_positions[cat_id] for cat_id in cat_ids], dtype=np.float64)
+        warped = points @ np.asarray(motion)[:, :2].T + np.asarray(motion)[:, 2]
+        for cat_id, (x, y) in zip(cat_ids, warped.tolist()):
+            self.prev_positions[cat_id] = (x, y)
 
     def analyze_shape(self, contour):
         area = cv2.contourArea(contour)
@@ -146,13 +328,6 @@ class CatBehaviorAnalyzer:
             return CatBehavior.WALKING
         return CatBehavior.SITTING  # 默认返回坐着，而不是None
 
-    def check_interaction(self, cat1_pos, cat2_pos, threshold=100):
-        if cat1_pos is None or cat2_pos is None:
-            return False
-        distance = np.sqrt((cat1_pos[0] - cat2_pos[0])**2 + 
-                         (cat1_pos[1] - cat2_pos[1])**2)
-        return distance < threshold
-
     def analyze_appearance(self, appearance, cat_id):
         """分析猫咪的外观特征来辅助判断姿态"""
         if appearance is None:
@@ -1,158 +1,610 @@
+import copy
 import cv2
-from ultralytics import YOLO
+import time
 import numpy as np
-from .cat_behavior import CatBehaviorAnalyzer, CatBehavior
+from .cat_behavior import CatBehaviorAnalyzer, CatBehavior, BEHAVIOR_CODES
+from . import camera_motion, checkpoint, detection_cache, model_registry
+from .contours import ContourExtractor
+from .ingest import GrowingFileCapture
+from .pipeline import FramePipeline, format_stats
+from . import profiling
+from .profiling import NULL_PROFILER
+from .sampling import AdaptiveSampler, interpolate_detections
 from django.conf import settings
+from django.db import connections
 import os
-from collections import defaultdict
+from collections import deque
 
-def process_video(video_path, analysis_id):
-    """处理视频文件并返回分析结果"""
+# 调整分辨率（提高到0.5）
+RESIZE_FACTOR = 0.5
+
+# 渲染模式：
+#   preview  —— 绘制并编码标注视频，同时打开预览窗口（需要图形界面，本地调试用）
+#   headless —— 绘制并编码标注视频，不打开任何窗口（worker 默认）
+#   analysis —— 只做分析和结果落库，不绘制也不编码视频
+RENDER_MODES = ('preview', 'headless', 'analysis')
+
+
+def get_render_mode(render_mode=None):
+    if render_mode is None:
+        render_mode = getattr(settings, 'CATTAX_RENDER_MODE', 'headless')
+    if render_mode not in RENDER_MODES:
+        raise ValueError(f"Unknown render mode: {render_mode}, expected one of {RENDER_MODES}")
+    return render_mode
+
+
+def open_video(video_path, growing=False):
+    """打开视频，返回 (cap, 处理分辨率 (w, h), fps, 总帧数)
+
+    growing=True 表示文件仍在上传中，读到末尾时等待后续数据（见 ingest.GrowingFileCapture），
+    此时总帧数只是按已上传部分得到的值，可能偏小或为 0。
+    """
+    if growing:
+        cap = GrowingFileCapture(video_path, stall_timeout=getattr(settings, 'CATTAX_UPLOAD_STALL_SECONDS', 600))
+    else:
+        cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise Exception(f"Could not open video file: {video_path}")
+
+    # 获取视频属性
+    original_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    original_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = int(cap.get(cv2.CAP_PROP_FPS))
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    w, h = int(original_w * RESIZE_FACTOR), int(original_h * RESIZE_FACTOR)
+    return cap, (w, h), fps, total_frames
+
+
+# 前两只猫沿用原来的颜色，其余按色相的黄金分割依次取色，相邻编号的颜色差别明显
+CAT_COLORS = {1: (0, 255, 0), 2: (255, 0, 0)}
+
+
+def cat_color(cat_id):
+    """猫咪编号对应的绘制颜色（BGR）"""
+    color = CAT_COLORS.get(cat_id)
+    if color is None:
+        hue = int(cat_id) * 0.618033988749895 % 1.0
+        hsv = np.uint8([[[round(hue * 179), 220, 255]]])
+        color = CAT_COLORS[cat_id] = tuple(int(v) for v in cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)[0, 0])
+    return color
+
+
+def draw_detection(frame, contour, cat_id, label, position, color=None):
+    """在帧上绘制一只猫的轮廓和行为标签"""
+    if color is None:
+        color = cat_color(cat_id)
+    cx, cy = position
+    cv2.drawContours(frame, [contour], -1, color, 2)
+    cv2.putText(frame, f"Cat {cat_id}: {label}", (cx, cy - 10), 
+              cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+
+
+def default_cat_id(track_id):
+    """把追踪 ID 映射为显示用的猫咪编号（每条轨迹一只猫，编号即追踪 ID）"""
+    return track_id
+
+
+class FrameProcessor:
+    """逐帧分析与标注：轮廓提取、行为分析、抽帧插值、绘制并写入输出视频
+
+    作为 FramePipeline 的 consume 回调使用（annotate_frame），每输出一帧调用一次
+    on_frame(frame_index, frame_results, detections)。frame_index 从 first_frame 开始计数，
+    小于 emit_from 的帧（例如分段处理时的重叠预热区间）只参与分析，不写入输出视频。
+    draw=False 时不在帧上绘制（只做分析），preview=True 时在预览窗口显示检测帧。
+    profiler（StageProfiler）记录轮廓、行为分析、绘制和编码的耗时。
+    detections（detection_cache.DetectionWriter）记录每个检测帧的原始追踪结果，用于之后重新分析。
+    """
+
+    def __init__(self, frame_size, behavior_analyzer, sampler, out=None, on_frame=None,
+                 first_frame=0, emit_from=0, preview=False, keep_track_ids=False, draw=True, profiler=None,
+                 detections=None):
+        self.behavior_analyzer = behavior_analyzer
+        self.profiler = profiler or NULL_PROFILER
+        self.detections = detections
+        self.sampler = sampler
+        self.out = out
+        self.on_frame = on_frame
+        self.emit_from = emit_from
+        self.preview = preview
+        self.draw = draw
+        self.keep_track_ids = keep_track_ids
+        self.contour_extractor = ContourExtractor(frame_size)
+        self.frame_index = first_frame
+        self.frame_count = 0
+        self.key_detections = []   # 上一个检测帧的结果
+        self.pending_frames = []   # 等待插值输出的跳过帧
+
+    def analyze_keyframe(self, frame, result):
+        """对检测帧做轮廓和行为分析，返回检测结果列表"""
+        track_ids, masks = [], []
+        with self.profiler.stage('contour'):
+            if result.boxes.id is not None and result.masks is not None:
+                masks = result.masks.xy
+                track_ids = result.boxes.id.int().cpu().tolist()
+            tracks = self.extract_contours(track_ids, masks)
+
+        # 摄像机运动每个检测帧估计一次（屏蔽所有检测框），行为分析前补偿上一次的位置
+        motion = None
+        if self.behavior_analyzer.camera_motion is not None:
+            with self.profiler.stage('camera_motion'):
+                motion = self.behavior_analyzer.detect_background_motion(frame, result.boxes.xyxy.cpu().numpy())
+
+        if self.detections is not None:
+            # 没有检测到猫的检测帧也要记录，重新分析时据此区分检测帧和被跳过的帧
+            boxes = result.boxes.xyxy.cpu().numpy() if track_ids else []
+            confs = result.boxes.conf.cpu().numpy() if track_ids else []
+            self.detections.append(self.frame_index + len(self.pending_frames), track_ids, boxes, confs, masks,
+                                   motion)
+        return self.analyze_behaviors(*tracks)
+
+    def analyze_tracks(self, track_ids, masks, motion=None):
+        """由每只猫的 track ID 和分割多边形（例如检测旁路文件中的记录）做轮廓和行为分析
+
+        motion 为记录的摄像机运动，先据此补偿上一次的位置。
+        """
+        with self.profiler.stage('contour'):
+            tracks = self.extract_contours(track_ids, masks)
+        self.behavior_analyzer.compensate(motion)
+        return self.analyze_behaviors(*tracks)
+
+    def extract_contours(self, track_ids, masks):
+        """返回提取到轮廓的 (track_ids, cat_ids, contours, positions)"""
+        track_ids_kept, cat_ids, contours, positions = [], [], [], []
+        for mask, track_id in zip(masks, track_ids):
+            # 处理掩膜和轮廓（只在多边形外接矩形内栅格化）
+            extracted = self.contour_extractor.extract(mask)
+            if extracted is not None:
+                main_contour, (cx, cy), _ = extracted
+                track_ids_kept.append(track_id)
+                cat_ids.append(default_cat_id(track_id))
+                contours.append(main_contour)
+                positions.append((cx, cy))
+        return track_ids_kept, cat_ids, contours, positions
+
+    def analyze_behaviors(self, track_ids_kept, cat_ids, contours, positions):
+        # 同一帧所有猫一次性做行为分析
+        with self.profiler.stage('behavior'):
+            _, codes = self.behavior_analyzer.analyze_batch(cat_ids, contours, positions)
+        return [
+            {
+                'track_id': track_id,
+                'cat_id': cat_id,
+                'contour': contour,
+                'position': position,
+                'behavior': BEHAVIOR_CODES[code]
+            }
+            for track_id, cat_id, contour, position, code
+            in zip(track_ids_kept, cat_ids, contours, positions, codes)
+        ]
+
+    def emit_frame(self, frame, detections):
+        """绘制结果、写入输出视频并回调逐帧结果
+
+        detections 为 [(detection, (dx, dy)), ...]，插值帧按偏移平移上一检测帧的轮廓
+        """
+        frame_index = self.frame_index
+        frame_results = []
+        draw_start = time.perf_counter()
+        for det, (dx, dy) in detections:
+            cat_id = det['cat_id']
+            behavior = det['behavior'].value if det['behavior'] else 'Unknown'
+            cx, cy = det['position'][0] + dx, det['position'][1] + dy
+
+            if self.draw and frame_index >= self.emit_from:
+                # 在帧上绘制结果
+                contour = det['contour'] + np.array([dx, dy], dtype=det['contour'].dtype) if dx or dy else det['contour']
+                draw_detection(frame, contour, cat_id, behavior, (cx, cy))
+
+            # 保存结果
+            frame_result = {
+                'cat_id': cat_id,
+                'behavior': behavior,
+                'position': (cx, cy)
+            }
+            if self.keep_track_ids:
+                frame_result['track_id'] = det['track_id']
+            frame_results.append(frame_result)
+
+        if self.draw and frame_index >= self.emit_from:
+            self.profiler.observe('draw', time.perf_counter() - draw_start)
+
+        # 写入处理后的帧
+        if frame_index >= self.emit_from and self.out is not None:
+            with self.profiler.stage('encode'):
+                self.out.write(frame)
+        if self.on_frame is not None:
+            self.on_frame(frame_index, frame_results, detections)
+
+        self.frame_index += 1
+        self.frame_count += 1
+
+    def flush_pending(self, next_detections=None):
+        """输出等待中的跳过帧：位置在前后两个检测帧之间插值，行为沿用前一检测帧"""
+        steps = interpolate_detections(self.key_detections, next_detections, len(self.pending_frames))
+        for pending, detections in zip(self.pending_frames, steps):
+            self.emit_frame(pending, detections)
+        self.pending_frames.clear()
+
+    def annotate_frame(self, frame, result):
+        """标注编码阶段：行为分析、绘制、写入输出视频；返回 False 表示提前结束"""
+        if result is None:
+            # 被抽帧跳过的帧先缓存，等下一个检测帧到达后再插值输出
+            self.pending_frames.append(frame)
+            return True
+
+        detections = self.analyze_keyframe(frame, result)
+        self.sampler.update({det['cat_id']: det['behavior'] for det in detections})
+        self.emit_keyframe(frame, detections)
+
+        if self.preview:
+            cv2.imshow("Processing Preview", frame)
+            # 检查是否按下 'q' 键退出
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                return False
+        return True
+
+    def emit_keyframe(self, frame, detections):
+        """先插值输出之前等待的跳过帧，再输出检测帧"""
+        self.flush_pending(detections)
+        self.emit_frame(frame, [(det, (0, 0)) for det in detections])
+        self.key_detections = detections
+
+    def replay_keyframe(self, frame_index, track_ids, masks, motion=None):
+        """重新分析时用记录的检测帧代替模型输出（没有图像，需 draw=False），与上一个检测帧之间的帧按跳过帧插值"""
+        self.pending_frames.extend([None] * (frame_index - self.frame_index - len(self.pending_frames)))
+        self.emit_keyframe(None, self.analyze_tracks(track_ids, masks, motion))
+
+    def finish(self):
+        """视频末尾剩余的跳过帧保持最后一个检测帧的位置"""
+        self.flush_pending(None)
+
+
+def record_metrics(profiler, frames, status, seconds):
+    """把本次运行的阶段耗时累计到 worker 指标；开启 /metrics 时写到 CATTAX_METRICS_DIR 供主进程汇总"""
+    directory = getattr(settings, 'CATTAX_METRICS_DIR', None) if getattr(settings, 'CATTAX_METRICS_PORT', 0) else None
+    try:
+        profiling.registry.record_job(profiler, frames, status, seconds, directory)
+    except Exception as e:
+        print(f"Failed to record metrics: {str(e)}")
+
+
+def process_video(video_path, analysis_id, batch_size=None, queue_size=None, frame_skip=None,
+                  render_mode=None, growing=False, deadline=None, resume=False, profile=None):
+    """处理视频文件并返回分析结果
+
+    batch_size: 每次送入模型的帧数，默认取 settings.CATTAX_BATCH_SIZE
+    queue_size: 流水线各队列最多缓存的帧数，默认取 settings.CATTAX_QUEUE_SIZE
+    frame_skip: 自适应抽帧的最大步长，默认取 settings.CATTAX_MAX_FRAME_SKIP
+    render_mode: preview / headless / analysis，默认取 settings.CATTAX_RENDER_MODE
+    growing: 视频仍在上传中，边上传边处理
+    deadline: time.monotonic() 时间点，到达后在下一个检测帧处停下并保存检查点，
+              返回值中 preempted 为 True，由调用方重新排队
+    resume: 从检查点继续（追踪器、行为历史、已写结果和已输出的视频片段都沿用上一次）
+    profile: 代码级剖析模式 cprofile / sample，默认取 settings.CATTAX_PROFILER，结果路径记在 results['perf']
+
+    各阶段的逐帧耗时直方图汇总在 results['perf'] 中，同时累计到 worker 的 Prometheus 指标。
+
+    处理过程中每隔 CATTAX_CHECKPOINT_SECONDS 秒在检测帧处保存一次检查点，同时结束当前的
+    输出视频片段、开始写下一个。worker 崩溃或任务被杀掉后以 resume=True 重新运行，
+    从最近的检查点继续，之后写入的逐帧结果和行为区间会被丢弃重写。
+    """
+    from api import events
     from api.models import VideoAnalysis
+    from api.results_store import ResultsWriter
     print(f"Initializing video processing for ID: {analysis_id}")
+    job_start = time.perf_counter()
+
+    if batch_size is None:
+        batch_size = getattr(settings, 'CATTAX_BATCH_SIZE', 1)
+    batch_size = max(1, int(batch_size))
+    if queue_size is None:
+        queue_size = getattr(settings, 'CATTAX_QUEUE_SIZE', 16)
+    state = checkpoint.load(analysis_id) if resume else None
+    if state is not None:
+        render_mode = state['render_mode']
+        print(f"Resuming analysis {analysis_id} from frame {state['next_frame']}")
+    render_mode = get_render_mode(render_mode)
+    start_frame = state['next_frame'] if state else 0
+    parts = state['parts'] if state else []
+    checkpoint_seconds = getattr(settings, 'CATTAX_CHECKPOINT_SECONDS', 60)
+    if profile is None:
+        profile = getattr(settings, 'CATTAX_PROFILER', '')
+    # profiler 只记录本次运行（累计到 worker 指标），job_perf() 再加上之前各次运行的统计
+    profiler = profiling.StageProfiler(getattr(settings, 'CATTAX_PROFILE_STAGES', True))
+    code_profiler = None
+    profiles = state['profiles'] if state else []
+
+    def job_perf():
+        total = profiling.StageProfiler()
+        if state is not None:
+            total.set_state(state['perf'])
+        total.merge(profiler)
+        return total
+    status = 'failed'
+    pipeline_stats = None
+    processor = None
+    preempted = False
+    checkpoints = 0
+    cap = out = part = None
 
     try:
-        # 初始化模型和分析器
-        model = YOLO("yolo11x-seg.pt")
-        behavior_analyzer = CatBehaviorAnalyzer()
-        print("Models initialized successfully")
+        # 初始化模型和分析器：模型由 worker 进程缓存复用，追踪器每个任务独立
+        init_start = time.perf_counter()
+        cold_start = not model_registry.is_loaded()
+        detector = model_registry.get_detector()
+        detector.profiler = profiler
+        behavior_analyzer = CatBehaviorAnalyzer(camera_motion=camera_motion.from_settings())
+        model_init_s = round(time.perf_counter() - init_start, 3)
+        print(f"Models initialized successfully ({'cold' if cold_start else 'warm'} start, {model_init_s}s)")
 
         # 打开视频文件
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            raise Exception(f"Could not open video file: {video_path}")
-
-        # 获取视频属性
-        original_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        original_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        print(f"Video opened successfully. Total frames: {total_frames}")
-
-        # 调整分辨率（提高到0.5）
-        resize_factor = 0.5
-        w, h = int(original_w * resize_factor), int(original_h * resize_factor)
-        frame_skip = 1  # 处理每一帧
-
-        # 设置输出视频
+        cap, (w, h), fps, total_frames = open_video(video_path, growing=growing)
+        print(f"Video opened successfully. Total frames: {total_frames}{' (upload in progress)' if growing else ''}")
+        if start_frame:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+        # 自适应抽帧：休息且画面静止时最多每 frame_skip 帧检测一次，1 表示处理每一帧
+        if frame_skip is None:
+            frame_skip = getattr(settings, 'CATTAX_MAX_FRAME_SKIP', 1)
+        sampler = AdaptiveSampler(frame_skip, getattr(settings, 'CATTAX_SAMPLING_MOTION_THRESHOLD', 4.0),
+                                  feedback_lag=getattr(settings, 'CATTAX_SAMPLING_FEEDBACK_LAG', 1))
+
+        # 设置输出视频（analysis 模式不绘制也不编码）；每个检查点之间写一个片段，结束时拼接
         output_path = os.path.join(settings.MEDIA_ROOT, 'processed', f'output_{analysis_id}.mp4')
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        out = cv2.VideoWriter(output_path, 
-                            cv2.VideoWriter_fourcc(*'mp4v'), 
-                            fps, 
-                            (w, h))
-
-        # 初始化追踪历史和颜色映射
-        track_history = defaultdict(lambda: [])
-        cat_colors = {1: (0, 255, 0), 2: (255, 0, 0)}
-        frame_count = 0
-        results_data = []
+
+        def open_part():
+            path = checkpoint.part_path(analysis_id, len(parts))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            return path, cv2.VideoWriter(path, 
+                                         cv2.VideoWriter_fourcc(*'mp4v'), 
+                                         fps, 
+                                         (w, h))
+
+        if render_mode != 'analysis':
+            part, out = open_part()
+        part_start = start_frame
+
+        results_writer = ResultsWriter(analysis_id, total_frames, fps=fps, start_frame=start_frame,
+                                       profiler=profiler)
+        # 进度和逐帧行为通过事件频道节流推送，客户端无需轮询数据库
+        publisher = events.ProgressPublisher(analysis_id, total_frames)
+        # 检测帧的原始追踪结果写到旁路文件，调整行为阈值后可以不跑模型重新分析（reanalyze_video）
+        detections = None
+        if getattr(settings, 'CATTAX_STORE_DETECTIONS', True):
+            detections = detection_cache.DetectionWriter(detection_cache.detections_dir(analysis_id), (w, h), fps)
+            if state is None:
+                detections.reset()
+
+        def record_frame(frame_index, frame_results, detections):
+            # 逐帧结果追加写入，按帧数/时间间隔批量落库并更新进度；不在内存中累积，
+            # 调用方通过 VideoAnalysis.iter_frames() 读取
+            results_writer.append(frame_results)
+            publisher.frame(frame_index, frame_results)
+
+            if frame_index % 100 == 0:
+                print(f"Processing frame {frame_index}/{total_frames}")
+
+        processor = FrameProcessor((w, h), behavior_analyzer, sampler, out=out, on_frame=record_frame,
+                                   first_frame=start_frame, preview=render_mode == 'preview',
+                                   draw=render_mode != 'analysis', profiler=profiler, detections=detections)
+        if state is not None:
+            detector.set_state(state['detector'])
+            behavior_analyzer.set_state(state['behavior'])
+            sampler.set_state(state['sampler'])
+            results_writer.set_state(state['results'])
+            processor.key_detections = state['key_detections']
+            if detections is not None and state.get('detections') is not None:
+                detections.set_state(state['detections'])
+            elif detections is not None:
+                # 之前的运行没有记录检测结果，旁路文件不完整，这次也不再记录
+                detections.reset()
+                processor.detections = detections = None
+
+        track = sampler.wrap(detector.track)
+        inferred = start_frame
+        next_checkpoint = time.monotonic() + checkpoint_seconds if checkpoint_seconds else None
+        # 推理线程在检测帧处记下 (下一帧序号, 追踪器和抽帧状态)，标注线程输出到这一帧后保存检查点
+        snapshots = deque()
+
+        def infer(frames):
+            nonlocal preempted, inferred, next_checkpoint
+            results = track(frames)
+            inferred += len(frames)
+            # 只在以检测帧结尾的批次处停止或记录状态：之前的跳过帧都能插值输出，追踪器状态与已输出的帧一致
+            if results[-1] is not None:
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    preempted = True
+                elif next_checkpoint is not None and now >= next_checkpoint:
+                    snapshots.append((inferred, copy.deepcopy(detector.get_state()), sampler.get_state()))
+                    next_checkpoint = now + checkpoint_seconds
+            return results
+
+        def save_checkpoint(next_frame, detector_state, sampler_state):
+            checkpoint.save(analysis_id, {
+                'next_frame': next_frame,
+                'render_mode': render_mode,
+                'parts': parts,
+                'slices': slices,
+                'detector': detector_state,
+                'behavior': behavior_analyzer.get_state(),
+                # resting 和批次边界的反馈由标注线程根据检测帧的行为写入，取标注线程这一侧的值
+                'sampler': {**sampler_state, **sampler.feedback_state(sampler_state['batches'])},
+                'results': results_writer.get_state(),
+                'detections': detections.get_state() if detections is not None else None,
+                'key_detections': processor.key_detections,
+                'perf': job_perf().get_state(),
+                'profiles': profiles,
+            })
+
+        def consume(frame, result):
+            nonlocal part, out, part_start, parts, checkpoints
+            keep_going = processor.annotate_frame(frame, result)
+            if snapshots and processor.frame_index >= snapshots[0][0]:
+                next_frame, detector_state, sampler_state = snapshots.popleft()
+                if out is not None:
+                    out.release()
+                    parts = parts + [part]
+                    part, out = open_part()
+                    processor.out = out
+                    part_start = processor.frame_index
+                save_checkpoint(next_frame, detector_state, sampler_state)
+                checkpoints += 1
+            return keep_going
 
         # 创建预览窗口
-        cv2.namedWindow("Processing Preview", cv2.WINDOW_NORMAL)
-        cv2.resizeWindow("Processing Preview", 800, 600)
-
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            # 调整帧大小
-            frame = cv2.resize(frame, (w, h))
-
-            if frame_count % 100 == 0:
-                print(f"Processing frame {frame_count}/{total_frames}")
-
-            # 处理每一帧
-            results = model.track(frame, persist=True, tracker="bytetrack.yaml", 
-                                 classes=[15], conf=0.5)
-
-            frame_results = []
-            cat_positions = {}
-
-            if results[0].boxes.id is not None and results[0].masks is not None:
-                masks = results[0].masks.xy
-                track_ids = results[0].boxes.id.int().cpu().tolist()
-
-                for mask, track_id in zip(masks, track_ids):
-                    cat_id = min(track_id, 2)
-                    color = cat_colors[cat_id]
-
-                    # 处理掩膜和轮廓
-                    mask_img = np.zeros((h, w), dtype=np.uint8)
-                    cv2.fillPoly(mask_img, [np.array(mask, dtype=np.int32)], 255)
-
-                    contours, _ = cv2.findContours(mask_img, 
-                                                 cv2.RETR_EXTERNAL, 
-                                                 cv2.CHAIN_APPROX_SIMPLE)
-                    if contours:
-                        main_contour = max(contours, key=cv2.contourArea)
-                        M = cv2.moments(main_contour)
-                        if M["m00"] != 0:
-                            cx = int(M["m10"] / M["m00"])
-                            cy = int(M["m01"] / M["m00"])
-                            cat_positions[cat_id] = (cx, cy)
-
-                            behavior = behavior_analyzer.analyze_behavior(
-                                cat_id,
-                                main_contour,
-                                (cx, cy),
-                                frame
-                            )
-
-                            # 在帧上绘制结果
-                            cv2.drawContours(frame, [main_contour], -1, color, 2)
-                            label = f"Cat {cat_id}: {behavior.value if behavior else 'Unknown'}"
-                            cv2.putText(frame, label, (cx, cy - 10), 
-                                      cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-
-                            # 保存结果
-                            frame_results.append({
-                                'cat_id': cat_id,
-                                'behavior': behavior.value if behavior else 'Unknown',
-                                'position': (cx, cy)
-                            })
-
-            # 写入处理后的帧
-            out.write(frame)
-            results_data.append(frame_results)
-
-            # 显示预览（添加进度条）
-            progress = (frame_count / total_frames) * 100
-            
-            # 更新进度 - 确保最后一帧时设置为 100%
-            if frame_count == total_frames - 1:
-                progress = 100.0
+        if render_mode == 'preview':
+            cv2.namedWindow("Processing Preview", cv2.WINDOW_NORMAL)
+            cv2.resizeWindow("Processing Preview", 800, 600)
 
-            VideoAnalysis.objects.filter(id=analysis_id).update(
-                progress=progress,
-                results={'frames': results_data}
-            )
+        # 解码 / 推理 / 标注编码三阶段并行，队列有界以限制内存；
+        # 标注编码线程有自己的数据库连接，退出时关闭，同时让等待抽帧反馈的推理线程继续
+        def consumer_exit():
+            sampler.close()
+            connections.close_all()
 
-            # 检查是否按下 'q' 键退出
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+        slices = (state['slices'] if state else 0) + 1
+        if profile:
+            code_profiler = profiling.CodeProfiler(profile, getattr(settings, 'CATTAX_PROFILE_SAMPLE_INTERVAL', 0.005))
+        pipeline = FramePipeline(cap, (w, h), infer, consume,
+                                 batch_size=batch_size, queue_size=queue_size,
+                                 on_consumer_exit=consumer_exit, stop_when=lambda: preempted,
+                                 profiler=profiler, code_profiler=code_profiler)
+        if code_profiler is not None:
+            code_profiler.start()
+        try:
+            pipeline_stats = pipeline.run()
+        finally:
+            if code_profiler is not None:
+                code_profiler.stop()
+        if code_profiler is not None:
+            profile_path = code_profiler.dump(
+                os.path.join(settings.MEDIA_ROOT, 'profiles', f'analysis_{analysis_id}_run{slices}'))
+            if profile_path:
+                profiles = profiles + [os.path.relpath(profile_path, settings.MEDIA_ROOT)]
+                print(f"Profile written to {profile_path}")
+        if not preempted:
+            processor.finish()
+        publisher.flush()
+        print(format_stats(pipeline_stats))
+
+        if out is not None:
+            out.release()
+            # 当前片段没有输出任何帧（例如恰好在视频末尾被抢占）时丢弃
+            if processor.frame_index > part_start or not parts:
+                parts = parts + [part]
+            else:
+                os.remove(part)
 
-            frame_count += 1
+        if preempted:
+            status = 'preempted'
+            save_checkpoint(processor.frame_index, detector.get_state(), sampler.get_state())
+            print(f"Analysis {analysis_id} preempted at frame {processor.frame_index}/{total_frames}")
+        else:
+            if len(parts) == 1:
+                os.replace(parts[0], output_path)
+            elif parts:
+                from .chunking import concat_segments
+                concat_segments(parts, output_path, fps, (w, h))
+                for path in parts:
+                    os.remove(path)
+
+            # 最终汇总只在结束时写入一次
+            results_writer.close()
+            results_writer.finish(
+                render_mode=render_mode,
+                pipeline=pipeline_stats,
+                sampling=sampler.stats(),
+                slices=slices,
+                checkpoints=checkpoints,
+                perf={**job_perf().summary(), 'profiles': profiles},
+                model={'cold_start': cold_start, 'init_s': model_init_s, **model_registry.load_stats()},
+                detections=detections.close(processor.frame_index) if detections is not None else None,
+                roi=detector.roi.stats() if detector.roi is not None else None
+            )
+            checkpoint.clear(analysis_id)
+            status = 'completed'
+
+            # 只有正常处理完才标记完成；出错时由调用方标记失败，检查点保留用于重试
+            VideoAnalysis.objects.filter(id=analysis_id).update(
+                status='completed',
+                progress=100.0,
+                processed_video=f'processed/output_{analysis_id}.mp4' if out is not None else None
+            )
+            events.publish_status(analysis_id, 'completed', progress=100.0)
 
     except Exception as e:
         print(f"Error in process_video: {str(e)}")
         raise
 
     finally:
-        cap.release()
-        out.release()
-        cv2.destroyAllWindows()
-
-        # 确保在处理完成时设置 100% 进度
-        VideoAnalysis.objects.filter(id=analysis_id).update(
-            status='completed',
-            progress=100.0,
-            processed_video=f'processed/output_{analysis_id}.mp4'
-        )
+        if cap is not None:
+            cap.release()
+        if out is not None:
+            out.release()
+        if render_mode == 'preview':
+            cv2.destroyAllWindows()
+        record_metrics(profiler, processor.frame_count if processor else 0, status,
+                       time.perf_counter() - job_start)
 
     return {
+        'preempted': preempted,
+        'next_frame': processor.frame_index if processor else start_frame,
         'total_frames': total_frames,
-        'processed_frames': frame_count,
-        'results': results_data
-    }
\ No newline at end of file
+        'processed_frames': processor.frame_count if processor else 0,
+        'render_mode': render_mode,
+        'pipeline': pipeline_stats,
+        'sampling': sampler.stats()
+    }
+
+def reanalyze_video(analysis_id, thresholds=None):
+    """用检测旁路文件重新做行为分析，不加载模型也不解码视频（调整行为阈值后使用）
+
+    thresholds 覆盖默认的行为阈值（见 cat_behavior.behavior_thresholds）。按记录的检测帧重放轮廓提取和
+    行为分析，检测帧之间被抽帧跳过的帧与原来一样插值。逐帧结果、行为区间和 results 中的汇总被替换，
+    其余字段（流水线统计、模型信息等）保留；输出视频不重新绘制，上面的行为标签仍是原来的。
+    """
+    from api import events
+    from api.models import VideoAnalysis
+    from api.results_store import ResultsWriter
+
+    directory = detection_cache.detections_dir(analysis_id)
+    meta = detection_cache.load_meta(directory)
+    if meta is None:
+        raise Exception(f"No detection cache for analysis {analysis_id}")
+    print(f"Reanalyzing {analysis_id} from {meta['keyframes']} cached keyframes")
+    start = time.perf_counter()
+    previous = VideoAnalysis.objects.values_list('results', flat=True).get(pk=analysis_id) or {}
+    VideoAnalysis.objects.filter(id=analysis_id).update(status='processing', progress=0.0)
+
+    profiler = profiling.StageProfiler(getattr(settings, 'CATTAX_PROFILE_STAGES', True))
+    behavior_analyzer = CatBehaviorAnalyzer(thresholds)
+    results_writer = ResultsWriter(analysis_id, meta['total_frames'], fps=meta['fps'], profiler=profiler)
+    results_writer.clear()
+    processor = FrameProcessor(meta['frame_size'], behavior_analyzer, None, draw=False, profiler=profiler,
+                               on_frame=lambda frame_index, frame_results, detections:
+                               results_writer.append(frame_results))
+    for frame_index, track_ids, _, _, masks, motion in detection_cache.iter_keyframes(directory, meta):
+        processor.replay_keyframe(frame_index, track_ids, masks, motion)
+    # 视频末尾被跳过的帧
+    processor.pending_frames.extend([None] * (meta['total_frames'] - processor.frame_index
+                                              - len(processor.pending_frames)))
+    processor.finish()
+    results_writer.close()
+    elapsed = time.perf_counter() - start
+
+    replaced = ('summary', 'frames_stored', 'fps', 'timeline', 'behavior_thresholds', 'reanalysis')
+    results = results_writer.finish(
+        **{key: value for key, value in previous.items() if key not in replaced},
+        behavior_thresholds=behavior_analyzer.thresholds,
+        reanalysis={
+            'seconds': round(elapsed, 3),
+            'frames_per_second': round(processor.frame_count / elapsed, 1) if elapsed else None,
+            'keyframes': meta['keyframes'],
+            'perf': profiler.summary(),
+        }
+    )
+    VideoAnalysis.objects.filter(id=analysis_id).update(status='completed', progress=100.0)
+    events.publish_status(analysis_id, 'completed', progress=100.0)
+    print(f"Reanalyzed {analysis_id}: {processor.frame_count} frames in {elapsed:.2f}s")
+    return results
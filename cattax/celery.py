@@ -1,6 +1,7 @@
 from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
+from celery.signals import worker_process_init, worker_ready
 
 # 设置Django环境
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cattax.settings')
@@ -24,11 +25,54 @@ app.conf.update(
     timezone='Asia/Shanghai',
     enable_utc=True,
     task_track_started=True,
-    task_time_limit=30 * 60,
+    # 不设全局硬超时（task_time_limit）：实时流任务要一直运行，Celery 无法在单个任务上取消全局超时，
+    # 视频任务的 30 分钟硬超时在 api/tasks.py 中逐个声明
     worker_prefetch_multiplier=1,
     task_always_eager=False,  # 确保任务在 worker 中执行
 )
 
 @app.task(bind=True)
 def debug_task(self):
-    print(f'Request: {self.request!r}') 
\ No newline at end of file
+    print(f'Request: {self.request!r}')
+
+@worker_process_init.connect
+def preload_model(**kwargs):
+    """worker 子进程启动时预先加载并预热模型，后续任务直接复用"""
+    from django.conf import settings
+    if not getattr(settings, 'CATTAX_PRELOAD_MODEL', True):
+        return
+    from cattax.model_registry import get_model
+    try:
+        get_model()
+    except Exception as e:
+        # 预加载失败不影响 worker 启动，首个任务会再尝试懒加载
+        print(f"Model preload failed: {str(e)}")
+
+@worker_ready.connect
+def recover_streams(**kwargs):
+    """worker 启动时把上一次运行中被杀掉、心跳已停止的实时流标记为失败"""
+    from api import scheduler
+    try:
+        scheduler.recover_streams()
+    except Exception as e:
+        print(f"Stream recovery failed: {str(e)}")
+
+@worker_ready.connect
+def start_metrics_server(**kwargs):
+    """worker 主进程提供 Prometheus /metrics，汇总各子进程写到 CATTAX_METRICS_DIR 的指标"""
+    from django.conf import settings
+    port = getattr(settings, 'CATTAX_METRICS_PORT', 0)
+    if not port:
+        return
+    import shutil
+    from cattax.profiling import serve_metrics
+    directory = settings.CATTAX_METRICS_DIR
+    try:
+        serve_metrics(port, directory)
+    except OSError as e:
+        # 同一台机器上的多个 worker 只有第一个能占用端口，其余 worker 的子进程照常写文件，由它一起汇总
+        print(f"Metrics server failed to start on port {port}: {str(e)}")
+        return
+    # 计数器随 worker 重启归零，清掉上一次运行留下的文件
+    shutil.rmtree(directory, ignore_errors=True)
+    print(f"Serving worker metrics on :{port}/metrics")
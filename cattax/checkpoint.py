@@ -0,0 +1,42 @@
+import os
+import pickle
+
+from django.conf import settings
+
+
+def checkpoint_path(analysis_id):
+    return os.path.join(settings.MEDIA_ROOT, 'checkpoints', f'{analysis_id}.pkl')
+
+
+def part_path(analysis_id, index):
+    """分片处理时每一片输出的视频片段，全部完成后拼接成 processed/output_<id>.mp4"""
+    return os.path.join(settings.MEDIA_ROOT, 'processed', f'output_{analysis_id}_part{index:03d}.mp4')
+
+
+def save(analysis_id, state):
+    """原子地写入处理状态（先写临时文件再改名），中途崩溃不会留下半个检查点"""
+    path = checkpoint_path(analysis_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def exists(analysis_id):
+    return os.path.exists(checkpoint_path(analysis_id))
+
+
+def load(analysis_id):
+    """返回保存的处理状态，没有检查点时返回 None"""
+    path = checkpoint_path(analysis_id)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def clear(analysis_id):
+    path = checkpoint_path(analysis_id)
+    if os.path.exists(path):
+        os.remove(path)
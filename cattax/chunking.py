@@ -0,0 +1,346 @@
+import json
+import math
+import os
+import shutil
+import subprocess
+from collections import Counter
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+from . import camera_motion, detection_cache, model_registry
+from .cat_behavior import CatBehaviorAnalyzer
+from .cat_capture import FrameProcessor, open_video, draw_detection, default_cat_id, get_render_mode
+from .pipeline import FramePipeline
+from .sampling import AdaptiveSampler
+
+
+class FrameRangeCapture:
+    """只读取 count 帧的 VideoCapture 包装，用于分段处理"""
+
+    def __init__(self, cap, count):
+        self.cap = cap
+        self.remaining = count
+
+    def read(self):
+        if self.remaining <= 0:
+            return False, None
+        self.remaining -= 1
+        return self.cap.read()
+
+
+def plan_chunks(total_frames, chunk_frames, overlap):
+    """把视频切成约 chunk_frames 帧一段的区间
+
+    每段输出 [start, end) 的结果，但从 start - lead_in 开始解码和追踪，
+    lead_in 区间与上一段末尾重叠，用于预热追踪器/行为历史并对齐 track ID。
+    """
+    chunk_frames = max(1, int(chunk_frames))
+    count = max(1, math.ceil(total_frames / chunk_frames))
+    size = math.ceil(total_frames / count)
+    chunks = []
+    for index in range(count):
+        start = index * size
+        end = min(total_frames, start + size)
+        if start >= end:
+            break
+        chunks.append({'index': index, 'start': start, 'end': end, 'lead_in': min(overlap, start)})
+    return chunks
+
+
+def chunk_dir(analysis_id):
+    path = os.path.join(settings.MEDIA_ROOT, 'chunks', str(analysis_id))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def save_contours(path, frames_contours):
+    """把每帧每只猫的轮廓压成三个数组保存：帧内检测数、每个轮廓的点数、所有点"""
+    per_frame = np.array([len(contours) for contours in frames_contours], dtype=np.int32)
+    flat = [contour.reshape(-1, 2) for contours in frames_contours for contour in contours]
+    lengths = np.array([len(c) for c in flat], dtype=np.int32)
+    points = np.concatenate(flat).astype(np.int32) if flat else np.zeros((0, 2), dtype=np.int32)
+    np.savez_compressed(path, per_frame=per_frame, lengths=lengths, points=points)
+
+
+def load_contours(path):
+    data = np.load(path)
+    contours = np.split(data['points'], np.cumsum(data['lengths'])[:-1]) if len(data['lengths']) else []
+    frames, offset = [], 0
+    for count in data['per_frame']:
+        frames.append([c.reshape(-1, 1, 2) for c in contours[offset:offset + count]])
+        offset += count
+    return frames
+
+
+def process_chunk(video_path, analysis_id, chunk, frame_skip=None, batch_size=None, render_mode=None):
+    """处理一个区间：写出带标注的分段视频、逐帧结果和轮廓，返回这些文件的路径
+
+    这里不写数据库，结果在 merge_chunks 中统一合并。分段总是无窗口运行，
+    analysis 模式下不写分段视频和轮廓（segment_path / contours_path 为 None）。
+    检测帧的原始追踪结果写到该段自己的旁路文件目录（detections_path），合并时按全局 track ID 拼接。
+    """
+    render = get_render_mode(render_mode) != 'analysis'
+    start, end, lead_in = chunk['start'], chunk['end'], chunk['lead_in']
+    directory = chunk_dir(analysis_id)
+    name = f"chunk_{chunk['index']:04d}"
+    segment_path = os.path.join(directory, f'{name}.mp4') if render else None
+    result_path = os.path.join(directory, f'{name}.json')
+    contours_path = os.path.join(directory, f'{name}.npz') if render else None
+
+    cap, (w, h), fps, _ = open_video(video_path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start - lead_in)
+    out = cv2.VideoWriter(segment_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (w, h)) if render else None
+
+    if frame_skip is None:
+        frame_skip = getattr(settings, 'CATTAX_MAX_FRAME_SKIP', 1)
+    if batch_size is None:
+        batch_size = getattr(settings, 'CATTAX_BATCH_SIZE', 1)
+    detector = model_registry.get_detector()
+    sampler = AdaptiveSampler(frame_skip, getattr(settings, 'CATTAX_SAMPLING_MOTION_THRESHOLD', 4.0),
+                              feedback_lag=getattr(settings, 'CATTAX_SAMPLING_FEEDBACK_LAG', 1))
+
+    overlap_frames, frames, frames_contours = [], [], []
+
+    def record_frame(frame_index, frame_results, detections):
+        if frame_index < start:
+            overlap_frames.append(frame_results)
+            return
+        frames.append(frame_results)
+        if render:
+            frames_contours.append([
+                det['contour'] + np.array(offset, dtype=det['contour'].dtype) for det, offset in detections
+            ])
+
+    detections = None
+    if getattr(settings, 'CATTAX_STORE_DETECTIONS', True):
+        detections = detection_cache.DetectionWriter(os.path.join(directory, f'{name}_detections'), (w, h), fps)
+        detections.reset()
+
+    behavior_analyzer = CatBehaviorAnalyzer(camera_motion=camera_motion.from_settings())
+    processor = FrameProcessor((w, h), behavior_analyzer, sampler, out=out, on_frame=record_frame,
+                               first_frame=start - lead_in, emit_from=start, keep_track_ids=True,
+                               draw=render, detections=detections)
+    try:
+        pipeline = FramePipeline(FrameRangeCapture(cap, end - start + lead_in), (w, h),
+                                 sampler.wrap(detector.track), processor.annotate_frame,
+                                 batch_size=batch_size,
+                                 queue_size=getattr(settings, 'CATTAX_QUEUE_SIZE', 16),
+                                 on_consumer_exit=sampler.close)
+        stats = pipeline.run()
+        processor.finish()
+        if detections is not None:
+            detections.close(end)
+    finally:
+        cap.release()
+        if out is not None:
+            out.release()
+
+    with open(result_path, 'w', encoding='utf-8') as f:
+        json.dump({'frames': frames, 'overlap': overlap_frames}, f)
+    if render:
+        save_contours(contours_path, frames_contours)
+
+    return dict(chunk, fps=fps, size=[w, h], segment_path=segment_path, result_path=result_path,
+                contours_path=contours_path, detections_path=detections.directory if detections else None,
+                pipeline=stats, roi=detector.roi.stats() if detector.roi is not None else None)
+
+
+def match_overlap(prev_tail, overlap, prev_map, match_distance, min_votes):
+    """根据重叠区间内的位置对应关系，把后一段的局部 track ID 映射到全局 ID
+
+    prev_tail 是上一段最后若干帧的结果，overlap 是后一段对同样这些帧的预热结果。
+    每帧内按最近距离配对，累计 (全局 ID, 局部 ID) 的票数后贪心一对一匹配。
+    """
+    votes = Counter()
+    for prev_frame, next_frame in zip(prev_tail, overlap):
+        for det in next_frame:
+            best, best_dist = None, match_distance
+            for other in prev_frame:
+                dist = math.hypot(det['position'][0] - other['position'][0],
+                                  det['position'][1] - other['position'][1])
+                if dist <= best_dist:
+                    best, best_dist = other, dist
+            if best is not None:
+                votes[(prev_map[best['track_id']], det['track_id'])] += 1
+
+    mapping, used = {}, set()
+    for (global_id, local_id), count in votes.most_common():
+        if count < min_votes:
+            break
+        if local_id in mapping or global_id in used:
+            continue
+        mapping[local_id] = global_id
+        used.add(global_id)
+    return mapping
+
+
+def track_ids_in(frames):
+    return sorted({det['track_id'] for frame in frames for det in frame})
+
+
+def reconcile_chunks(chunk_results, match_distance=40):
+    """为每一段生成 {局部 track ID: 全局 track ID} 映射"""
+    id_maps = []
+    next_id = 1
+    for k, chunk in enumerate(chunk_results):
+        local_ids = track_ids_in(chunk['frames'] + chunk['overlap'])
+        mapping = {}
+        if k > 0 and chunk['overlap']:
+            overlap = chunk['overlap']
+            prev_tail = chunk_results[k - 1]['frames'][-len(overlap):]
+            min_votes = max(1, len(overlap) // 4)
+            mapping = match_overlap(prev_tail, overlap, id_maps[k - 1], match_distance, min_votes)
+        for local_id in local_ids:
+            if local_id not in mapping:
+                mapping[local_id] = next_id
+                next_id += 1
+        next_id = max([next_id] + [global_id + 1 for global_id in mapping.values()])
+        id_maps.append(mapping)
+    return id_maps
+
+
+def remap_frames(frames, id_map):
+    """把逐帧结果中的局部 track ID 换成全局编号，输出与 process_video 相同的格式"""
+    return [
+        [
+            {
+                'cat_id': default_cat_id(id_map[det['track_id']]),
+                'behavior': det['behavior'],
+                'position': tuple(det['position'])
+            }
+            for det in frame
+        ]
+        for frame in frames
+    ]
+
+
+def rerender_segment(video_path, info, frames, frames_contours):
+    """按全局编号重新绘制一段视频（该段的显示编号与局部编号不一致时使用）"""
+    cap, (w, h), fps, _ = open_video(video_path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, info['start'])
+    out = cv2.VideoWriter(info['segment_path'], cv2.VideoWriter_fourcc(*'mp4v'), fps, (w, h))
+    try:
+        for frame_results, contours in zip(frames, frames_contours):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame = cv2.resize(frame, (w, h))
+            for det, contour in zip(frame_results, contours):
+                draw_detection(frame, contour, det['cat_id'], det['behavior'], det['position'])
+            out.write(frame)
+    finally:
+        cap.release()
+        out.release()
+
+
+def concat_segments(segment_paths, output_path, fps, size):
+    """拼接分段视频：有 ffmpeg 时直接按流拷贝，否则用 OpenCV 逐帧重新写出"""
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg:
+        list_path = output_path + '.segments.txt'
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for path in segment_paths:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        try:
+            subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                            '-i', list_path, '-c', 'copy', output_path], check=True)
+            return
+        except subprocess.CalledProcessError as e:
+            print(f"ffmpeg concat failed, falling back to OpenCV: {str(e)}")
+        finally:
+            os.remove(list_path)
+
+    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, tuple(size))
+    try:
+        for path in segment_paths:
+            cap = cv2.VideoCapture(path)
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                out.write(frame)
+            cap.release()
+    finally:
+        out.release()
+
+
+def merge_chunks(video_path, chunk_infos, output_path, on_frame=None, detections_dir=None):
+    """合并各段结果：对齐 track ID、必要时重绘分段、拼接视频
+
+    on_frame(frame_results) 按帧顺序回调合并后的逐帧结果，返回合并后的总帧数。
+    分段没有视频（analysis 模式）时只合并结果。给出 detections_dir 且各段都有检测旁路文件时，
+    把它们按全局 track ID 合并到该目录。
+    """
+    chunk_infos = sorted(chunk_infos, key=lambda info: info['index'])
+    chunk_results = []
+    for info in chunk_infos:
+        with open(info['result_path'], encoding='utf-8') as f:
+            chunk_results.append(json.load(f))
+
+    id_maps = reconcile_chunks(chunk_results, getattr(settings, 'CATTAX_CHUNK_MATCH_DISTANCE', 40))
+    render = all(info.get('segment_path') for info in chunk_infos)
+    total = 0
+    for info, chunk, id_map in zip(chunk_infos, chunk_results, id_maps):
+        frames = remap_frames(chunk['frames'], id_map)
+        # 分段视频是按局部编号绘制的，显示编号变化时才需要重绘
+        if render and any(default_cat_id(local_id) != default_cat_id(global_id)
+                          for local_id, global_id in id_map.items()):
+            rerender_segment(video_path, info, frames, load_contours(info['contours_path']))
+        if on_frame is not None:
+            for frame_results in frames:
+                on_frame(frame_results)
+        total += len(frames)
+
+    first = chunk_infos[0]
+    if detections_dir is not None and all(info.get('detections_path') for info in chunk_infos):
+        detection_cache.merge([(info['detections_path'], info['start'], id_map)
+                               for info, id_map in zip(chunk_infos, id_maps)],
+                              detections_dir, first['size'], first['fps'], chunk_infos[-1]['end'])
+
+    if render:
+        concat_segments([info['segment_path'] for info in chunk_infos], output_path, first['fps'], first['size'])
+    return total
+
+
+def run_chunks_locally(video_path, analysis_id, chunks, workers=None):
+    """Celery 以 eager 模式运行时，用本地进程池并行处理各段"""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = workers or min(len(chunks), os.cpu_count() or 1)
+    context = multiprocessing.get_context('fork') if hasattr(os, 'fork') else None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = [pool.submit(process_chunk, video_path, analysis_id, chunk) for chunk in chunks]
+        return [future.result() for future in futures]
+
+
+def finalize_chunks(video_path, analysis_id, chunk_infos, cleanup=True):
+    """合并各段结果写入数据库并生成最终视频"""
+    from api import events
+    from api.models import VideoAnalysis
+    from api.results_store import ResultsWriter
+
+    total_frames = sum(info['end'] - info['start'] for info in chunk_infos)
+    writer = ResultsWriter(analysis_id, total_frames, track_progress=False,
+                           fps=min(chunk_infos, key=lambda info: info['index'])['fps'])
+    output_path = os.path.join(settings.MEDIA_ROOT, 'processed', f'output_{analysis_id}.mp4')
+    detections_dir = detection_cache.detections_dir(analysis_id)
+    merge_chunks(video_path, chunk_infos, output_path, on_frame=writer.append, detections_dir=detections_dir)
+    rendered = all(info.get('segment_path') for info in chunk_infos)
+    writer.finish(render_mode=get_render_mode() if rendered else 'analysis', chunks=[
+        {'index': info['index'], 'start': info['start'], 'end': info['end'], 'pipeline': info.get('pipeline'),
+         'roi': info.get('roi')}
+        for info in sorted(chunk_infos, key=lambda info: info['index'])
+    ], detections=detection_cache.summary(detections_dir))
+    VideoAnalysis.objects.filter(id=analysis_id).update(
+        status='completed',
+        progress=100.0,
+        processed_video=f'processed/output_{analysis_id}.mp4' if rendered else None
+    )
+    events.publish_status(analysis_id, 'completed', progress=100.0)
+    if cleanup:
+        shutil.rmtree(chunk_dir(analysis_id), ignore_errors=True)
+    return output_path if rendered else None
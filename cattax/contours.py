@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+
+
+class ContourExtractor:
+    """从 YOLO 分割多边形（masks.xy）中提取主轮廓和质心
+
+    与整帧 np.zeros((h, w)) + fillPoly + findContours 的结果完全一致，但只在多边形的
+    外接矩形（裁剪到画面内）上栅格化，并复用同一块临时缓冲区，单个检测的开销
+    与猫的大小相关而不是与画面分辨率相关。
+    """
+
+    def __init__(self, frame_size):
+        self.w, self.h = frame_size
+        self._scratch = np.zeros((0, 0), dtype=np.uint8)
+
+    def _roi_buffer(self, rh, rw):
+        if self._scratch.shape[0] < rh or self._scratch.shape[1] < rw:
+            self._scratch = np.zeros((max(rh, self._scratch.shape[0]), max(rw, self._scratch.shape[1])),
+                                     dtype=np.uint8)
+        roi = self._scratch[:rh, :rw]
+        roi.fill(0)
+        return roi
+
+    def extract(self, polygon):
+        """返回 (main_contour, (cx, cy), moments)，多边形为空或面积为 0 时返回 None"""
+        points = np.array(polygon, dtype=np.int32)
+        if len(points) == 0:
+            return None
+
+        # 外接矩形裁剪到画面内，超出画面的部分在整帧掩膜中本来也会被裁掉
+        x0 = max(int(points[:, 0].min()), 0)
+        y0 = max(int(points[:, 1].min()), 0)
+        x1 = min(int(points[:, 0].max()) + 1, self.w)
+        y1 = min(int(points[:, 1].max()) + 1, self.h)
+        if x1 <= x0 or y1 <= y0:
+            return None
+
+        roi = self._roi_buffer(y1 - y0, x1 - x0)
+        cv2.fillPoly(roi, [points], 255, offset=(-x0, -y0))
+        contours, _ = cv2.findContours(roi, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(x0, y0))
+        if not contours:
+            return None
+
+        main_contour = max(contours, key=cv2.contourArea)
+        M = cv2.moments(main_contour)
+        if M["m00"] == 0:
+            return None
+        cx = int(M["m10"] / M["m00"])
+        cy = int(M["m01"] / M["m00"])
+        return main_contour, (cx, cy), M
+
+
+def extract_contour_full_frame(polygon, frame_size):
+    """旧的整帧栅格化实现，仅用于基准对比和一致性校验"""
+    w, h = frame_size
+    mask_img = np.zeros((h, w), dtype=np.uint8)
+    cv2.fillPoly(mask_img, [np.array(polygon, dtype=np.int32)], 255)
+    contours, _ = cv2.findContours(mask_img, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    main_contour = max(contours, key=cv2.contourArea)
+    M = cv2.moments(main_contour)
+    if M["m00"] == 0:
+        return None
+    return main_contour, (int(M["m10"] / M["m00"]), int(M["m01"] / M["m00"])), M
@@ -0,0 +1,128 @@
+import cv2
+import numpy as np
+import torch
+import yaml
+from ultralytics.trackers.basetrack import BaseTrack
+from ultralytics.trackers.byte_tracker import BYTETracker
+from ultralytics.utils import IterableSimpleNamespace
+from ultralytics.utils.checks import check_yaml
+
+from .profiling import NULL_PROFILER
+from .roi import region_imgsz, region_result
+
+CAT_CLASS_ID = 15  # COCO 中 "cat" 的类别编号
+
+
+class CatDetector:
+    """猫咪检测 + 分割 + ByteTrack 追踪，支持多帧批量推理
+
+    批量模式下先对整批帧做一次检测/分割，再按帧顺序逐帧送入同一个
+    ByteTrack 追踪器做关联，与 ultralytics 自身 ``model.track`` 的回调逻辑一致，
+    因此 batch_size=1 与 batch_size>1 得到的 track ID 相同。
+    给出 roi（roi.RegionPlanner）时启用 ROI 推理：两次整帧检测之间只检测上一次猫所在的区域。
+    """
+
+    def __init__(self, model, tracker="bytetrack.yaml", conf=0.5, classes=(CAT_CLASS_ID,), profiler=None,
+                 roi=None, imgsz=640):
+        self.model = model
+        self.profiler = profiler or NULL_PROFILER  # 记录推理和追踪的逐帧耗时
+        self.tracker_cfg = tracker
+        self.conf = conf
+        self.classes = list(classes)
+        self.roi = roi
+        self.imgsz = imgsz  # 整帧推理的尺寸（ultralytics 默认值），ROI 推理按它换算裁剪区域的推理尺寸
+        self.tracker = self._build_tracker()
+
+    def _build_tracker(self):
+        with open(check_yaml(self.tracker_cfg), encoding='utf-8') as f:
+            cfg = IterableSimpleNamespace(**yaml.safe_load(f))
+        return BYTETracker(args=cfg)
+
+    def reset(self):
+        """重置追踪器状态（切换视频时调用）"""
+        self.tracker.reset()
+        if self.roi is not None:
+            self.roi.reset()
+
+    def get_state(self):
+        """追踪器状态（可 pickle），包括进程级的 track ID 计数器，用于任务中断后继续追踪"""
+        return {'tracker': self.tracker, 'next_id': BaseTrack._count,
+                'roi': self.roi.get_state() if self.roi is not None else None}
+
+    def set_state(self, state):
+        self.tracker = state['tracker']
+        BaseTrack._count = state['next_id']
+        if self.roi is not None and state.get('roi') is not None:
+            self.roi.set_state(state['roi'])
+
+    def detect(self, frames):
+        """对一批帧做检测和分割，不做追踪"""
+        return self.model.predict(frames, classes=self.classes, conf=self.conf, verbose=False)
+
+    def detect_regions(self, frames, regions):
+        """regions 为 None 的帧整帧检测，其余帧的所有裁剪区域合成一批做一次推理，结果换算回整帧坐标"""
+        results = [None] * len(frames)
+        full = [i for i, frame_regions in enumerate(regions) if frame_regions is None]
+        if full:
+            for i, result in zip(full, self.detect([frames[i] for i in full])):
+                results[i] = result
+        cropped = [i for i, frame_regions in enumerate(regions) if frame_regions is not None]
+        if cropped:
+            crops = [np.ascontiguousarray(frames[i][y0:y1, x0:x1]) for i in cropped for x0, y0, x1, y1 in regions[i]]
+            imgsz = max(region_imgsz(regions[i], frames[i].shape, self.imgsz) for i in cropped)
+            crop_results = self.model.predict(crops, classes=self.classes, conf=self.conf, verbose=False,
+                                              imgsz=imgsz)
+            offset = 0
+            for i in cropped:
+                count = len(regions[i])
+                results[i] = region_result(frames[i], crop_results[offset:offset + count], regions[i],
+                                           crop_results[offset].names)
+                offset += count
+        return results
+
+    def associate(self, result):
+        """把单帧检测结果送入 ByteTrack，返回带 track ID 的结果"""
+        det = result.boxes.cpu().numpy()
+        tracks = self.tracker.update(det, result.orig_img)
+        if len(tracks) == 0:
+            return result[:0]
+
+        idx = tracks[:, -1].astype(int)
+        result = result[idx]
+        result.update(boxes=torch.as_tensor(tracks[:, :-1]))
+        return result
+
+    def track(self, frames):
+        """批量检测后按帧顺序关联，返回与 frames 一一对应的结果列表"""
+        if not frames:
+            return []
+        if self.roi is None:
+            with self.profiler.stage('inference', len(frames)):
+                results = self.detect(frames)
+            with self.profiler.stage('tracking', len(frames)):
+                return [self.associate(result) for result in results]
+
+        # 一批帧的区域都按这一批之前的追踪结果规划，关联后逐帧把追踪框反馈给 RegionPlanner
+        regions = [self.roi.plan(frame.shape) for frame in frames]
+        with self.profiler.stage('inference', len(frames)):
+            results = self.detect_regions(frames, regions)
+        with self.profiler.stage('tracking', len(frames)):
+            tracked = []
+            for result, frame_regions in zip(results, regions):
+                result = self.associate(result)
+                self.roi.update(result.boxes.xyxy.tolist(), frame_regions)
+                tracked.append(result)
+            return tracked
+
+
+def read_batch(cap, batch_size, size=None):
+    """从 VideoCapture 中预读最多 batch_size 帧，可选地缩放到 size=(w, h)"""
+    frames = []
+    while len(frames) < batch_size:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if size is not None:
+            frame = cv2.resize(frame, size)
+        frames.append(frame)
+    return frames
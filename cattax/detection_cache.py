@@ -0,0 +1,183 @@
+import json
+import os
+import shutil
+
+import numpy as np
+from django.conf import settings
+
+FORMAT_VERSION = 1
+META_NAME = 'meta.json'
+
+
+def detections_dir(analysis_id):
+    return os.path.join(settings.MEDIA_ROOT, 'detections', str(analysis_id))
+
+
+def part_name(index):
+    return f'part_{index:05d}.npz'
+
+
+def _write_atomic(path, write):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+class DetectionWriter:
+    """检测帧原始追踪结果的旁路文件（detection cache）
+
+    每个检测帧记录追踪器输出的 track ID、框（xyxy）、置信度、分割多边形（masks.xy，处理分辨率下的坐标）
+    和摄像机运动（camera_motion 的 2x3 变换矩阵），每 chunk_frames 个检测帧写一个 part_<n>.npz，数组为：
+      frames (k,) 检测帧序号，counts (k,) 每帧检测数，motion (k, 2, 3) 摄像机运动（没有时为 NaN），
+      track_ids (n,)、boxes (n, 4)、confs (n,)，lengths (n,) 每个多边形的点数，points (m, 2) 所有多边形的点。
+    被抽帧跳过的帧不记录，重新分析时与原来一样插值。close() 时写入 meta.json，
+    只有写完 meta.json 的目录才能用于重新分析（中途被抢占或崩溃的不算）。
+    """
+
+    def __init__(self, directory, frame_size, fps, chunk_frames=None):
+        if chunk_frames is None:
+            chunk_frames = getattr(settings, 'CATTAX_DETECTIONS_CHUNK_FRAMES', 1000)
+        self.directory = directory
+        self.frame_size = [int(v) for v in frame_size]
+        self.fps = fps
+        self.chunk_frames = max(1, int(chunk_frames))
+        self.parts = 0
+        self.keyframes = 0
+        self._buffer = []
+
+    def reset(self):
+        """删除目录中已有的旁路文件（同一个分析从头重新处理时）"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.parts = 0
+        self.keyframes = 0
+        self._buffer = []
+
+    def append(self, frame_index, track_ids, boxes, confs, polygons, motion=None):
+        self._buffer.append((frame_index, track_ids, boxes, confs, polygons, motion))
+        if len(self._buffer) >= self.chunk_frames:
+            self.flush()
+
+    def flush(self):
+        """把缓存的检测帧写成一个块"""
+        if not self._buffer:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        polygons = [np.asarray(p, dtype=np.float32).reshape(-1, 2) for *_, ps, _ in self._buffer for p in ps]
+        arrays = {
+            'frames': np.array([frame_index for frame_index, *_ in self._buffer], dtype=np.int64),
+            'counts': np.array([len(ids) for _, ids, *_ in self._buffer], dtype=np.int32),
+            'track_ids': np.array([t for _, ids, *_ in self._buffer for t in ids], dtype=np.int32),
+            'boxes': np.array([b for _, _, bs, *_ in self._buffer for b in bs], dtype=np.float32).reshape(-1, 4),
+            'confs': np.array([c for _, _, _, cs, *_ in self._buffer for c in cs], dtype=np.float32),
+            'lengths': np.array([len(p) for p in polygons], dtype=np.int32),
+            'points': np.concatenate(polygons) if polygons else np.zeros((0, 2), dtype=np.float32),
+            'motion': np.array([np.full((2, 3), np.nan) if motion is None else motion
+                                for *_, motion in self._buffer], dtype=np.float64).reshape(-1, 2, 3),
+        }
+        _write_atomic(os.path.join(self.directory, part_name(self.parts)),
+                      lambda f: np.savez_compressed(f, **arrays))
+        self.parts += 1
+        self.keyframes += len(self._buffer)
+        self._buffer = []
+
+    def get_state(self):
+        """先 flush，再返回继续写入所需的状态（用于检查点）"""
+        self.flush()
+        return {'parts': self.parts, 'keyframes': self.keyframes}
+
+    def set_state(self, state):
+        """恢复到 get_state() 时的状态，并删除之后写入的块（任务在两次检查点之间中断时留下的）"""
+        self.parts = state['parts']
+        self.keyframes = state['keyframes']
+        self._buffer = []
+        if not os.path.isdir(self.directory):
+            return
+        kept = {part_name(i) for i in range(self.parts)}
+        for name in os.listdir(self.directory):
+            if name not in kept:
+                os.remove(os.path.join(self.directory, name))
+
+    def close(self, total_frames):
+        """写入剩余的块和 meta.json，返回写入 results 的摘要"""
+        self.flush()
+        os.makedirs(self.directory, exist_ok=True)
+        meta = {
+            'version': FORMAT_VERSION,
+            'frame_size': self.frame_size,
+            'fps': self.fps,
+            'total_frames': total_frames,
+            'keyframes': self.keyframes,
+            'parts': [part_name(i) for i in range(self.parts)],
+        }
+        _write_atomic(os.path.join(self.directory, META_NAME), lambda f: f.write(json.dumps(meta).encode('utf-8')))
+        return summary(self.directory, meta)
+
+
+def load_meta(directory):
+    """返回旁路文件的 meta，没有完整的旁路文件时返回 None"""
+    path = os.path.join(directory, META_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('version') != FORMAT_VERSION:
+        print(f"Ignoring detection cache {directory} with version {meta.get('version')}")
+        return None
+    return meta
+
+
+def summary(directory, meta=None):
+    """写入 results['detections'] 的摘要：检测帧数、块数和文件总字节数；没有完整的旁路文件时返回 None"""
+    if meta is None:
+        meta = load_meta(directory)
+    if meta is None:
+        return None
+    size = sum(os.path.getsize(os.path.join(directory, name)) for name in meta['parts'])
+    return {'keyframes': meta['keyframes'], 'parts': len(meta['parts']), 'bytes': size}
+
+
+def iter_keyframes(directory, meta=None):
+    """按帧顺序遍历检测帧，返回 (frame_index, track_ids, boxes, confs, polygons, motion)
+
+    motion 为摄像机运动的 2x3 矩阵，没有（未估计或旧版本旁路文件）时为 None。
+    """
+    if meta is None:
+        meta = load_meta(directory)
+    for name in meta['parts']:
+        with np.load(os.path.join(directory, name)) as data:
+            frames, counts = data['frames'], data['counts']
+            track_ids, boxes, confs = data['track_ids'].tolist(), data['boxes'], data['confs']
+            lengths, points = data['lengths'], data['points']
+            motion = data['motion'] if 'motion' in data.files else np.full((len(frames), 2, 3), np.nan)
+        polygons = np.split(points, np.cumsum(lengths)[:-1]) if len(lengths) else []
+        offsets = np.concatenate([[0], np.cumsum(counts)]).tolist()
+        for k, frame_index in enumerate(frames.tolist()):
+            start, end = offsets[k], offsets[k + 1]
+            yield (frame_index, track_ids[start:end], boxes[start:end], confs[start:end], polygons[start:end],
+                   None if np.isnan(motion[k]).any() else motion[k])
+
+
+def merge(sources, directory, frame_size, fps, total_frames):
+    """合并分段处理时各段的旁路文件，返回摘要；有一段缺少旁路文件时返回 None
+
+    sources 为按顺序排列的 [(目录, 起始帧, {局部 track ID: 全局 track ID})]，丢弃每段起始帧之前
+    （重叠预热区间）的检测帧；映射中没有的局部 ID（没有提取到轮廓的检测）分配新的全局 ID。
+    """
+    metas = [load_meta(source) for source, _, _ in sources]
+    if any(meta is None for meta in metas):
+        return None
+    writer = DetectionWriter(directory, frame_size, fps)
+    writer.reset()
+    next_id = max([global_id for _, _, id_map in sources for global_id in id_map.values()], default=0) + 1
+    for (source, start, id_map), meta in zip(sources, metas):
+        id_map = dict(id_map)
+        for frame_index, track_ids, boxes, confs, polygons, motion in iter_keyframes(source, meta):
+            if frame_index < start:
+                continue
+            for track_id in track_ids:
+                if track_id not in id_map:
+                    id_map[track_id] = next_id
+                    next_id += 1
+            writer.append(frame_index, [id_map[t] for t in track_ids], boxes, confs, polygons, motion)
+    return writer.close(total_frames)
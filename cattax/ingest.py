@@ -0,0 +1,206 @@
+import os
+import struct
+import time
+
+# 边上传边处理时，上传提交后在视频旁写入的完成标记
+DONE_SUFFIX = '.done'
+
+# 不依赖文件末尾索引、可以顺序解码的容器
+STREAMABLE_EXTENSIONS = ('.mkv', '.webm', '.ts', '.m2ts', '.flv')
+MP4_EXTENSIONS = ('.mp4', '.m4v', '.mov')
+
+
+def mp4_moov_first(path):
+    """MP4/MOV 的 moov 是否在 mdat 之前（faststart 或分片 MP4）
+
+    只遍历顶层 box 头，已写入的部分还不足以判断时返回 False，可在收到更多数据后再判断。
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        offset = 0
+        while offset + 8 <= size:
+            f.seek(offset)
+            box_size, box_type = struct.unpack('>I4s', f.read(8))
+            if box_type == b'moov':
+                return True
+            if box_type == b'mdat':
+                return False
+            if box_size == 1:
+                if offset + 16 > size:
+                    return False
+                box_size = struct.unpack('>Q', f.read(8))[0]
+            elif box_size == 0:
+                return False
+            if box_size < 8:
+                return False
+            offset += box_size
+    return False
+
+
+def _boxes(f, start, end):
+    """遍历 [start, end) 范围内的 MP4 box，返回 (类型, 内容起点, 内容终点)"""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        box_size, box_type = struct.unpack('>I4s', f.read(8))
+        header = 8
+        if box_size == 1:
+            if offset + 16 > end:
+                return
+            box_size = struct.unpack('>Q', f.read(8))[0]
+            header = 16
+        elif box_size == 0:
+            box_size = end - offset
+        if box_size < header:
+            return
+        yield box_type, offset + header, min(offset + box_size, end)
+        offset += box_size
+
+
+def _child(f, start, end, box_type):
+    for kind, child_start, child_end in _boxes(f, start, end):
+        if kind == box_type:
+            return child_start, child_end
+    return None
+
+
+def _mp4_video_track(f, start, end):
+    """trak 为视频轨道时返回 (帧数, 宽, 高)，否则返回 None"""
+    tkhd = _child(f, start, end, b'tkhd')
+    mdia = _child(f, start, end, b'mdia')
+    if tkhd is None or mdia is None or tkhd[1] - tkhd[0] < 8:
+        return None
+    hdlr = _child(f, *mdia, b'hdlr')
+    if hdlr is None:
+        return None
+    f.seek(hdlr[0] + 8)  # version/flags、pre_defined 之后是 handler_type
+    if f.read(4) != b'vide':
+        return None
+    stsz = None
+    minf = _child(f, *mdia, b'minf')
+    stbl = _child(f, *minf, b'stbl') if minf is not None else None
+    if stbl is not None:
+        stsz = _child(f, *stbl, b'stsz') or _child(f, *stbl, b'stz2')
+    if stsz is None:
+        return None
+    f.seek(stsz[0] + 8)  # version/flags、sample_size（stz2 为 reserved + field_size）之后是 sample_count
+    frames = struct.unpack('>I', f.read(4))[0]
+    # tkhd 最后 8 字节是 16.16 定点数的宽和高
+    f.seek(tkhd[1] - 8)
+    width, height = struct.unpack('>II', f.read(8))
+    return frames, width >> 16, height >> 16
+
+
+def mp4_video_info(path):
+    """从 MP4/MOV 的 moov 读取视频轨道的 (帧数, 宽, 高)，不解码、不依赖 OpenCV
+
+    只读取 box 头和几个字段；没有 moov（尚未上传到或文件损坏）、没有视频轨道或样本表为空（分片 MP4）时返回 None。
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        moov = _child(f, 0, size, b'moov')
+        if moov is None:
+            return None
+        for kind, start, end in _boxes(f, *moov):
+            if kind == b'trak':
+                info = _mp4_video_track(f, start, end)
+                if info is not None and info[0] > 0:
+                    return info
+    return None
+
+
+def is_streamable(path):
+    """文件只写入了开头一部分时是否已经可以开始解码"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in STREAMABLE_EXTENSIONS:
+        return True
+    if ext in MP4_EXTENSIONS:
+        return mp4_moov_first(path)
+    return False
+
+
+def mark_complete(path):
+    with open(path + DONE_SUFFIX, 'w'):
+        pass
+
+
+def is_complete(path):
+    return os.path.exists(path + DONE_SUFFIX)
+
+
+class GrowingFileCapture:
+    """读取仍在上传中的视频文件的 VideoCapture 包装
+
+    读到当前文件末尾时，若上传尚未完成（没有完成标记），等待文件变大后重新打开并
+    定位到已读帧数继续解码；上传完成且再无新帧时结束。文件超过 stall_timeout 秒
+    没有增长则抛出 TimeoutError，避免上传中断后 worker 一直等待。
+    OpenCV 在用到时才导入：web 进程的上传接口只用到本模块中判断容器格式的函数。
+    """
+
+    def __init__(self, path, poll_interval=0.5, stall_timeout=600):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.stall_timeout = stall_timeout
+        self.frames_read = 0
+        self.reopens = 0
+        self._opened_size = None
+        self.cap = None
+        self._open()
+
+    def _open(self):
+        import cv2
+
+        deadline = time.monotonic() + self.stall_timeout
+        while True:
+            size = os.path.getsize(self.path)
+            cap = cv2.VideoCapture(self.path)
+            if cap.isOpened():
+                break
+            cap.release()
+            if is_complete(self.path) or time.monotonic() > deadline:
+                raise Exception(f"Could not open video file: {self.path}")
+            time.sleep(self.poll_interval)
+        if self.frames_read:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, self.frames_read)
+        if self.cap is not None:
+            self.cap.release()
+        self.cap = cap
+        self._opened_size = size
+
+    def _wait_for_growth(self):
+        deadline = time.monotonic() + self.stall_timeout
+        while os.path.getsize(self.path) == self._opened_size and not is_complete(self.path):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Upload stalled for {self.stall_timeout}s: {self.path}")
+            time.sleep(self.poll_interval)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        import cv2
+
+        # 从检查点继续时定位到指定帧，之后重新打开文件也从这里接着读
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.frames_read = int(value)
+        return self.cap.set(prop, value)
+
+    def read(self):
+        while True:
+            ret, frame = self.cap.read()
+            if ret:
+                self.frames_read += 1
+                return ret, frame
+            # 上传已完成，且打开之后文件没有再变化：真正读完了
+            if is_complete(self.path) and os.path.getsize(self.path) == self._opened_size:
+                return False, None
+            self._wait_for_growth()
+            self._open()
+            self.reopens += 1
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
@@ -0,0 +1,112 @@
+import math
+
+import numpy as np
+from django.conf import settings
+from scipy.spatial import cKDTree
+
+# 猫不超过这个数时直接逐对比较，比建 KD 树快
+BRUTE_FORCE_CATS = 12
+
+
+class InteractionDetector:
+    """逐帧检测猫之间的接近和互动
+
+    每帧用当前所有猫的位置建 KD 树，query_pairs 找出中心距离不超过 distance 像素的猫对，
+    耗时约 O(n log n + 接近的猫对数)；猫很少（不超过 BRUTE_FORCE_CATS）时直接逐对比较。update() 为每个接近的猫对返回一个事件：
+    接近不满 min_frames 帧时为 proximity，同一对猫连续接近达到 min_frames 帧起为 interaction，
+    分开后重新计数。只保留当前接近的猫对的连续帧数；累计统计按猫对汇总，不随视频时长增长。
+    """
+
+    def __init__(self, distance=None, min_frames=None):
+        if distance is None:
+            distance = getattr(settings, 'CATTAX_INTERACTION_DISTANCE', 100)
+        if min_frames is None:
+            min_frames = getattr(settings, 'CATTAX_INTERACTION_MIN_FRAMES', 12)
+        self.distance = float(distance)
+        self.min_frames = max(1, int(min_frames))
+        self.reset()
+
+    def reset(self):
+        self.runs = {}    # (cat_a, cat_b) -> 连续接近的帧数，只含上一帧接近的猫对
+        self.totals = {}  # (cat_a, cat_b) -> [接近帧数, 互动帧数, 互动次数]
+
+    def get_state(self):
+        return {
+            'runs': list(self.runs.items()),
+            'totals': [(pair, list(total)) for pair, total in self.totals.items()],
+        }
+
+    def set_state(self, state):
+        self.runs = {tuple(pair): run for pair, run in state['runs']}
+        self.totals = {tuple(pair): list(total) for pair, total in state['totals']}
+
+    def close_pairs(self, positions):
+        """返回距离不超过 distance 的 [(行号 i, 行号 j, 距离)]，i < j，距离保留一位小数"""
+        if len(positions) <= BRUTE_FORCE_CATS:
+            limit = self.distance * self.distance
+            return [(i, j, round(math.sqrt(d), 1))
+                    for i, (x0, y0) in enumerate(positions)
+                    for j in range(i + 1, len(positions))
+                    for d in ((x0 - positions[j][0])**2 + (y0 - positions[j][1])**2,)
+                    if d <= limit]
+        points = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        pairs = cKDTree(points).query_pairs(self.distance, output_type='ndarray')
+        delta = points[pairs[:, 0]] - points[pairs[:, 1]]
+        distances = np.round(np.sqrt(delta[:, 0]**2 + delta[:, 1]**2), 1)
+        return [(i, j, distance) for (i, j), distance in zip(pairs.tolist(), distances.tolist())]
+
+    def update(self, frame_results):
+        """计入一帧的结果（每个元素至少包含 cat_id 和 position），返回这一帧的事件列表
+
+        事件为 {'type': 'proximity' / 'interaction', 'cats': [cat_a, cat_b], 'distance', 'frames'}，
+        frames 为这对猫连续接近的帧数（含本帧）。
+        """
+        cat_ids = [det['cat_id'] for det in frame_results]
+        runs, events = {}, []
+        for i, j, distance in self.close_pairs([det['position'] for det in frame_results]):
+            a, b = cat_ids[i], cat_ids[j]
+            pair = (a, b) if a < b else (b, a)
+            if a == b or pair in runs:
+                continue
+            run = runs[pair] = self.runs.get(pair, 0) + 1
+            total = self.totals.get(pair)
+            if total is None:
+                total = self.totals[pair] = [0, 0, 0]
+            total[0] += 1
+            if run == self.min_frames:
+                # 达到 min_frames 时这一段接近的帧都算作互动
+                total[1] += run
+                total[2] += 1
+            elif run > self.min_frames:
+                total[1] += 1
+            events.append({
+                'type': 'interaction' if run >= self.min_frames else 'proximity',
+                'cats': list(pair),
+                'distance': distance,
+                'frames': run,
+            })
+        self.runs = runs
+        return events
+
+    def summary(self):
+        """按猫对汇总：接近帧数、互动帧数和互动次数"""
+        return [
+            {'cats': list(pair), 'proximity_frames': total[0], 'interaction_frames': total[1],
+             'interactions': total[2]}
+            for pair, total in sorted(self.totals.items())
+        ]
+
+
+def attach(frame_results, events):
+    """把 update() 返回的事件附加到这一帧涉及的两只猫的检测结果上
+
+    每只猫的检测结果增加 interactions 列表，元素为 {'type', 'cat', 'distance', 'frames'}，cat 为另一只猫。
+    """
+    by_cat = {det['cat_id']: det for det in frame_results}
+    for event in events:
+        a, b = event['cats']
+        for cat_id, other in ((a, b), (b, a)):
+            by_cat[cat_id].setdefault('interactions', []).append({
+                'type': event['type'], 'cat': other, 'distance': event['distance'], 'frames': event['frames'],
+            })
+    return frame_results
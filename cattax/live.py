@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+
+import cv2
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from . import camera_motion, model_registry
+from .cat_behavior import CatBehaviorAnalyzer
+from .cat_capture import FrameProcessor, RESIZE_FACTOR
+from .interactions import InteractionDetector
+from .pipeline import FramePipeline, format_stats
+from .sampling import AdaptiveSampler
+from .timeline import BehaviorSegmenter
+
+
+class LiveCapture:
+    """实时视频源的 VideoCapture 包装：RTSP/HTTP 地址、摄像头编号或本地文件
+
+    - realtime=True 时按源帧率节流读取，用本地文件模拟实时视频源；
+    - loop=True 时本地文件读完后从头循环；
+    - 网络源读取失败时最多重连 reconnect_attempts 次，每次间隔 reconnect_delay 秒；
+    - stop_event 置位后 read() 返回 (False, None)，流水线随之结束。
+    """
+
+    def __init__(self, source, realtime=False, loop=False, reconnect_attempts=5, reconnect_delay=2.0,
+                 stop_event=None):
+        self.source = source
+        self.realtime = realtime
+        self.loop = loop
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_delay = reconnect_delay
+        self.stop_event = stop_event or threading.Event()
+        self.is_file = os.path.isfile(str(source))
+        self.frames_read = 0
+        self.reconnects = 0
+        self.cap = self._connect()
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 25.0
+        self._clock_start = None
+        self._paced = 0
+
+    def _connect(self):
+        source = int(self.source) if str(self.source).isdigit() else self.source
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened():
+            cap.release()
+            raise Exception(f"Could not open video source: {self.source}")
+        return cap
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def _pace(self):
+        if self._clock_start is None:
+            self._clock_start = time.monotonic()
+        delay = self._clock_start + self._paced / self.fps - time.monotonic()
+        if delay > 0:
+            self.stop_event.wait(delay)
+        self._paced += 1
+
+    def _reconnect(self):
+        if self.is_file:
+            if not self.loop:
+                return False
+            self.cap.release()
+            self.cap = self._connect()
+            return True
+        for attempt in range(1, self.reconnect_attempts + 1):
+            if self.stop_event.wait(self.reconnect_delay):
+                return False
+            try:
+                cap = self._connect()
+            except Exception as e:
+                print(f"Reconnect {attempt}/{self.reconnect_attempts} to {self.source} failed: {str(e)}")
+                continue
+            self.cap.release()
+            self.cap = cap
+            self.reconnects += 1
+            print(f"Reconnected to {self.source}")
+            return True
+        return False
+
+    def read(self):
+        while not self.stop_event.is_set():
+            if self.realtime:
+                self._pace()
+            ret, frame = self.cap.read()
+            if ret:
+                self.frames_read += 1
+                return ret, frame
+            if not self._reconnect():
+                break
+        return False, None
+
+    def release(self):
+        self.cap.release()
+
+
+def process_stream(source, analysis_id, max_seconds=None, realtime=False, loop=False,
+                   frame_skip=None, batch_size=None, queue_size=None):
+    """持续分析实时视频源，把行为区间写入数据库，直到源结束、收到停止请求或超过 max_seconds
+
+    不保存逐帧结果，也不输出视频：每只猫只保留当前打开的行为区间和行为分析器中的
+    滑动窗口状态，猫离开画面后其状态会被丢弃，长时间运行内存保持平稳。
+    CATTAX_INTERACTIONS 开启时逐帧检测猫之间的互动，事件随区间一起写入（见 SegmentWriter）。
+    推理跟不上源帧率时丢弃 decode 队列中最旧的帧，保证处理的总是最新画面。
+    帧编号是实际分析的帧的序号（丢弃的帧不计），区间时间为墙钟时间。
+    """
+    from api import events
+    from api.models import VideoAnalysis
+    from api.results_store import SegmentWriter
+
+    if frame_skip is None:
+        frame_skip = getattr(settings, 'CATTAX_MAX_FRAME_SKIP', 1)
+    if batch_size is None:
+        batch_size = getattr(settings, 'CATTAX_BATCH_SIZE', 1)
+    if queue_size is None:
+        queue_size = getattr(settings, 'CATTAX_QUEUE_SIZE', 16)
+
+    print(f"Starting stream analysis for ID: {analysis_id}, source: {source}")
+    # 第一次心跳：任务在 broker 中等待过久、已被 recover_streams() 标记为失败时恢复为 processing
+    VideoAnalysis.objects.filter(id=analysis_id).update(status='processing', updated_at=timezone.now())
+    detector = model_registry.get_detector()
+    behavior_analyzer = CatBehaviorAnalyzer(camera_motion=camera_motion.from_settings())
+    stop_event = threading.Event()
+    cap = LiveCapture(source, realtime=realtime, loop=loop, stop_event=stop_event,
+                      reconnect_attempts=getattr(settings, 'CATTAX_STREAM_RECONNECT_ATTEMPTS', 5))
+    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) * RESIZE_FACTOR)
+    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) * RESIZE_FACTOR)
+    sampler = AdaptiveSampler(frame_skip, getattr(settings, 'CATTAX_SAMPLING_MOTION_THRESHOLD', 4.0),
+                              feedback_lag=getattr(settings, 'CATTAX_SAMPLING_FEEDBACK_LAG', 1))
+    interactions = InteractionDetector() if getattr(settings, 'CATTAX_INTERACTIONS', True) else None
+    writer = SegmentWriter(analysis_id, interactions=interactions)
+    max_gap = max(1, round(cap.fps * getattr(settings, 'CATTAX_STREAM_MAX_GAP_SECONDS', 2.0)))
+    # 区间最长 CATTAX_STREAM_MAX_SEGMENT_SECONDS 秒，打开的区间的轨迹长度有上限
+    max_frames = round(cap.fps * getattr(settings, 'CATTAX_STREAM_MAX_SEGMENT_SECONDS', 600))
+    segmenter = BehaviorSegmenter(writer.append, max_gap=max_gap,
+                                  position_step=getattr(settings, 'CATTAX_TIMELINE_POSITION_STEP', 10),
+                                  max_frames=max_frames)
+    started = time.monotonic()
+    pipeline = processor = None
+
+    def live_stats():
+        return {
+            'source': str(source),
+            'uptime_s': round(time.monotonic() - started, 1),
+            'frames_read': cap.frames_read,
+            'frames_analyzed': processor.frame_count if processor else 0,
+            'frames_dropped': pipeline.decode_queue.dropped if pipeline else 0,
+            'reconnects': cap.reconnects,
+            'open_segments': len(segmenter.open_segments),
+        }
+
+    def record_frame(frame_index, frame_results, detections):
+        now = time.time()
+        # 猫离开画面超过 max_gap 帧：区间已关闭，同时丢弃它的行为历史
+        for cat_id in segmenter.update(frame_index, frame_results, now):
+            behavior_analyzer.forget(cat_id)
+        writer.add_interactions(frame_index, frame_results, now)
+        if max_seconds and time.monotonic() - started >= max_seconds:
+            stop_event.set()
+        if writer.due():
+            results = writer.flush(live=live_stats())
+            events.publish(analysis_id, 'live', **results)
+            if VideoAnalysis.objects.filter(id=analysis_id, stop_requested=True).exists():
+                stop_event.set()
+
+    def consumer_exit():
+        # 标注线程退出后推理线程不再等待抽帧反馈
+        sampler.close()
+        connections.close_all()
+
+    processor = FrameProcessor((w, h), behavior_analyzer, sampler, on_frame=record_frame, draw=False)
+    try:
+        pipeline = FramePipeline(cap, (w, h), sampler.wrap(detector.track), processor.annotate_frame,
+                                 batch_size=batch_size, queue_size=queue_size,
+                                 on_consumer_exit=consumer_exit, drop_frames=True)
+        stats = pipeline.run()
+        processor.finish()
+        segmenter.close_all()
+        print(format_stats(stats))
+        writer.flush(live=live_stats(), pipeline=stats)
+    finally:
+        cap.release()
+
+    VideoAnalysis.objects.filter(id=analysis_id).update(status='completed')
+    events.publish_status(analysis_id, 'completed')
+    return live_stats()
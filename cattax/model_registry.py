@@ -0,0 +1,94 @@
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from . import backends
+from .detection import CatDetector
+from .roi import RegionPlanner
+
+# 进程级模型缓存：{(weights, backend, int8): 模型对象}
+_models = {}
+_load_stats = {}
+_lock = threading.Lock()
+
+
+def default_weights():
+    return backends.resolve_weights()
+
+
+def model_key(weights=None, backend=None, int8=None):
+    """模型缓存键，见 backends.model_spec；参数为 None 时取 settings 中的配置"""
+    return backends.model_spec(weights, backend, int8)
+
+
+def warmup(model, size=(640, 480)):
+    """用一帧空白图像跑一次推理，把首次推理的初始化开销提前付掉"""
+    w, h = size
+    model.predict(np.zeros((h, w, 3), dtype=np.uint8), verbose=False)
+
+
+def get_model(weights=None, backend=None, int8=None):
+    """返回当前进程缓存的模型，首次调用时加载（onnx / openvino 后端必要时先导出）并预热
+
+    Celery prefork 模式下每个 worker 进程各自持有一份模型，进程内任务串行执行，
+    因此多个任务可以复用同一个模型对象。
+    """
+    key = model_key(weights, backend, int8)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            start = time.perf_counter()
+            model = backends.load_model(*key)
+            loaded = time.perf_counter()
+            warmup(model)
+            weights, backend, int8 = key
+            _load_stats[key] = {
+                'weights': weights,
+                'backend': backend,
+                'int8': int8,
+                'load_s': round(loaded - start, 3),
+                'warmup_s': round(time.perf_counter() - loaded, 3),
+            }
+            print(f"Model {weights} ({backend}{', INT8' if int8 else ''}) loaded in {_load_stats[key]['load_s']}s, "
+                  f"warm-up {_load_stats[key]['warmup_s']}s")
+            _models[key] = model
+    return model
+
+
+def register(model, weights=None, backend=None, int8=None):
+    """把已构造的模型放进缓存，之后 get_model / get_detector 直接使用它（例如基准测试的桩模型）"""
+    with _lock:
+        _models[model_key(weights, backend, int8)] = model
+
+
+def is_loaded(weights=None, backend=None, int8=None):
+    return model_key(weights, backend, int8) in _models
+
+
+def load_stats(weights=None, backend=None, int8=None):
+    return dict(_load_stats.get(model_key(weights, backend, int8), {}))
+
+
+def get_detector(weights=None, backend=None, int8=None):
+    """为单个任务创建检测器：共享缓存的模型，但追踪器状态每个任务独立
+
+    追踪器挂在 CatDetector 上而不是模型上，这里再显式 reset 一次，
+    确保 track ID 计数等状态不会从上一个视频带过来。CATTAX_ROI_INFERENCE 开启时使用 ROI 推理。
+    """
+    roi = RegionPlanner() if getattr(settings, 'CATTAX_ROI_INFERENCE', False) else None
+    detector = CatDetector(get_model(weights, backend, int8), roi=roi)
+    detector.reset()
+    return detector
+
+
+def clear():
+    """清空缓存（主要用于基准测试冷启动）"""
+    with _lock:
+        _models.clear()
+        _load_stats.clear()
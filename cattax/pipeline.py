@@ -0,0 +1,257 @@
+import queue
+import threading
+import time
+
+import cv2
+
+from .profiling import NULL_PROFILER
+
+_END = object()  # 流结束标记
+
+
+class StageTimer:
+    """记录单个流水线阶段的耗时"""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds, frames=1):
+        self.count += frames
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def summary(self):
+        return {
+            'frames': self.count,
+            'total_s': round(self.total, 3),
+            'avg_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            'max_ms': round(self.max * 1000, 3),
+        }
+
+
+class BoundedQueue:
+    """带背压和占用统计的有界队列
+
+    put/get 以短超时轮询 stop_event，任一阶段出错或提前结束时其它阶段不会永远阻塞。
+    drop_oldest=True 时队列满了不阻塞生产者，而是丢弃最旧的一项（实时视频源跟不上时丢帧）。
+    """
+
+    def __init__(self, name, maxsize, stop_event, drop_oldest=False):
+        self.name = name
+        self.maxsize = maxsize
+        self.drop_oldest = drop_oldest
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stop = stop_event
+        self.samples = 0
+        self.depth_total = 0
+        self.max_depth = 0
+        self.blocked_puts = 0  # 生产者因队列已满而等待的次数（下游是瓶颈）
+        self.empty_gets = 0    # 消费者因队列为空而等待的次数（上游是瓶颈）
+
+    def put(self, item):
+        depth = self._queue.qsize()
+        self.samples += 1
+        self.depth_total += depth
+        self.max_depth = max(self.max_depth, min(depth + 1, self.maxsize))
+        if depth >= self.maxsize:
+            self.blocked_puts += 1
+        if self.drop_oldest:
+            while True:
+                try:
+                    self._queue.put_nowait(item)
+                    return True
+                except queue.Full:
+                    pass
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self):
+        if self._queue.empty():
+            self.empty_gets += 1
+        while not self._stop.is_set():
+            try:
+                return self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def summary(self):
+        return {
+            'capacity': self.maxsize,
+            'max_depth': self.max_depth,
+            'avg_depth': round(self.depth_total / self.samples, 2) if self.samples else 0.0,
+            'blocked_puts': self.blocked_puts,
+            'empty_gets': self.empty_gets,
+            'dropped': self.dropped,
+        }
+
+
+class FramePipeline:
+    """解码 / 推理 / 标注编码 三阶段流水线
+
+    - 解码线程：cap.read() + resize，写入 decode 队列
+    - 推理阶段（调用线程）：攒够 batch_size 帧后调用 infer(frames)，结果写入 encode 队列
+    - 标注编码线程：按顺序对每帧调用 consume(frame, result)，返回 False 时提前结束；
+      线程退出前调用 on_consumer_exit（例如关闭该线程的数据库连接）
+
+    两个队列都是有界的，推理跟不上时解码线程会被阻塞，内存占用以 queue_size 帧为上限；
+    每个队列只有一个生产者和一个消费者，因此输出帧顺序与输入一致。
+    drop_frames=True 用于实时视频源：解码线程不等待推理，decode 队列满时丢弃最旧的帧。
+    stop_when() 在每批推理完成后调用，返回 True 时不再推理新的帧，已推理的帧仍会全部交给
+    consume，因此推理阶段的状态（追踪器等）与已输出的帧一致，可以从这里继续处理。
+    profiler（StageProfiler）记录解码和缩放的逐帧耗时；code_profiler（CodeProfiler）
+    用于 cProfile 模式下剖析解码和标注编码线程。
+    """
+
+    def __init__(self, cap, size, infer, consume, batch_size=1, queue_size=16, on_consumer_exit=None,
+                 drop_frames=False, stop_when=None, profiler=None, code_profiler=None):
+        self.cap = cap
+        self.size = size
+        self.infer = infer
+        self.consume = consume
+        self.on_consumer_exit = on_consumer_exit
+        self.stop_when = stop_when
+        self.profiler = profiler or NULL_PROFILER
+        self.code_profiler = code_profiler
+        self.batch_size = max(1, int(batch_size))
+        self._stop = threading.Event()
+        self._errors = []
+        self.decode_queue = BoundedQueue('decode', max(queue_size, self.batch_size), self._stop,
+                                         drop_oldest=drop_frames)
+        self.encode_queue = BoundedQueue('encode', max(queue_size, self.batch_size), self._stop)
+        self.timers = {name: StageTimer(name) for name in ('decode', 'infer', 'encode')}
+        self.wall_time = 0.0
+
+    def _guard(self, target):
+        if self.code_profiler is not None:
+            target = self.code_profiler.wrap(target)
+
+        def run():
+            try:
+                target()
+            except BaseException as e:
+                self._errors.append(e)
+                self._stop.set()
+        return run
+
+    def _decode(self):
+        timer = self.timers['decode']
+        try:
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                decoded = time.perf_counter()
+                if self.size is not None:
+                    frame = cv2.resize(frame, self.size)
+                end = time.perf_counter()
+                timer.add(end - start)
+                self.profiler.observe('decode', decoded - start)
+                if self.size is not None:
+                    self.profiler.observe('resize', end - decoded)
+                if not self.decode_queue.put(frame):
+                    break
+        finally:
+            self.decode_queue.put(_END)
+
+    def _infer(self):
+        timer = self.timers['infer']
+        try:
+            ended = False
+            while not ended and not self._stop.is_set():
+                batch = []
+                while len(batch) < self.batch_size:
+                    frame = self.decode_queue.get()
+                    if frame is _END:
+                        ended = True
+                        break
+                    batch.append(frame)
+                if not batch:
+                    break
+
+                start = time.perf_counter()
+                results = self.infer(batch)
+                timer.add(time.perf_counter() - start, len(batch))
+                for item in zip(batch, results):
+                    if not self.encode_queue.put(item):
+                        return
+                if self.stop_when is not None and self.stop_when():
+                    break
+        finally:
+            self.encode_queue.put(_END)
+
+    def _encode(self):
+        timer = self.timers['encode']
+        try:
+            while True:
+                item = self.encode_queue.get()
+                if item is _END:
+                    break
+                start = time.perf_counter()
+                keep_going = self.consume(*item)
+                timer.add(time.perf_counter() - start)
+                if keep_going is False:
+                    # 消费端要求提前结束，通知其它阶段退出
+                    self._stop.set()
+                    break
+        finally:
+            if self.on_consumer_exit is not None:
+                self.on_consumer_exit()
+
+    def run(self):
+        """运行流水线直到视频结束，阶段内的异常会在调用线程重新抛出"""
+        start = time.perf_counter()
+        decoder = threading.Thread(target=self._guard(self._decode), name='pipeline-decode', daemon=True)
+        encoder = threading.Thread(target=self._guard(self._encode), name='pipeline-encode', daemon=True)
+        decoder.start()
+        encoder.start()
+        self._guard(self._infer)()
+        encoder.join()
+        self._stop.set()
+        decoder.join()
+        self.wall_time = time.perf_counter() - start
+
+        if self._errors:
+            raise self._errors[0]
+        return self.stats()
+
+    def stats(self):
+        stages = {name: timer.summary() for name, timer in self.timers.items()}
+        bottleneck = max(self.timers.values(), key=lambda t: t.total).name
+        return {
+            'wall_s': round(self.wall_time, 3),
+            'stages': stages,
+            'queues': {
+                'decode': self.decode_queue.summary(),
+                'encode': self.encode_queue.summary(),
+            },
+            'bottleneck': bottleneck,
+        }
+
+
+def format_stats(stats):
+    """把流水线统计格式化成便于打印的多行文本"""
+    lines = [f"Pipeline wall time: {stats['wall_s']}s, bottleneck: {stats['bottleneck']}"]
+    for name, stage in stats['stages'].items():
+        lines.append(f"  {name:<7} frames={stage['frames']:<6} total={stage['total_s']}s "
+                     f"avg={stage['avg_ms']}ms max={stage['max_ms']}ms")
+    for name, q in stats['queues'].items():
+        lines.append(f"  queue {name:<7} cap={q['capacity']} max={q['max_depth']} avg={q['avg_depth']} "
+                     f"blocked_puts={q['blocked_puts']} empty_gets={q['empty_gets']}"
+                     + (f" dropped={q['dropped']}" if q.get('dropped') else ''))
+    return '\n'.join(lines)
@@ -0,0 +1,320 @@
+import bisect
+import collections
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 处理阶段：解码、缩放、推理、追踪、掩膜/轮廓、摄像机运动估计、行为分析、绘制、编码、写库
+STAGES = ('decode', 'resize', 'inference', 'tracking', 'contour', 'camera_motion', 'behavior', 'draw', 'encode',
+          'db')
+# 直方图桶上界（秒），与 Prometheus histogram 的 le 一致，最后还有一个 +Inf 桶
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+PROFILE_MODES = ('cprofile', 'sample')
+
+
+class Histogram:
+    """固定分桶的耗时直方图，可合并，分位数在桶内线性插值得到"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds, count=1):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += count
+        self.count += count
+        self.sum += seconds * count
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            if n and cumulative + n >= target:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+                return lower + (max(upper, lower) - lower) * (target - cumulative) / n
+            cumulative += n
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'total_s': round(self.sum, 3),
+            'avg_ms': round(self.sum / self.count * 1000, 3) if self.count else 0.0,
+            'p50_ms': round(self.quantile(0.5) * 1000, 3),
+            'p95_ms': round(self.quantile(0.95) * 1000, 3),
+            'p99_ms': round(self.quantile(0.99) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+        }
+
+    def to_dict(self):
+        return {'counts': list(self.counts), 'count': self.count, 'sum': self.sum, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.counts = list(data['counts'])
+        histogram.count = data['count']
+        histogram.sum = data['sum']
+        histogram.max = data['max']
+        return histogram
+
+
+class StageProfiler:
+    """一个任务内各处理阶段的逐帧耗时
+
+    批量操作（推理、追踪）按帧平摊，observe(stage, 总耗时, 帧数) 记为 帧数 个观测值；
+    轮廓和行为分析只在检测帧上发生，每个检测帧记一次；写库按每次写入平摊到写入的帧数。
+    同一阶段只会在流水线的一个线程中记录，因此不需要加锁。enabled=False 时什么也不记录。
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.histograms = {stage: Histogram() for stage in STAGES}
+
+    def observe(self, stage, seconds, frames=1):
+        if self.enabled and frames:
+            self.histograms[stage].observe(seconds / frames, frames)
+
+    @contextlib.contextmanager
+    def stage(self, name, frames=1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, frames)
+
+    def merge(self, other):
+        for stage, histogram in other.histograms.items():
+            self.histograms[stage].merge(histogram)
+
+    def summary(self):
+        """results['perf'] 中的各阶段统计，只包含有观测值的阶段"""
+        stages = {stage: h.summary() for stage, h in self.histograms.items() if h.count}
+        return {
+            'stages': stages,
+            'bottleneck': max(stages, key=lambda stage: stages[stage]['total_s']) if stages else None,
+        }
+
+    def get_state(self):
+        return {stage: h.to_dict() for stage, h in self.histograms.items()}
+
+    def set_state(self, state):
+        for stage, data in state.items():
+            self.histograms[stage] = Histogram.from_dict(data)
+
+
+NULL_PROFILER = StageProfiler(enabled=False)  # 组件未传入 profiler 时使用
+
+
+class CodeProfiler:
+    """单个任务的代码级剖析
+
+    - mode='cprofile'：在每个流水线线程（解码、推理、标注编码）中各运行一个 cProfile，结束后合并写成 .prof
+      （用 pstats / snakeviz 查看）；
+    - mode='sample'：后台线程每隔 interval 秒采样所有线程的调用栈，类似 py-spy，
+      写成 folded stacks 文本（flamegraph.pl / speedscope 可直接打开），开销与调用次数无关。
+    """
+
+    def __init__(self, mode, interval=0.005):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}, expected one of {PROFILE_MODES}")
+        self.mode = mode
+        self.interval = interval
+        self.samples = collections.Counter()
+        self._profiles = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def wrap(self, target):
+        """cprofile 模式下让 target 在所在线程中被剖析"""
+        if self.mode != 'cprofile':
+            return target
+
+        def run():
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                target()
+            finally:
+                profile.disable()
+                with self._lock:
+                    self._profiles.append(profile)
+        return run
+
+    def start(self):
+        """sample 模式下开始采样；cprofile 模式由 wrap() 包装的各线程自行剖析"""
+        if self.mode == 'sample':
+            self._sampler = threading.Thread(target=self._sample, name='profile-sampler', daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def dump(self, path_base):
+        """写出剖析结果，返回文件路径（path_base 加 .prof 或 .folded 扩展名）"""
+        os.makedirs(os.path.dirname(path_base), exist_ok=True)
+        if self.mode == 'cprofile':
+            path = path_base + '.prof'
+            if not self._profiles:
+                return None
+            stats = pstats.Stats(self._profiles[0])
+            for profile in self._profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(path)
+        else:
+            path = path_base + '.folded'
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in self.samples.most_common():
+                    f.write(f"{stack} {count}\n")
+        return path
+
+
+class MetricsRegistry:
+    """进程内累计的指标：各阶段逐帧耗时直方图、处理帧数、任务数和任务耗时
+
+    每个任务结束时 record_job() 合并进来；设置了目录时再写到 <目录>/<pid>.json，
+    由 worker 主进程的 HTTP 服务汇总所有子进程的文件（prefork 下任务在子进程中运行）。
+    """
+
+    def __init__(self):
+        self.stages = StageProfiler()
+        self.frames = 0
+        self.jobs = collections.Counter()
+        self.job_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_job(self, profiler, frames, status, seconds, directory=None):
+        with self._lock:
+            self.stages.merge(profiler)
+            self.frames += frames
+            self.jobs[status] += 1
+            self.job_seconds += seconds
+            data = self.to_dict()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f'{os.getpid()}.json')
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(path + '.tmp', path)
+
+    def to_dict(self):
+        return {
+            'stages': self.stages.get_state(),
+            'frames': self.frames,
+            'jobs': dict(self.jobs),
+            'job_seconds': self.job_seconds,
+        }
+
+    def merge_dict(self, data):
+        other = StageProfiler()
+        other.set_state(data['stages'])
+        self.stages.merge(other)
+        self.frames += data['frames']
+        self.jobs.update(data['jobs'])
+        self.job_seconds += data['job_seconds']
+
+    def render(self):
+        """Prometheus 文本格式"""
+        lines = [
+            '# HELP cattax_stage_seconds Per-frame processing time by pipeline stage.',
+            '# TYPE cattax_stage_seconds histogram',
+        ]
+        for stage, histogram in self.stages.histograms.items():
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f'cattax_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'cattax_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+            lines.append(f'cattax_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        lines += [
+            '# HELP cattax_frames_processed_total Video frames processed.',
+            '# TYPE cattax_frames_processed_total counter',
+            f'cattax_frames_processed_total {self.frames}',
+            '# HELP cattax_jobs_total Video analysis runs by outcome.',
+            '# TYPE cattax_jobs_total counter',
+        ]
+        lines += [f'cattax_jobs_total{{status="{status}"}} {count}' for status, count in sorted(self.jobs.items())]
+        lines += [
+            '# HELP cattax_job_seconds_total Wall time spent in video analysis runs.',
+            '# TYPE cattax_job_seconds_total counter',
+            f'cattax_job_seconds_total {self.job_seconds}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def collect(directory):
+    """汇总目录下各 worker 子进程写出的指标"""
+    total = MetricsRegistry()
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, name), encoding='utf-8') as f:
+                    total.merge_dict(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Skipping metrics file {name}: {str(e)}")
+    return total
+
+
+def serve_metrics(port, directory):
+    """在后台线程中提供 GET /metrics（Prometheus 文本格式），返回 HTTP server"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = collect(directory).render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('', port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
@@ -0,0 +1,167 @@
+import math
+
+import numpy as np
+import torch
+from django.conf import settings
+from ultralytics.engine.results import Masks, Results
+
+
+class RegionMasks(Masks):
+    """由裁剪区域推理得到、已换算到整帧坐标的分割多边形
+
+    只保存多边形（masks.xy），不在整帧大小上重新栅格化掩膜；data 只是占位，保证 len() 和索引可用。
+    """
+
+    def __init__(self, polygons, orig_shape):
+        super().__init__(torch.zeros((len(polygons), 1, 1), dtype=torch.uint8), orig_shape)
+        self.polygons = list(polygons)
+
+    @property
+    def xy(self):
+        return self.polygons
+
+    @property
+    def xyn(self):
+        h, w = self.orig_shape
+        return [polygon / np.array([w, h], dtype=np.float32) for polygon in self.polygons]
+
+    def __getitem__(self, idx):
+        return RegionMasks([self.polygons[i] for i in np.arange(len(self.polygons))[idx].reshape(-1)],
+                           self.orig_shape)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self
+
+
+def merge_regions(regions):
+    """合并相交的区域，直到两两不相交（同一只猫只出现在一个裁剪区域中）"""
+    regions = [list(region) for region in regions]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    regions[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(region) for region in regions]
+
+
+class RegionPlanner:
+    """追踪感知的 ROI 推理：决定每帧做整帧检测还是只检测上一次猫所在的区域
+
+    以下情况做整帧检测（keyframe scan）：还没有已知的猫、距上次整帧检测已有 rescan_frames 个检测帧
+    （发现新进入画面的猫）、上一个 ROI 帧有猫跟丢。其余帧只在上一次追踪框四周各扩展
+    padding 倍框宽 / 框高（且不小于 min_size）的区域内检测，相交的区域合并。
+    批量推理时一批帧的区域都按这一批之前的追踪结果规划，跟丢要到下一批才触发整帧检测。
+    """
+
+    def __init__(self, rescan_frames=None, padding=None, min_size=None):
+        if rescan_frames is None:
+            rescan_frames = getattr(settings, 'CATTAX_ROI_RESCAN_FRAMES', 30)
+        if padding is None:
+            padding = getattr(settings, 'CATTAX_ROI_PADDING', 0.5)
+        if min_size is None:
+            min_size = getattr(settings, 'CATTAX_ROI_MIN_SIZE', 96)
+        self.rescan_frames = max(1, int(rescan_frames))
+        self.padding = padding
+        self.min_size = min_size
+        self.reset()
+
+    def reset(self):
+        """清空追踪框和统计（切换视频时）"""
+        self.boxes = []         # 上一个检测帧的追踪框 (x0, y0, x1, y1)
+        self.since_full = None  # 距上次整帧检测的帧数，None 表示还没有做过
+        self.lost = False
+        self.full_frames = 0
+        self.region_frames = 0
+        self.region_pixels = 0
+        self.frame_pixels = 0
+
+    def get_state(self):
+        return {
+            'boxes': list(self.boxes),
+            'since_full': self.since_full,
+            'lost': self.lost,
+            'full_frames': self.full_frames,
+            'region_frames': self.region_frames,
+            'region_pixels': self.region_pixels,
+            'frame_pixels': self.frame_pixels,
+        }
+
+    def set_state(self, state):
+        for key, value in state.items():
+            setattr(self, key, value)
+
+    def plan(self, frame_shape):
+        """返回这一帧要检测的区域列表 [(x0, y0, x1, y1)]，None 表示整帧检测"""
+        h, w = frame_shape[:2]
+        self.frame_pixels += w * h
+        if not self.boxes or self.lost or self.since_full is None or self.since_full + 1 >= self.rescan_frames:
+            self.since_full = 0
+            self.full_frames += 1
+            self.region_pixels += w * h
+            return None
+        self.since_full += 1
+
+        regions = []
+        for x0, y0, x1, y1 in self.boxes:
+            pad_x = max((x1 - x0) * self.padding, (self.min_size - (x1 - x0)) / 2, 0)
+            pad_y = max((y1 - y0) * self.padding, (self.min_size - (y1 - y0)) / 2, 0)
+            regions.append((max(0, int(x0 - pad_x)), max(0, int(y0 - pad_y)),
+                            min(w, int(math.ceil(x1 + pad_x))), min(h, int(math.ceil(y1 + pad_y)))))
+        regions = merge_regions(regions)
+        self.region_frames += 1
+        self.region_pixels += sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in regions)
+        return regions
+
+    def update(self, boxes, regions):
+        """关联后反馈这一帧的追踪框；ROI 帧中追踪到的猫比之前少时下一帧做整帧检测"""
+        boxes = [tuple(float(v) for v in box) for box in boxes]
+        self.lost = regions is not None and len(boxes) < len(self.boxes)
+        self.boxes = boxes
+
+    def stats(self):
+        frames = self.full_frames + self.region_frames
+        return {
+            'full_frames': self.full_frames,
+            'region_frames': self.region_frames,
+            'pixel_ratio': round(self.region_pixels / self.frame_pixels, 4) if self.frame_pixels else 1.0,
+            'rescan_frames': self.rescan_frames,
+            'region_ratio': round(self.region_frames / frames, 4) if frames else 0.0,
+        }
+
+
+def region_imgsz(regions, frame_shape, imgsz, stride=32):
+    """裁剪区域的推理尺寸：与整帧推理时猫的缩放比例相同（整帧长边缩放到 imgsz），向上取整到 stride"""
+    h, w = frame_shape[:2]
+    scale = min(1.0, imgsz / max(h, w))
+    side = max(max(x1 - x0, y1 - y0) for x0, y0, x1, y1 in regions)
+    return int(min(imgsz, max(stride, math.ceil(side * scale / stride) * stride)))
+
+
+def region_result(frame, crop_results, regions, names):
+    """把同一帧各裁剪区域的检测结果换算回整帧坐标，合成一个 Results"""
+    boxes, polygons = [], []
+    for result, (x0, y0, _, _) in zip(crop_results, regions):
+        if result.boxes is None or not len(result.boxes):
+            continue
+        data = result.boxes.data.clone().cpu()
+        data[:, [0, 2]] += x0
+        data[:, [1, 3]] += y0
+        boxes.append(data)
+        offset = np.array([x0, y0], dtype=np.float32)
+        polygons.extend(np.asarray(polygon, dtype=np.float32) + offset for polygon in result.masks.xy)
+    merged = Results(frame, 'region.jpg', names,
+                     boxes=torch.cat(boxes) if boxes else torch.zeros((0, 6), dtype=torch.float32))
+    if polygons:
+        merged.masks = RegionMasks(polygons, frame.shape[:2])
+    return merged
@@ -0,0 +1,210 @@
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+from .cat_behavior import CatBehavior
+
+
+class AdaptiveSampler:
+    """自适应抽帧：猫咪都在休息且画面静止时降低检测频率
+
+    - 推理阶段调用 select(frames) 决定哪些帧需要跑检测；
+    - 标注阶段在每个检测帧分析完行为后调用 update(behaviors) 反馈行为状态。
+
+    只有当所有猫都处于 RESTING、行为与上一个检测帧相同、且画面与上一个检测帧相比
+    基本没有变化时，才会每 max_skip 帧检测一次；否则逐帧检测。
+    max_skip <= 1 时等价于逐帧检测。
+
+    两个阶段在不同线程上运行，反馈的滞后固定为 feedback_lag 批：第 n 批使用第 n-1-feedback_lag 批
+    （含）之前所有检测帧反馈后的行为状态，反馈没到时推理线程等待。因此同一个视频每次选出的检测帧相同，
+    与队列的填充程度无关；feedback_lag=0 时推理和标注不再重叠，越大等待越少但对行为变化的反应越慢。
+    标注线程提前退出时要调用 close()，避免推理线程一直等待。
+    """
+
+    def __init__(self, max_skip=1, motion_threshold=4.0, thumb_size=(64, 36), feedback_lag=1):
+        self.max_skip = max(1, int(max_skip))
+        self.motion_threshold = motion_threshold
+        self.thumb_size = thumb_size
+        self.feedback_lag = max(0, int(feedback_lag))
+        self.resting = False
+        self._last_behaviors = None
+        self._last_thumb = None
+        self._since_detect = 0
+        self.detected_frames = 0
+        self.skipped_frames = 0
+        # 批次边界处的反馈：_boundaries[i] 是第 _first+i 批的检测帧都反馈后的 resting，
+        # 选帧用过的更早边界会丢弃
+        self._cond = threading.Condition()
+        self._closed = False
+        self._initial_resting = False
+        self._batches = 0
+        self._first = 0
+        self._boundaries = deque()
+        self._batch_ends = deque()  # 还没记录边界的批次结束时，本次运行累计选出的检测帧数
+        self._selected = 0
+        self._received = 0
+
+    @property
+    def enabled(self):
+        return self.max_skip > 1
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, self.thumb_size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+    def _scene_changed(self, thumb):
+        if self._last_thumb is None:
+            return True
+        return float(np.mean(np.abs(thumb - self._last_thumb))) > self.motion_threshold
+
+    def _record_boundaries(self):
+        # 调用方持有 _cond：检测帧都已反馈的批次记下当时的 resting
+        while self._batch_ends and self._batch_ends[0] <= self._received:
+            self._batch_ends.popleft()
+            self._boundaries.append(self.resting)
+        self._cond.notify_all()
+
+    def _feedback_for(self, batch):
+        """第 batch 批选帧时使用的 resting，等待标注线程反馈到第 batch-1-feedback_lag 批"""
+        index = batch - 1 - self.feedback_lag
+        if index < 0:
+            return self._initial_resting
+        with self._cond:
+            while self._first + len(self._boundaries) <= index and not self._closed:
+                self._cond.wait()
+            if index < self._first:
+                # 检查点来自不同 feedback_lag 的运行时缺少更早的边界
+                return self._initial_resting
+            if index >= self._first + len(self._boundaries):
+                return self.resting
+            # 之后的批次和检查点只会用到这一批及以后的边界
+            while self._first < index:
+                self._boundaries.popleft()
+                self._first += 1
+            return self._boundaries[0]
+
+    def select(self, frames):
+        """返回与 frames 等长的布尔列表，True 表示该帧需要检测"""
+        if not self.enabled:
+            self.detected_frames += len(frames)
+            return [True] * len(frames)
+
+        resting = self._feedback_for(self._batches)
+        flags = []
+        for frame in frames:
+            thumb = self._thumbnail(frame)
+            detect = (not resting
+                      or self._since_detect + 1 >= self.max_skip
+                      or self._scene_changed(thumb))
+            if detect:
+                self._last_thumb = thumb
+                self._since_detect = 0
+                self.detected_frames += 1
+            else:
+                self._since_detect += 1
+                self.skipped_frames += 1
+            flags.append(detect)
+
+        with self._cond:
+            self._batches += 1
+            self._selected += sum(flags)
+            self._batch_ends.append(self._selected)
+            self._record_boundaries()
+        return flags
+
+    def get_state(self):
+        state = {
+            'last_thumb': self._last_thumb,
+            'since_detect': self._since_detect,
+            'detected_frames': self.detected_frames,
+            'skipped_frames': self.skipped_frames,
+            'batches': self._batches,
+        }
+        state.update(self.feedback_state(self._batches))
+        return state
+
+    def feedback_state(self, batches):
+        """标注线程一侧的状态，在标注线程输出完前 batches 批之后调用（例如保存检查点时）"""
+        with self._cond:
+            # 之后没有检测帧的批次可能也已记录，只取前 batches 批的最后 feedback_lag+1 个边界
+            end = batches - self._first
+            return {
+                'resting': self.resting,
+                'last_behaviors': self._last_behaviors,
+                'feedback': list(self._boundaries)[max(0, end - self.feedback_lag - 1):max(0, end)],
+            }
+
+    def set_state(self, state):
+        self.resting = self._initial_resting = state['resting']
+        self._last_behaviors = state['last_behaviors']
+        self._last_thumb = state['last_thumb']
+        self._since_detect = state['since_detect']
+        self.detected_frames = state['detected_frames']
+        self.skipped_frames = state['skipped_frames']
+        # 旧检查点没有批次边界，从恢复点开始按初始状态计
+        feedback = state.get('feedback', [])
+        self._boundaries = deque(feedback)
+        self._batches = state.get('batches', len(feedback))
+        self._first = self._batches - len(feedback)
+        self._batch_ends.clear()
+        self._selected = self._received = 0
+
+    def update(self, behaviors):
+        """标注阶段反馈检测帧的行为 {cat_id: CatBehavior}"""
+        behaviors = dict(behaviors)
+        with self._cond:
+            self.resting = (all(b == CatBehavior.RESTING for b in behaviors.values())
+                            and behaviors == self._last_behaviors)
+            self._last_behaviors = behaviors
+            self._received += 1
+            self._record_boundaries()
+
+    def close(self):
+        """标注线程退出：不再等待反馈"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def wrap(self, track):
+        """包装 detector.track：只对选中的帧推理，未选中的帧结果为 None"""
+        def infer(frames):
+            flags = self.select(frames)
+            detected = iter(track([f for f, d in zip(frames, flags) if d]))
+            return [next(detected) if d else None for d in flags]
+        return infer
+
+    def stats(self):
+        total = self.detected_frames + self.skipped_frames
+        return {
+            'max_skip': self.max_skip,
+            'detected_frames': self.detected_frames,
+            'skipped_frames': self.skipped_frames,
+            'detect_ratio': round(self.detected_frames / total, 4) if total else 1.0,
+        }
+
+
+def interpolate_detections(prev, nxt, steps):
+    """在两个检测帧之间为 steps 个被跳过的帧插值
+
+    prev / nxt 为检测结果列表，每个元素至少包含 'cat_id' 和 'position'。
+    两端都出现的猫线性插值位置，只在 prev 出现的猫保持原位；行为沿用 prev 的标签。
+    返回长度为 steps 的列表，每个元素是 [(detection, (dx, dy)), ...]，
+    (dx, dy) 是相对 prev 位置的偏移，便于平移绘制轮廓。
+    """
+    next_positions = {det['cat_id']: det['position'] for det in nxt or []}
+    frames = []
+    for i in range(1, steps + 1):
+        t = i / (steps + 1)
+        current = []
+        for det in prev:
+            px, py = det['position']
+            if det['cat_id'] in next_positions:
+                nx, ny = next_positions[det['cat_id']]
+                offset = (int(round((nx - px) * t)), int(round((ny - py) * t)))
+            else:
+                offset = (0, 0)
+            current.append((det, offset))
+        frames.append(current)
+    return frames
@@ -56,6 +56,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'cattax.wsgi.application'
+ASGI_APPLICATION = 'cattax.asgi.application'
 
 DATABASES = {
     'default': {
@@ -81,6 +82,71 @@ CELERY_RESULT_SERIALIZER = 'json'
 
 sys.path.append(os.path.join(BASE_DIR))
 
+# 视频处理设置
+CATTAX_MODEL_WEIGHTS = os.getenv('CATTAX_MODEL_WEIGHTS', 'yolo11x-seg.pt')
+CATTAX_MODEL_SIZE = os.getenv('CATTAX_MODEL_SIZE', '')  # n/s/m/l/x，设置后使用 yolo11{size}-seg.pt 代替 CATTAX_MODEL_WEIGHTS
+CATTAX_INFERENCE_BACKEND = os.getenv('CATTAX_INFERENCE_BACKEND', 'torch')  # torch / onnx（onnxruntime）/ openvino，未安装时回退到 torch
+CATTAX_MODEL_INT8 = os.getenv('CATTAX_MODEL_INT8', 'False') == 'True'  # onnx / openvino 后端使用 INT8 量化模型
+CATTAX_EXPORT_DIR = os.getenv('CATTAX_EXPORT_DIR', os.path.join(BASE_DIR, 'models'))  # 导出的 ONNX / OpenVINO 模型缓存目录
+CATTAX_INT8_CALIBRATION_DATA = os.getenv('CATTAX_INT8_CALIBRATION_DATA', '')  # OpenVINO INT8 校准数据集 yaml，留空使用 coco8-seg
+CATTAX_PRELOAD_MODEL = os.getenv('CATTAX_PRELOAD_MODEL', 'True') == 'True'  # worker 进程启动时预加载模型
+CATTAX_BATCH_SIZE = int(os.getenv('CATTAX_BATCH_SIZE', 1))  # 每次送入模型的帧数
+CATTAX_QUEUE_SIZE = int(os.getenv('CATTAX_QUEUE_SIZE', 16))  # 解码/编码队列最多缓存的帧数
+CATTAX_RENDER_MODE = os.getenv('CATTAX_RENDER_MODE', 'headless')  # preview：预览窗口 + 标注视频；headless：只输出标注视频；analysis：不绘制不编码
+CATTAX_MAX_FRAME_SKIP = int(os.getenv('CATTAX_MAX_FRAME_SKIP', 1))  # 自适应抽帧的最大步长，1 表示逐帧检测
+CATTAX_SAMPLING_MOTION_THRESHOLD = float(os.getenv('CATTAX_SAMPLING_MOTION_THRESHOLD', 4.0))  # 画面变化阈值（灰度均值差）
+CATTAX_SAMPLING_FEEDBACK_LAG = int(os.getenv('CATTAX_SAMPLING_FEEDBACK_LAG', 1))  # 抽帧使用几批之前的行为反馈，固定滞后使结果可复现
+CATTAX_CHUNK_FRAMES = int(os.getenv('CATTAX_CHUNK_FRAMES', 0))  # 超过该帧数的视频分段并行处理，0 表示不分段
+CATTAX_CHUNK_OVERLAP = int(os.getenv('CATTAX_CHUNK_OVERLAP', 30))  # 相邻分段重叠的帧数，用于对齐 track ID
+CATTAX_CHUNK_MATCH_DISTANCE = float(os.getenv('CATTAX_CHUNK_MATCH_DISTANCE', 40))  # 重叠区间内匹配同一只猫的最大距离（像素）
+CATTAX_RESULTS_FLUSH_FRAMES = int(os.getenv('CATTAX_RESULTS_FLUSH_FRAMES', 100))  # 逐帧结果每多少帧落库一次
+CATTAX_RESULTS_FLUSH_SECONDS = float(os.getenv('CATTAX_RESULTS_FLUSH_SECONDS', 2.0))  # 或每隔多少秒落库一次
+CATTAX_STORE_FRAME_RESULTS = os.getenv('CATTAX_STORE_FRAME_RESULTS', 'True') == 'True'  # 是否保存逐帧结果分块，False 时只保存行为时间线
+CATTAX_TIMELINE_MAX_GAP_SECONDS = float(os.getenv('CATTAX_TIMELINE_MAX_GAP_SECONDS', 0.5))  # 视频中猫漏检不超过该时长时不拆分行为区间
+CATTAX_TIMELINE_POSITION_STEP = int(os.getenv('CATTAX_TIMELINE_POSITION_STEP', 10))  # 行为区间内每隔多少帧保存一次位置
+CATTAX_EVENTS_URL = os.getenv('CATTAX_EVENTS_URL', CELERY_BROKER_URL)  # 进度事件的发布/订阅地址，memory:// 为进程内代理，留空关闭推送
+CATTAX_EVENTS_INTERVAL = float(os.getenv('CATTAX_EVENTS_INTERVAL', 0.5))  # 逐帧事件最短推送间隔（秒）
+CATTAX_EVENTS_HEARTBEAT = float(os.getenv('CATTAX_EVENTS_HEARTBEAT', 15))  # 事件流空闲时的保活间隔（秒）
+CATTAX_UPLOAD_CHUNK_SIZE = int(os.getenv('CATTAX_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))  # 分块上传建议的块大小（字节）
+CATTAX_UPLOAD_EARLY_START_BYTES = int(os.getenv('CATTAX_UPLOAD_EARLY_START_BYTES', 16 * 1024 * 1024))  # 已上传多少字节后提前开始处理，0 表示等上传完成
+CATTAX_UPLOAD_STALL_SECONDS = float(os.getenv('CATTAX_UPLOAD_STALL_SECONDS', 600))  # 边上传边处理时文件多久不增长视为上传中断
+CATTAX_STREAM_MAX_GAP_SECONDS = float(os.getenv('CATTAX_STREAM_MAX_GAP_SECONDS', 2.0))  # 实时流中猫消失超过该时长就结束它的行为区间
+CATTAX_STREAM_MAX_SEGMENT_SECONDS = float(os.getenv('CATTAX_STREAM_MAX_SEGMENT_SECONDS', 600))  # 实时流中行为区间的最长时长，超过后拆成新的区间，0 表示不拆分
+CATTAX_STREAM_FLUSH_SECONDS = float(os.getenv('CATTAX_STREAM_FLUSH_SECONDS', 10.0))  # 实时流行为区间的写库间隔（秒）
+CATTAX_STREAM_STALE_SECONDS = float(os.getenv('CATTAX_STREAM_STALE_SECONDS', 300))  # 实时流超过该时长没有写入（心跳）视为 worker 已退出，标记为失败
+CATTAX_STREAM_RECONNECT_ATTEMPTS = int(os.getenv('CATTAX_STREAM_RECONNECT_ATTEMPTS', 5))  # 网络流断开后的重连次数
+CATTAX_STREAM_ALLOW_FILES = os.getenv('CATTAX_STREAM_ALLOW_FILES', 'False') == 'True'  # 允许把服务器本地文件当作实时流（测试用）
+CATTAX_SCHEDULER_FRAMES_PER_SECOND = float(os.getenv('CATTAX_SCHEDULER_FRAMES_PER_SECOND', 10.0))  # 估算任务时长用的 720p 处理吞吐（帧/秒）
+CATTAX_SCHEDULER_BYTES_PER_FRAME = int(os.getenv('CATTAX_SCHEDULER_BYTES_PER_FRAME', 12500))  # 读不出 MP4 头时按文件大小估算帧数用的每帧字节数（约 720p 25fps 2.5Mbps）
+CATTAX_SHORT_JOB_SECONDS = float(os.getenv('CATTAX_SHORT_JOB_SECONDS', 120))  # 估算时长不超过该值的任务进 short 队列
+CATTAX_SHORT_QUEUE_SLOTS = int(os.getenv('CATTAX_SHORT_QUEUE_SLOTS', 2))  # short 队列同时运行的任务数，通常等于消费它的 worker 进程数，0 表示不限
+CATTAX_LONG_QUEUE_SLOTS = int(os.getenv('CATTAX_LONG_QUEUE_SLOTS', 2))  # long 队列同时运行的任务数，0 表示不限
+CATTAX_MAX_ACTIVE_JOBS_PER_CLIENT = int(os.getenv('CATTAX_MAX_ACTIVE_JOBS_PER_CLIENT', 1))  # 同一客户端在每个队列中同时运行的任务数，0 表示不限
+CATTAX_JOB_STALE_SECONDS = float(os.getenv('CATTAX_JOB_STALE_SECONDS', 3600))  # 处理中的视频任务超过该时长没有心跳时重新排队，应大于任务硬超时（30 分钟）
+CATTAX_LONG_JOB_TIME_SLICE = float(os.getenv('CATTAX_LONG_JOB_TIME_SLICE', 600))  # long 任务每次运行的秒数，到时保存检查点并重新排队，0 表示不切片
+CATTAX_CHECKPOINT_SECONDS = float(os.getenv('CATTAX_CHECKPOINT_SECONDS', 60))  # 处理中每隔多少秒保存一次检查点，0 表示只在切片时保存
+CATTAX_TIME_LIMIT_MARGIN = float(os.getenv('CATTAX_TIME_LIMIT_MARGIN', 120))  # 距 Celery 硬超时还剩多少秒时保存检查点并重新排队
+CATTAX_PROFILE_STAGES = os.getenv('CATTAX_PROFILE_STAGES', 'True') == 'True'  # 统计各处理阶段的逐帧耗时，写入 results['perf'] 和 worker 指标
+CATTAX_PROFILER = os.getenv('CATTAX_PROFILER', '')  # 代码级剖析：cprofile / sample（调用栈采样），空表示关闭，结果写到 media/profiles/
+CATTAX_PROFILE_SAMPLE_INTERVAL = float(os.getenv('CATTAX_PROFILE_SAMPLE_INTERVAL', 0.005))  # sample 模式的采样间隔（秒）
+CATTAX_METRICS_PORT = int(os.getenv('CATTAX_METRICS_PORT', 0))  # worker 提供 Prometheus /metrics 的端口，0 表示关闭
+CATTAX_METRICS_DIR = os.getenv('CATTAX_METRICS_DIR', os.path.join(BASE_DIR, 'metrics'))  # worker 子进程写出指标的目录，由主进程汇总
+CATTAX_STORE_DETECTIONS = os.getenv('CATTAX_STORE_DETECTIONS', 'True') == 'True'  # 把检测帧的原始追踪结果写到 media/detections/，调整行为阈值后可不跑模型重新分析
+CATTAX_DETECTIONS_CHUNK_FRAMES = int(os.getenv('CATTAX_DETECTIONS_CHUNK_FRAMES', 1000))  # 检测旁路文件每块包含的检测帧数
+CATTAX_ROI_INFERENCE = os.getenv('CATTAX_ROI_INFERENCE', 'False') == 'True'  # ROI 推理：两次整帧检测之间只检测上一次猫所在的区域
+CATTAX_ROI_RESCAN_FRAMES = int(os.getenv('CATTAX_ROI_RESCAN_FRAMES', 30))  # ROI 推理时每隔多少个检测帧做一次整帧检测（发现新进入画面的猫）
+CATTAX_ROI_PADDING = float(os.getenv('CATTAX_ROI_PADDING', 0.5))  # ROI 区域在追踪框四周各扩展的比例（相对框宽 / 框高）
+CATTAX_ROI_MIN_SIZE = int(os.getenv('CATTAX_ROI_MIN_SIZE', 96))  # ROI 区域的最小边长（像素，处理分辨率下）
+CATTAX_CAMERA_MOTION = os.getenv('CATTAX_CAMERA_MOTION', 'True') == 'True'  # 估计摄像机（手持拍摄）的全局运动，行为分析中的位移按相对背景计算
+CATTAX_CAMERA_MOTION_WIDTH = int(os.getenv('CATTAX_CAMERA_MOTION_WIDTH', 320))  # 摄像机运动估计时灰度图缩小到的宽度
+CATTAX_CAMERA_MOTION_CORNERS = int(os.getenv('CATTAX_CAMERA_MOTION_CORNERS', 60))  # 摄像机运动估计每帧跟踪的背景角点数上限
+CATTAX_TRACK_MAX_AGE = int(os.getenv('CATTAX_TRACK_MAX_AGE', 60))  # 行为分析中超过多少个检测帧没出现的猫丢弃其状态，应大于追踪器的 track_buffer，0 表示不丢弃
+CATTAX_INTERACTIONS = os.getenv('CATTAX_INTERACTIONS', 'True') == 'True'  # 逐帧检测猫之间的接近和互动，按猫对汇总到结果中
+CATTAX_INTERACTION_DISTANCE = float(os.getenv('CATTAX_INTERACTION_DISTANCE', 100))  # 两只猫中心距离不超过多少像素（处理分辨率）算接近
+CATTAX_INTERACTION_MIN_FRAMES = int(os.getenv('CATTAX_INTERACTION_MIN_FRAMES', 12))  # 同一对猫连续接近多少帧算一次互动
+CATTAX_CACHE_MAX_BYTES = int(os.getenv('CATTAX_CACHE_MAX_BYTES', 0))  # 上传和输出视频总大小上限，超出后按 LRU 淘汰，0 表示不限
+CATTAX_CACHE_MAX_ENTRIES = int(os.getenv('CATTAX_CACHE_MAX_ENTRIES', 0))  # 保留的已结束分析条数上限，0 表示不限
+
 # 添加 CORS 设置
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
@@ -0,0 +1,268 @@
+import time
+from unittest import mock
+
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+from . import cat_behavior
+from .camera_motion import CameraMotionEstimator
+from .cat_behavior import BEHAVIOR_CODES, CatBehavior, CatBehaviorAnalyzer, contour_features
+from .contours import ContourExtractor, extract_contour_full_frame
+from .pipeline import FramePipeline
+from .sampling import AdaptiveSampler
+from .timeline import BehaviorSegmenter
+
+CONTOUR = cv2.ellipse2Poly((0, 0), (36, 18), 0, 0, 360, 20).reshape(-1, 1, 2)
+
+
+def contour_at(position):
+    return CONTOUR + np.array(position, dtype=np.int32)
+
+
+class CatBehaviorAnalyzerEvictionTests(SimpleTestCase):
+    def test_analyze_behavior_evicts_stale_cats(self):
+        analyzer = CatBehaviorAnalyzer(max_age=3)
+        analyzer.analyze_behavior(1, contour_at((100, 100)), (100, 100), None)
+        analyzer.analyze_behavior(2, contour_at((300, 100)), (300, 100), None)
+        # 之后只有猫 1 出现：每次调用都是新的一帧
+        for _ in range(3):
+            analyzer.analyze_behavior(1, contour_at((100, 100)), (100, 100), None)
+        self.assertEqual(analyzer.frame_count, 3)
+        self.assertIn(2, analyzer.prev_positions)
+
+        analyzer.analyze_behavior(1, contour_at((100, 100)), (100, 100), None)
+        self.assertEqual(analyzer.frame_count, 4)
+        self.assertEqual(list(analyzer.last_seen), [1])
+        self.assertNotIn(2, analyzer.prev_positions)
+        self.assertNotIn(2, analyzer.behavior_history)
+
+    def test_analyze_behavior_counts_one_frame_per_image(self):
+        analyzer = CatBehaviorAnalyzer(max_age=2)
+        for _ in range(3):
+            frame = np.zeros((4, 4, 3), dtype=np.uint8)
+            analyzer.analyze_behavior(1, contour_at((100, 100)), (100, 100), frame)
+            analyzer.analyze_behavior(1, contour_at((110, 100)), (110, 100), frame)
+        self.assertEqual(analyzer.frame_count, 3)
+
+    def test_analyze_behavior_matches_analyze_batch(self):
+        frames = [([1, 2], [(100, 100), (300, 100)])] + [([1], [(100 + 5 * i, 100)]) for i in range(5)]
+        per_call = CatBehaviorAnalyzer(max_age=3)
+        batch = CatBehaviorAnalyzer(max_age=3)
+        for cat_ids, positions in frames:
+            for cat_id, position in zip(cat_ids, positions):
+                per_call.analyze_behavior(cat_id, contour_at(position), position, None)
+            batch.analyze_batch(cat_ids, [contour_at(position) for position in positions], positions)
+        self.assertEqual(list(per_call.last_seen), list(batch.last_seen))
+        self.assertEqual(per_call.prev_positions, batch.prev_positions)
+
+    def test_analyze_batch_matches_analyze_behavior_features(self):
+        shapes = {
+            1: cv2.ellipse2Poly((0, 0), (30, 28), 0, 0, 360, 15),   # 圆润：休息
+            2: cv2.ellipse2Poly((0, 0), (50, 14), 0, 0, 360, 15),   # 细长：走动时为 walking
+            3: cv2.ellipse2Poly((0, 0), (12, 40), 0, 0, 360, 15),   # 竖直：站立
+            4: cv2.ellipse2Poly((0, 0), (40, 20), 30, 0, 360, 10),
+        }
+        broken = np.zeros((0, 1, 2), dtype=np.int32)  # 特征计算失败，记为 UNKNOWN
+
+        def detections(i):
+            rows = [(1, (100 + i % 2, 100)), (2, (100 + 30 * i, 300)), (3, (400, 200 + 3 * i))]
+            if i % 3 == 0:
+                rows.append((4, (500 - 40 * i, 50)))
+            if i == 4:
+                rows.append((2, (250, 300)))  # 同一帧中重复的 cat_id
+            cat_ids = [cat_id for cat_id, _ in rows]
+            contours = [shapes[cat_id].reshape(-1, 1, 2) + np.array(position, dtype=np.int32)
+                        for cat_id, position in rows]
+            if i == 5:
+                contours[2] = broken
+            return cat_ids, contours, [position for _, position in rows]
+
+        per_call = CatBehaviorAnalyzer(max_age=4)
+        batch = CatBehaviorAnalyzer(max_age=4)
+        classify = mock.Mock(wraps=cat_behavior.classify_behavior)
+        seen = set()
+        for i in range(12):
+            cat_ids, contours, positions = detections(i)
+            frame = np.zeros((4, 4, 3), dtype=np.uint8)
+            classify.reset_mock()
+            with mock.patch.object(cat_behavior, 'classify_behavior', classify):
+                behaviors = [per_call.analyze_behavior(cat_id, contour, position, frame)
+                             for cat_id, contour, position in zip(cat_ids, contours, positions)]
+            features, codes = batch.analyze_batch(cat_ids, contours, positions)
+
+            self.assertEqual([BEHAVIOR_CODES[code] for code in codes], behaviors)
+            seen.update(behaviors)
+            # analyze_behavior 用于分类的特征（跳过特征计算失败的行）与批量接口的特征列一致
+            valid = [k for k, behavior in enumerate(behaviors) if behavior != CatBehavior.UNKNOWN]
+            self.assertEqual([c.args[:4] for c in classify.call_args_list],
+                             [(bool(features[k, 5] > batch.thresholds['movement']),
+                               features[k, 0], features[k, 3], features[k, 4]) for k in valid])
+            for k in valid:
+                self.assertEqual(tuple(features[k, :5]), cat_behavior.contour_features(contours[k]))
+            self.assertTrue(np.isnan(features[[k for k in range(len(cat_ids)) if k not in valid]]).all())
+
+        self.assertEqual(seen, set(CatBehavior))
+        self.assertEqual(per_call.get_state(), batch.get_state())
+
+
+class BehaviorSegmenterTests(SimpleTestCase):
+    def test_long_segments_are_split_to_bound_open_track(self):
+        segments = []
+        segmenter = BehaviorSegmenter(segments.append, position_step=10, max_frames=100)
+        for frame_index in range(1000):
+            segmenter.update(frame_index, [{'cat_id': 1, 'behavior': 'resting', 'position': (50, 60)}])
+            self.assertLessEqual(len(segmenter.open_segments[1]['track']), 10)
+        segmenter.close_all()
+
+        self.assertEqual(len(segments), 10)
+        self.assertEqual([(s['start_frame'], s['end_frame']) for s in segments],
+                         [(i, i + 100) for i in range(0, 1000, 100)])
+        self.assertEqual(sum(s['frames'] for s in segments), 1000)
+        self.assertTrue(all(s['behavior'] == 'resting' for s in segments))
+
+    def test_segments_are_not_split_by_default(self):
+        segments = []
+        segmenter = BehaviorSegmenter(segments.append, position_step=10)
+        for frame_index in range(1000):
+            segmenter.update(frame_index, [{'cat_id': 1, 'behavior': 'resting', 'position': (50, 60)}])
+        segmenter.close_all()
+        self.assertEqual([(s['start_frame'], s['end_frame']) for s in segments], [(0, 1000)])
+
+
+class IndexedCapture:
+    """静止画面，帧序号写在左上角两个像素里（对缩略图的影响远小于运动阈值）"""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.index = 0
+
+    def read(self):
+        if self.index >= self.frames:
+            return False, None
+        frame = np.zeros((36, 64, 3), dtype=np.uint8)
+        frame[0, 0, 0], frame[0, 1, 0] = self.index % 256, self.index // 256
+        self.index += 1
+        return True, frame
+
+
+def frame_index(frame):
+    return int(frame[0, 0, 0]) + 256 * int(frame[0, 1, 0])
+
+
+class AdaptiveSamplerFeedbackTests(SimpleTestCase):
+    WALKING = set(range(40, 46)) | set(range(120, 123))
+
+    def run_pipeline(self, infer_delay=0.0, consume_delay=0.0, frames=200, stop_at=None):
+        sampler = AdaptiveSampler(max_skip=5, feedback_lag=1)
+        detected = []
+
+        def track(batch):
+            time.sleep(infer_delay)
+            detected.extend(frame_index(frame) for frame in batch)
+            return [frame_index(frame) for frame in batch]
+
+        def consume(frame, result):
+            time.sleep(consume_delay)
+            if result is not None:
+                behavior = CatBehavior.WALKING if result in self.WALKING else CatBehavior.RESTING
+                sampler.update({1: behavior})
+            return stop_at is None or frame_index(frame) < stop_at
+
+        pipeline = FramePipeline(IndexedCapture(frames), None, sampler.wrap(track), consume,
+                                 batch_size=4, queue_size=8, on_consumer_exit=sampler.close)
+        pipeline.run()
+        return detected
+
+    def test_keyframes_do_not_depend_on_queue_fill(self):
+        expected = self.run_pipeline()
+        # 标注慢时推理线程领先、队列堆满；推理慢时标注线程总是追上
+        self.assertEqual(self.run_pipeline(consume_delay=0.001), expected)
+        self.assertEqual(self.run_pipeline(infer_delay=0.002), expected)
+        self.assertLess(len(expected), 150)
+        # 第 42 帧（第 10 批）检测到走动，滞后一批后第 12 批起逐帧检测
+        self.assertNotIn(45, expected)
+        self.assertTrue(set(range(48, 56)) <= set(expected))
+
+    def test_state_restores_pending_feedback(self):
+        sampler = AdaptiveSampler(max_skip=5, feedback_lag=1)
+        frames = [IndexedCapture(1).read()[1]] * 4
+        for _ in range(3):
+            sampler.select(frames)
+            for _ in range(4):
+                sampler.update({1: CatBehavior.RESTING})
+        state = sampler.get_state()
+        self.assertEqual((state['batches'], state['feedback']), (3, [True, True]))
+
+        restored = AdaptiveSampler(max_skip=5, feedback_lag=1)
+        restored.set_state(state)
+        self.assertEqual(restored.select(frames), sampler.select(frames))
+
+    def test_consumer_exit_releases_waiting_inference(self):
+        detected = self.run_pipeline(consume_delay=0.001, stop_at=20)
+        self.assertLess(len(detected), 200)
+
+
+class CameraMotionEstimatorTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        noise = rng.randint(0, 256, (480, 800)).astype(np.uint8)
+        self.world = cv2.cvtColor(cv2.GaussianBlur(cv2.resize(noise, (1600, 960)), (0, 0), 2), cv2.COLOR_GRAY2BGR)
+
+    def view(self, x, y):
+        return self.world[y:y + 360, x:x + 640].copy()
+
+    def test_pan_estimates_translation(self):
+        estimator = CameraMotionEstimator(width=320, max_corners=60)
+        boxes = [(250, 120, 390, 240)]
+        self.assertIsNone(estimator.estimate(self.view(200, 100), boxes))
+        # 摄像机向右下移动 (24, 10)，画面内容向左上移动
+        matrix = estimator.estimate(self.view(224, 110), boxes)
+        self.assertIsNotNone(matrix)
+        np.testing.assert_allclose(matrix[:, :2], np.eye(2), atol=0.01)
+        np.testing.assert_allclose(matrix[:, 2], (-24, -10), atol=1.0)
+
+    def test_static_frame_returns_none(self):
+        estimator = CameraMotionEstimator(width=320, max_corners=60)
+        frame = self.view(200, 100)
+        estimator.estimate(frame)
+        self.assertIsNone(estimator.estimate(frame.copy()))
+        self.assertIsNone(estimator.estimate(frame.copy(), [(250, 120, 390, 240)]))
+
+
+class ContourExtractorTests(SimpleTestCase):
+    FRAME_SIZE = (320, 240)
+
+    def polygons(self):
+        ellipse = cv2.ellipse2Poly((0, 0), (40, 22), 15, 0, 360, 8).astype(np.float32)
+        # 两块相连、带凹口的形状（像伸懒腰的猫）
+        concave = np.array([(0, 0), (60, 0), (60, 30), (35, 30), (35, 12), (25, 12), (25, 30), (0, 30)],
+                           dtype=np.float32)
+        w, h = self.FRAME_SIZE
+        return {
+            'inside': ellipse + (160, 120),
+            'concave': concave + (100.6, 80.3),
+            'left_edge': ellipse + (0, 120),
+            'top_edge': ellipse + (160, 0),
+            'right_edge': ellipse + (w - 1, 120),
+            'bottom_edge': ellipse + (160, h - 1),
+            'corner': ellipse + (w + 10, h + 5),
+            'past_left': concave + (-30.4, 200),
+            'small': np.array([(50, 50), (56, 50), (56, 55), (50, 55), (53, 57)], dtype=np.float32),
+        }
+
+    def test_roi_matches_full_frame(self):
+        extractor = ContourExtractor(self.FRAME_SIZE)
+        for name, polygon in self.polygons().items():
+            with self.subTest(name):
+                roi = extractor.extract(polygon)
+                full = extract_contour_full_frame(polygon, self.FRAME_SIZE)
+                self.assertIsNotNone(full)
+                np.testing.assert_array_equal(roi[0], full[0])
+                self.assertEqual(roi[1], full[1])
+                self.assertEqual(contour_features(roi[0]), contour_features(full[0]))
+
+    def test_polygon_outside_frame(self):
+        outside = cv2.ellipse2Poly((0, 0), (20, 10), 0, 0, 360, 20) + (400, 120)
+        self.assertIsNone(ContourExtractor(self.FRAME_SIZE).extract(outside))
+        self.assertIsNone(extract_contour_full_frame(outside, self.FRAME_SIZE))
@@ -0,0 +1,29 @@
+# 行为判断阈值的默认值和覆盖项校验
+# 不依赖 OpenCV / NumPy，web 进程校验请求中的阈值时只导入这个模块（见 api/views.py）
+
+MOVEMENT_THRESHOLD = 15       # 增加移动阈值，减少抖动影响
+WALKING_ASPECT_RATIO = 1.2    # 行走时身体横向拉长
+RESTING_SOLIDITY = 0.75       # 形状紧凑
+RESTING_SHAPE_RATIO = 0.6     # 且较为圆润
+STANDING_ASPECT_RATIO = 0.7   # 明显的竖直特征
+STATE_CHANGE_THRESHOLD = 3    # 行为历史达到该长度后才按多数票平滑
+
+
+def behavior_thresholds(overrides=None):
+    """行为判断阈值：默认值加上 overrides 中的覆盖项（重新分析时调参用），未知的阈值名抛出 ValueError"""
+    thresholds = {
+        'movement': MOVEMENT_THRESHOLD,
+        'walking_aspect_ratio': WALKING_ASPECT_RATIO,
+        'resting_solidity': RESTING_SOLIDITY,
+        'resting_shape_ratio': RESTING_SHAPE_RATIO,
+        'standing_aspect_ratio': STANDING_ASPECT_RATIO,
+        'state_change_threshold': STATE_CHANGE_THRESHOLD,
+    }
+    for name, value in (overrides or {}).items():
+        if name not in thresholds:
+            raise ValueError(f"Unknown behavior threshold: {name}, expected one of {tuple(thresholds)}")
+        thresholds[name] = int(value) if name == 'state_change_threshold' else float(value)
+    return thresholds
+
+
+DEFAULT_THRESHOLDS = behavior_thresholds()
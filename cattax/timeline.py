@@ -0,0 +1,135 @@
+def encode_track(points):
+    """把位置序列 delta 编码为 {'start': [x, y], 'deltas': [dx1, dy1, dx2, dy2, ...]}
+
+    猫静止时差值全是 0，JSON 体积远小于逐帧的坐标列表。
+    """
+    if not points:
+        return {'start': None, 'deltas': []}
+    deltas = []
+    px, py = points[0]
+    for x, y in points[1:]:
+        deltas.extend((x - px, y - py))
+        px, py = x, y
+    return {'start': list(points[0]), 'deltas': deltas}
+
+
+def decode_track(track):
+    if not track or track.get('start') is None:
+        return []
+    x, y = track['start']
+    points = [(x, y)]
+    deltas = track['deltas']
+    for i in range(0, len(deltas), 2):
+        x += deltas[i]
+        y += deltas[i + 1]
+        points.append((x, y))
+    return points
+
+
+def position_at(segment, frame_index):
+    """按区间内降采样的轨迹线性插值出 frame_index 处的位置
+
+    segment 需要 start_frame、position_step 和 positions（encode_track 的结果）。
+    """
+    points = decode_track(segment['positions'])
+    if not points:
+        return None
+    step = segment['position_step']
+    offset = (frame_index - segment['start_frame']) / step
+    i = min(max(int(offset), 0), len(points) - 1)
+    if i + 1 >= len(points):
+        return points[i]
+    t = offset - i
+    (x0, y0), (x1, y1) = points[i], points[i + 1]
+    return (int(round(x0 + (x1 - x0) * t)), int(round(y0 + (y1 - y0) * t)))
+
+
+class BehaviorSegmenter:
+    """把逐帧行为合并成按猫分组的行为区间（run-length）
+
+    每只猫维护一个打开的区间，end_frame 不包含在区间内。行为变化、或该猫连续 max_gap 帧
+    未出现时关闭区间并回调 on_segment(segment)。关闭的区间包含：
+    cat_id, behavior, start_frame, end_frame, frames（实际出现的帧数）, started_at, ended_at,
+    position_stats（位置均值/最小/最大）, position_step 和 positions（每 position_step 帧
+    采样一次、delta 编码的轨迹）。只保留每只猫当前打开的区间，内存与视频时长无关。
+    max_frames 大于 0 时区间跨度达到 max_frames 帧就关闭并从当前帧开始一个同样行为的新区间，
+    实时流中长时间睡着的猫的轨迹也不会无限增长；0 表示不拆分。
+    """
+
+    def __init__(self, on_segment, max_gap=1, position_step=10, max_frames=0):
+        self.on_segment = on_segment
+        self.max_gap = max(1, int(max_gap))
+        self.position_step = max(1, int(position_step))
+        self.max_frames = max(0, int(max_frames or 0))
+        self.open_segments = {}
+
+    def _close(self, cat_id):
+        segment = self.open_segments.pop(cat_id)
+        frames = segment['frames']
+        segment['position_stats'] = {
+            'mean': [round(segment.pop('x_sum') / frames, 1), round(segment.pop('y_sum') / frames, 1)],
+            'min': [segment.pop('x_min'), segment.pop('y_min')],
+            'max': [segment.pop('x_max'), segment.pop('y_max')],
+        }
+        segment['position_step'] = self.position_step
+        segment['positions'] = encode_track(segment.pop('track'))
+        self.on_segment(segment)
+
+    def _add_position(self, segment, frame_index, position):
+        x, y = position
+        segment['x_sum'] += x
+        segment['y_sum'] += y
+        segment['x_min'] = min(segment['x_min'], x)
+        segment['x_max'] = max(segment['x_max'], x)
+        segment['y_min'] = min(segment['y_min'], y)
+        segment['y_max'] = max(segment['y_max'], y)
+        # 采样点按区间起点对齐，中间缺帧时沿用最近一次的位置补齐
+        index = (frame_index - segment['start_frame']) // self.position_step
+        track = segment['track']
+        while len(track) <= index:
+            track.append((x, y))
+
+    def update(self, frame_index, frame_results, timestamp=None):
+        """计入一帧的结果，返回本帧因超时未出现而关闭区间的猫的编号列表"""
+        seen = set()
+        for det in frame_results:
+            cat_id, behavior = det['cat_id'], det['behavior']
+            if cat_id in seen:
+                continue
+            seen.add(cat_id)
+            segment = self.open_segments.get(cat_id)
+            if (segment is not None and segment['behavior'] == behavior
+                    and frame_index - segment['end_frame'] < self.max_gap
+                    and not (self.max_frames and frame_index - segment['start_frame'] >= self.max_frames)):
+                segment['end_frame'] = frame_index + 1
+                segment['frames'] += 1
+                segment['ended_at'] = timestamp
+                self._add_position(segment, frame_index, det['position'])
+                continue
+            if segment is not None:
+                self._close(cat_id)
+            x, y = det['position']
+            segment = {
+                'cat_id': cat_id,
+                'behavior': behavior,
+                'start_frame': frame_index,
+                'end_frame': frame_index + 1,
+                'frames': 1,
+                'started_at': timestamp,
+                'ended_at': timestamp,
+                'x_sum': 0, 'y_sum': 0,
+                'x_min': x, 'x_max': x, 'y_min': y, 'y_max': y,
+                'track': [],
+            }
+            self._add_position(segment, frame_index, (x, y))
+            self.open_segments[cat_id] = segment
+
+        lost = [cat_id for cat_id, segment in self.open_segments.items()
+                if cat_id not in seen and frame_index + 1 - segment['end_frame'] >= self.max_gap]
+        for cat_id in lost:
+            self._close(cat_id)
+        return lost
+
+    def close_all(self):
+        for cat_id in list(self.open_segments):
+            self._close(cat_id)
@@ -15,7 +15,56 @@ export const uploadVideo = async (file) => {
   return response.data;
 };
 
-export const getAnalysisStatus = async (id) => {
-  const response = await axios.get(`${API_URL}/analysis/${id}/status/`);
+// 超过该大小的文件走分块上传，可续传，且服务端可以在上传过程中开始分析
+export const CHUNKED_UPLOAD_THRESHOLD = 32 * 1024 * 1024;
+
+export const uploadVideoChunked = async (file, { onStarted, onProgress, maxRetries = 3 } = {}) => {
+  const started = await axios.post(`${API_URL}/analysis/start_upload/`, {
+    filename: file.name,
+    size: file.size,
+  });
+  const { id, chunk_size: chunkSize } = started.data;
+  let { offset, index } = started.data;
+  if (onStarted) onStarted(id);
+
+  let retries = 0;
+  while (offset < file.size) {
+    const formData = new FormData();
+    formData.append('index', index);
+    formData.append('offset', offset);
+    formData.append('chunk', file.slice(offset, offset + chunkSize));
+    try {
+      const response = await axios.post(`${API_URL}/analysis/${id}/upload_chunk/`, formData);
+      ({ offset, index } = response.data);
+      retries = 0;
+      if (onProgress) onProgress((offset / file.size) * 100);
+    } catch (error) {
+      if (retries >= maxRetries) throw error;
+      retries += 1;
+      // 按服务端记录的位置续传
+      const state = await axios.get(`${API_URL}/analysis/${id}/upload_chunk/`);
+      ({ offset, index } = state.data);
+    }
+  }
+
+  const response = await axios.post(`${API_URL}/analysis/${id}/commit_upload/`);
+  return response.data;
+};
+
+export const getAnalysisStatus = async (id, { results = 'none' } = {}) => {
+  const response = await axios.get(`${API_URL}/analysis/${id}/status/`, {
+    params: { results },
+  });
   return response.data;
-}; 
\ No newline at end of file
+};
+
+// 增量拉取逐帧结果，返回的 next_frame 作为下一次的 sinceFrame
+export const getAnalysisResults = async (id, sinceFrame = 0, limit = 1000) => {
+  const response = await axios.get(`${API_URL}/analysis/${id}/results/`, {
+    params: { since_frame: sinceFrame, limit },
+  });
+  return response.data;
+};
+
+// 进度事件流（Server-Sent Events）地址
+export const getAnalysisEventsUrl = (id) => `${API_URL}/analysis/${id}/events/`;